@@ -0,0 +1,159 @@
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import Affinity, CustomUser, Interaction, Post
+
+# Scores are stored relative to this moment (see Affinity). With a 14-day
+# half-life they stay within float range for about 38 years from it; the
+# range is 1024 half-lives, so a 1-day half-life overflows 2.0 ** x within
+# three years. Stored scores are not rescaled when AFFINITY_HALF_LIFE_DAYS
+# changes: run rebuild_affinity after changing it.
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def affinity_settings():
+    return settings.AFFINITY
+
+
+def growth(when):
+    """The factor an event at `when` is scaled by when stored: 2 ** (half-lives since EPOCH)."""
+    half_life = affinity_settings()["HALF_LIFE_DAYS"] * 24 * 3600
+    return 2.0 ** ((when - EPOCH).total_seconds() / half_life)
+
+
+def author_of(row):
+    """
+    The author an Interaction row engages with, as far as the row itself
+    tells: the liked or commented post's owner from its metadata, or the
+    followed or viewed user. Post views need a lookup and return None.
+    """
+    metadata = row.metadata or {}
+    if row.interaction_type == 'like':
+        return metadata.get('liked_user_id')
+    if row.interaction_type in ('comment', 'share'):
+        return metadata.get('post_owner_id')
+    if row.target_type == 'user':
+        return row.target_id
+    return None
+
+
+def record_interactions(rows):
+    """Fold a batch of written Interaction rows into the affinity table. Returns the number of pairs updated."""
+    weights = affinity_settings()["WEIGHTS"]
+    rows = [row for row in rows if row.interaction_type in weights]
+    authors = {row.id: author_of(row) for row in rows}
+
+    viewed = {row.target_id for row in rows if authors[row.id] is None and row.target_type == 'post'}
+    if viewed:
+        owners = dict(Post.objects.filter(id__in=viewed).values_list('id', 'user_id'))
+        for row in rows:
+            if authors[row.id] is None and row.target_type == 'post':
+                authors[row.id] = owners.get(row.target_id)
+
+    # Skip authors deleted since the event, whose rows would fail the foreign key
+    live = {str(pk) for pk in CustomUser.objects.filter(
+        id__in={author for author in authors.values() if author is not None}
+    ).values_list('id', flat=True)}
+    return record(
+        (row.user_id, authors[row.id], row.interaction_type, row.created_at)
+        for row in rows if str(authors[row.id]) in live
+    )
+
+
+def record(events):
+    """
+    Add (user_id, author_id, interaction_type, when) events to the affinity
+    table: one upsert for the batch, then prune the users it touched back
+    to their MAX_AUTHORS_PER_USER strongest authors. Engaging with yourself
+    is ignored. Returns the number of (user, author) pairs updated.
+    """
+    weights = affinity_settings()["WEIGHTS"]
+    deltas = {}
+    for user_id, author_id, interaction_type, when in events:
+        user_id, author_id = str(user_id), str(author_id)
+        if user_id == author_id:
+            continue
+        score, latest = deltas.get((user_id, author_id), (0.0, when))
+        deltas[(user_id, author_id)] = (score + weights[interaction_type] * growth(when), max(latest, when))
+    if not deltas:
+        return 0
+
+    _upsert(deltas)
+    prune({user_id for user_id, _ in deltas})
+    return len(deltas)
+
+
+def _upsert(deltas):
+    # ON CONFLICT ... DO UPDATE adds to the stored score in the same statement,
+    # which bulk_create(update_conflicts=True) cannot express
+    table = Affinity._meta.db_table
+    user_field, author_field = Affinity._meta.get_field('user'), Affinity._meta.get_field('author')
+    updated_at = Affinity._meta.get_field('updated_at')
+    params = []
+    for (user_id, author_id), (score, latest) in deltas.items():
+        params += [
+            user_field.get_db_prep_value(user_field.to_python(user_id), connection),
+            author_field.get_db_prep_value(author_field.to_python(author_id), connection),
+            score,
+            updated_at.get_db_prep_value(latest, connection),
+        ]
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(deltas))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (user_id, author_id, score, updated_at) VALUES {values}
+            ON CONFLICT (user_id, author_id) DO UPDATE SET
+                score = {table}.score + excluded.score,
+                updated_at = CASE WHEN excluded.updated_at > {table}.updated_at
+                    THEN excluded.updated_at ELSE {table}.updated_at END
+            """,
+            params,
+        )
+
+
+def prune(user_ids):
+    """Delete each user's rows beyond their MAX_AUTHORS_PER_USER highest scores."""
+    ranked = Affinity.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('user_id'), order_by=(F('score').desc(), F('id').desc()))
+    ).filter(position__gt=affinity_settings()["MAX_AUTHORS_PER_USER"]).values_list('id', flat=True)
+    return Affinity.objects.filter(id__in=list(ranked)).delete()[0]
+
+
+def rebuild(batch_size=1000):
+    """Replace the table with affinity replayed from the Interaction rows still retained."""
+    with transaction.atomic():
+        Affinity.objects.all().delete()
+        rows = Interaction.objects.filter(
+            interaction_type__in=list(affinity_settings()["WEIGHTS"])
+        ).order_by('created_at', 'id').iterator(chunk_size=batch_size)
+        replayed = 0
+        for batch in iter(lambda: list(islice(rows, batch_size)), []):
+            record_interactions(batch)
+            replayed += len(batch)
+    return replayed
+
+
+def _current(score, now):
+    return score / growth(now)
+
+
+def scores(user_id, author_ids, now=None):
+    """Current affinity of the user for each of `author_ids` they have one for, in one indexed query."""
+    now = now or timezone.now()
+    rows = Affinity.objects.filter(user_id=user_id, author_id__in=author_ids).values_list('author_id', 'score')
+    return {author_id: _current(score, now) for author_id, score in rows}
+
+
+def score(user_id, author_id, now=None):
+    return scores(user_id, [author_id], now).get(author_id, 0.0)
+
+
+def top_authors(user_id, limit, now=None):
+    """The user's `limit` strongest authors as (author_id, current score), strongest first."""
+    now = now or timezone.now()
+    rows = Affinity.objects.filter(user_id=user_id).order_by('-score').values_list('author_id', 'score')[:limit]
+    return [(author_id, _current(score, now)) for author_id, score in rows]
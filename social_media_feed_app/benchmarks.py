@@ -0,0 +1,464 @@
+import json
+import random
+import graphene
+import numpy as np
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from django.db import connection, connections
+from django.test import RequestFactory
+from django.views.decorators.csrf import csrf_exempt
+from channels_graphql_ws.serializer import Serializer
+from .models import CustomUser, Post, PostLike, Follow
+from .ranking import feed_ranking_settings, score
+from .schema.schema import schema
+from .schema.snapshots import post_snapshot
+from .schema.subscriptions import PostCreatedSubscription
+from .seeding import SeedPlan, bulk_seed
+from .views import FeedGraphQLView
+
+POST_FIELDS = "id title content likesCount commentCount shareCount isLikedByUser createdAt user { id username }"
+
+
+class Dataset:
+    """The seeded users and post IDs, shared read-only by every benchmark worker."""
+
+    def __init__(self, plan, users, post_ids, sizes):
+        self.plan = plan
+        self.users = users
+        self.post_ids = post_ids
+        self.sizes = sizes
+
+    def user(self, rng):
+        return rng.choice(self.users)
+
+    def post_id(self, rng):
+        return str(rng.choice(self.post_ids))
+
+    def username(self, rng):
+        return self.plan.username(rng.randrange(len(self.users)))
+
+
+def seed_dataset(users=200, posts_per_user=10, follows_per_user=20, likes_per_post=5,
+                 comments_per_post=3, shares_per_post=1, days=7, seed=42, workers=1):
+    """Bulk-load a reproducible dataset with the seed command's loader."""
+    plan = SeedPlan(
+        users,
+        posts_per_user=posts_per_user,
+        follows_per_user=follows_per_user,
+        likes_per_post=likes_per_post,
+        comments_per_post=comments_per_post,
+        shares_per_post=shares_per_post,
+        days=days,
+        seed=seed,
+    )
+    counts = bulk_seed(plan, workers=workers)
+
+    user_rows = CustomUser.objects.in_bulk([plan.user_id(i) for i in range(users)])
+    post_ids = list(Post.objects.filter(user_id__in=user_rows).order_by('id').values_list('id', flat=True))
+    return Dataset(plan, [user_rows[plan.user_id(i)] for i in range(users)], post_ids, {**counts, "seed": seed})
+
+
+class Operation:
+    """
+    One GraphQL operation to replay.
+
+    `prepare(dataset, rng)` returns the (user, variables) for one call. It runs
+    outside the timed section, so it may also create the rows the operation
+    needs, e.g. a like for unlikePost to remove.
+    """
+
+    def __init__(self, name, query, prepare, kind="query"):
+        self.name = name
+        self.query = query
+        self.prepare = prepare
+        self.kind = kind
+
+
+def _own_post(dataset, rng):
+    user = dataset.user(rng)
+    post = Post.objects.create(user=user, content="Benchmark post to edit")
+    return user, post
+
+
+def _prepare_update_post(dataset, rng):
+    user, post = _own_post(dataset, rng)
+    return user, {"id": str(post.id), "input": {"content": "Edited"}}
+
+
+def _prepare_delete_post(dataset, rng):
+    user, post = _own_post(dataset, rng)
+    return user, {"id": str(post.id)}
+
+
+def _prepare_unlike_post(dataset, rng):
+    user = dataset.user(rng)
+    post_id = dataset.post_id(rng)
+    PostLike.objects.get_or_create(user=user, post_id=post_id)
+    return user, {"postId": post_id}
+
+
+def _prepare_unfollow_user(dataset, rng):
+    user = dataset.user(rng)
+    followee = rng.choice([other for other in dataset.users if other.pk != user.pk])
+    Follow.objects.get_or_create(follower=user, followee=followee)
+    return user, {"userId": str(followee.id)}
+
+
+def _prepare_follow_user(dataset, rng):
+    user = dataset.user(rng)
+    followee = rng.choice([other for other in dataset.users if other.pk != user.pk])
+    Follow.objects.filter(follower=user, followee=followee).delete()
+    return user, {"userId": str(followee.id)}
+
+
+def _unique(rng):
+    return f"{int(time.time() * 1000)}{rng.randrange(10 ** 6)}"
+
+
+OPERATIONS = [
+    Operation(
+        "allPosts",
+        f"query AllPosts($limit: Int) {{ allPosts(limit: $limit) {{ {POST_FIELDS} }} }}",
+        lambda dataset, rng: (dataset.user(rng), {"limit": 10}),
+    ),
+    Operation(
+        "userFeed",
+        f"query UserFeed($limit: Int, $offset: Int) {{ userFeed(limit: $limit, offset: $offset) {{ {POST_FIELDS} }} }}",
+        lambda dataset, rng: (dataset.user(rng), {"limit": 10, "offset": rng.choice([0, 0, 0, 10, 20])}),
+    ),
+    Operation(
+        "userFeedRelevance",
+        f"query UserFeed($limit: Int) {{ userFeed(limit: $limit, ranking: RELEVANCE) {{ {POST_FIELDS} }} }}",
+        lambda dataset, rng: (dataset.user(rng), {"limit": 10}),
+    ),
+    Operation(
+        "trendingPosts",
+        f"query TrendingPosts($hours: Int) {{ trendingPosts(limit: 12, hours: $hours) {{ {POST_FIELDS} }} }}",
+        lambda dataset, rng: (dataset.user(rng), {"hours": 24}),
+    ),
+    Operation(
+        "postById",
+        f"query PostById($id: ID!) {{ postById(id: $id) {{ {POST_FIELDS} comments {{ id content likesCount }} }} }}",
+        lambda dataset, rng: (dataset.user(rng), {"id": dataset.post_id(rng)}),
+    ),
+    Operation(
+        "userStats",
+        "query UserStats($id: ID!) { userStats(id: $id) { totalPosts totalLikes totalComments totalShares "
+        "followersCount followingCount engagementRate topPerformingPost { id title } } }",
+        lambda dataset, rng: (dataset.user(rng), {"id": str(dataset.user(rng).id)}),
+    ),
+    Operation(
+        "searchUsers",
+        "query SearchUsers($query: String!) { searchUsers(query: $query) { id username firstName } }",
+        lambda dataset, rng: (dataset.user(rng), {"query": dataset.username(rng)}),
+    ),
+    Operation(
+        "registerUser",
+        "mutation RegisterUser($input: RegisterUserInput!) { registerUser(input: $input) { success user { id } } }",
+        lambda dataset, rng: (dataset.user(rng), {"input": (lambda suffix: {
+            "username": f"reg_{suffix}", "email": f"reg_{suffix}@example.com", "password": "password123",
+            "firstName": "Reg", "lastName": "User",
+        })(_unique(rng))}),
+        kind="mutation",
+    ),
+    Operation(
+        "updateUserProfile",
+        "mutation UpdateUserProfile($input: UpdateUserProfileInput!) { updateUserProfile(input: $input) { success } }",
+        lambda dataset, rng: (dataset.user(rng), {"input": {"bio": f"Bio {_unique(rng)}"}}),
+        kind="mutation",
+    ),
+    Operation(
+        "createPost",
+        "mutation CreatePost($userId: ID!, $content: String!) { createPost(userId: $userId, content: $content) { success post { id } } }",
+        lambda dataset, rng: (lambda user: (user, {"userId": str(user.id), "content": "Benchmark post"}))(dataset.user(rng)),
+        kind="mutation",
+    ),
+    Operation(
+        "updatePost",
+        "mutation UpdatePost($id: ID!, $input: UpdatePostInput!) { updatePost(id: $id, input: $input) { success } }",
+        _prepare_update_post,
+        kind="mutation",
+    ),
+    Operation(
+        "deletePost",
+        "mutation DeletePost($id: ID!) { deletePost(id: $id) { success } }",
+        _prepare_delete_post,
+        kind="mutation",
+    ),
+    Operation(
+        "createComment",
+        "mutation CreateComment($input: CreateCommentInput!) { createComment(input: $input) { success comment { id } } }",
+        lambda dataset, rng: (dataset.user(rng), {"input": {"postId": dataset.post_id(rng), "content": "Benchmark comment"}}),
+        kind="mutation",
+    ),
+    Operation(
+        "likePost",
+        "mutation LikePost($postId: ID!) { likePost(postId: $postId) { success post { likesCount } } }",
+        lambda dataset, rng: (dataset.user(rng), {"postId": dataset.post_id(rng)}),
+        kind="mutation",
+    ),
+    Operation(
+        "unlikePost",
+        "mutation UnlikePost($postId: ID!) { unlikePost(postId: $postId) { success } }",
+        _prepare_unlike_post,
+        kind="mutation",
+    ),
+    Operation(
+        "sharePost",
+        "mutation SharePost($input: SharePostInput!) { sharePost(input: $input) { success } }",
+        lambda dataset, rng: (dataset.user(rng), {"input": {"postId": dataset.post_id(rng)}}),
+        kind="mutation",
+    ),
+    Operation(
+        "followUser",
+        "mutation FollowUser($userId: ID!) { followUser(userId: $userId) { success } }",
+        _prepare_follow_user,
+        kind="mutation",
+    ),
+    Operation(
+        "unfollowUser",
+        "mutation UnfollowUser($userId: ID!) { unfollowUser(userId: $userId) { success } }",
+        _prepare_unfollow_user,
+        kind="mutation",
+    ),
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _view():
+    return csrf_exempt(FeedGraphQLView.as_view(schema=schema))
+
+
+def execute_once(view, operation, user, variables):
+    """Run one operation through the HTTP view; return (seconds, queries, error or None)."""
+    request = RequestFactory().post(
+        "/graphql",
+        data=json.dumps({"query": operation.query, "variables": variables}),
+        content_type="application/json",
+    )
+    request.user = user
+
+    counter = _QueryCounter()
+    with connection.execute_wrapper(counter):
+        start = time.perf_counter()
+        response = view(request)
+        elapsed = time.perf_counter() - start
+
+    body = json.loads(response.content)
+    error = None
+    if body.get("errors"):
+        error = body["errors"][0]["message"]
+    else:
+        payload = next(iter((body.get("data") or {}).values()), None)
+        if isinstance(payload, dict) and payload.get("success") is False:
+            error = "success: false"
+    return elapsed, counter.count, error
+
+
+def run_operation(operation, dataset, iterations=100, concurrency=1, warmup=5, seed=42):
+    """
+    Replay one operation `iterations` times across `concurrency` threads and
+    summarize latency, throughput and SQL queries per call.
+    """
+    view = _view()
+    for i in range(warmup):
+        rng = random.Random(f"{seed}:{operation.name}:warmup:{i}")
+        execute_once(view, operation, *operation.prepare(dataset, rng))
+
+    samples = [None] * iterations
+
+    def work(indexes):
+        for i in indexes:
+            rng = random.Random(f"{seed}:{operation.name}:{i}")
+            try:
+                user, variables = operation.prepare(dataset, rng)
+                samples[i] = execute_once(view, operation, user, variables)
+            except Exception as e:
+                samples[i] = (None, 0, f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        work(range(iterations))
+    else:
+        def worker(offset):
+            try:
+                work(range(offset, iterations, concurrency))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples if sample[0] is not None)
+    errors = [sample[2] for sample in samples if sample[2]]
+    return {
+        "kind": operation.kind,
+        "iterations": iterations,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "throughput_per_s": round(iterations / wall, 2) if wall else 0.0,
+        "queries_per_op": round(sum(sample[1] for sample in samples) / iterations, 2) if iterations else 0.0,
+    }
+
+
+class _Delivery(graphene.ObjectType):
+    """Resolves a broadcast the way each subscriber's consumer does, so its queries can be counted."""
+    post_created = graphene.Field(PostCreatedSubscription)
+
+    def resolve_post_created(root, info):
+        return PostCreatedSubscription.publish(root, info)
+
+
+_delivery_schema = graphene.Schema(query=_Delivery)
+POST_CREATED_DELIVERY = f"{{ postCreated {{ post {{ {POST_FIELDS} }} }} }}"
+
+
+def run_broadcast_fanout(dataset, subscriber_counts=(1, 10, 100), seed=42):
+    """
+    Publish one postCreated event to growing numbers of subscribers and
+    count the SQL queries spent building the payload and delivering it.
+    Delivery is replayed in process: each subscriber deserializes the
+    channel-layer message and resolves its selection, as its consumer would.
+    """
+    rng = random.Random(f"{seed}:broadcast")
+    results = {}
+    for count in subscriber_counts:
+        author = dataset.user(rng)
+        post = Post.objects.create(user=author, content="Benchmark broadcast")
+
+        build = _QueryCounter()
+        with connection.execute_wrapper(build):
+            message = Serializer.serialize(post_snapshot(post))
+
+        deliver = _QueryCounter()
+        errors = 0
+        start = time.perf_counter()
+        with connection.execute_wrapper(deliver):
+            for _ in range(count):
+                request = RequestFactory().get("/graphql-ws/")
+                request.user = dataset.user(rng)
+                result = _delivery_schema.execute(
+                    POST_CREATED_DELIVERY, root_value=Serializer.deserialize(message), context_value=request
+                )
+                errors += bool(result.errors)
+        elapsed = time.perf_counter() - start
+
+        results[str(count)] = {
+            "payload_bytes": len(message),
+            "build_queries": build.count,
+            "delivery_queries": deliver.count,
+            "delivery_ms": round(elapsed * 1000, 3),
+            "errors": errors,
+        }
+    return results
+
+
+def run_feed_scoring(candidate_counts=(500, 5000), repeats=50, seed=42):
+    """
+    Time the relevance scorer alone, scoring and sorting synthetic candidate
+    sets the size of a userFeed(ranking: RELEVANCE) call, so its cost can
+    be told apart from the queries that gather the candidates.
+    """
+    rng = np.random.default_rng(seed)
+    config = feed_ranking_settings()
+    results = {}
+    for count in candidate_counts:
+        features = (
+            rng.uniform(0, 7 * 24 * 3600, count),  # ages in seconds
+            rng.poisson(2, count).astype(np.float64),  # affinity
+            rng.poisson(20, count).astype(np.float64),  # likes
+            rng.poisson(5, count).astype(np.float64),  # comments
+            rng.poisson(1, count).astype(np.float64),  # shares
+        )
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            np.argsort(-score(*features, config=config), kind="stable")
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        results[str(count)] = {
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+        }
+    return results
+
+
+def run_suite(dataset, names=None, **options):
+    """Run every operation (or those in `names`) and return the baseline document."""
+    operations = [operation for operation in OPERATIONS if names is None or operation.name in names]
+    return {
+        "meta": {
+            "commit": current_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "dataset": dataset.sizes,
+            **options,
+        },
+        "operations": {operation.name: run_operation(operation, dataset, **options) for operation in operations},
+        "broadcasts": run_broadcast_fanout(dataset, seed=options.get("seed", 42)),
+        "feed_scoring": run_feed_scoring(seed=options.get("seed", 42)),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "queries_per_op")
+
+
+def compare(baseline, current, max_regression=None):
+    """
+    Return (rows, regressions) comparing two baseline documents.
+
+    Each row is (operation, metric, before, after, relative change). A
+    regression is a p95 slower by more than `max_regression` (a fraction) or
+    any increase in queries per operation.
+    """
+    rows, regressions = [], []
+    for name, after in current["operations"].items():
+        before = baseline.get("operations", {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+            rows.append((name, metric, old, new, change))
+            if metric == "queries_per_op" and new > old:
+                regressions.append((name, metric, old, new, change))
+            elif metric == "p95_ms" and max_regression is not None and change > max_regression:
+                regressions.append((name, metric, old, new, change))
+    return rows, regressions
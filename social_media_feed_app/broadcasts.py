@@ -0,0 +1,147 @@
+import math
+import time
+from django.conf import settings
+from django.db import transaction
+from .models import Follow, Post, UserStats
+from .redis_store import get_redis
+from .tasks import broadcast_like_count
+from .timelines import FANOUT_BATCH_SIZE, audience
+
+# Kept past the scheduled emit, so a lost task cannot block a post's
+# broadcasts for longer than this
+PENDING_GRACE_SECONDS = 60
+
+
+def like_broadcast_settings():
+    return settings.LIKE_BROADCASTS
+
+
+def pending_key(post_id):
+    return f"like_broadcast:{post_id}:pending"
+
+
+def last_emit_key(post_id):
+    return f"like_broadcast:{post_id}:last"
+
+
+def like_changed(post_id):
+    """Schedule a likesCount broadcast for the post once the caller's transaction commits."""
+    transaction.on_commit(lambda: schedule(post_id))
+
+
+def schedule(post_id):
+    """
+    Coalesce like and unlike events per post. The first event schedules an
+    emit WINDOW seconds out, or later if the post was broadcast less than
+    MIN_INTERVAL seconds ago; events until then are covered by that emit,
+    which sends the count as it is when it runs. Returns whether an emit
+    was scheduled.
+    """
+    config = like_broadcast_settings()
+    redis = get_redis()
+    delay = config["WINDOW"]
+    last = redis.get(last_emit_key(post_id))
+    if last is not None:
+        delay = max(delay, float(last) + config["MIN_INTERVAL"] - time.time())
+
+    if not redis.set(pending_key(post_id), 1, nx=True, ex=math.ceil(delay) + PENDING_GRACE_SECONDS):
+        return False
+    broadcast_like_count.apply_async(args=[str(post_id)], countdown=delay)
+    return True
+
+
+def emit(post_id):
+    """Broadcast the post's current likesCount to its post_liked group."""
+    from .schema.snapshots import post_snapshot
+    from .schema.subscriptions import PostLikedSubscription
+
+    redis = get_redis()
+    # Cleared before the count is read: an event committed after the read
+    # finds no pending emit and schedules the next one
+    redis.delete(pending_key(post_id))
+    redis.set(last_emit_key(post_id), time.time(), ex=math.ceil(like_broadcast_settings()["MIN_INTERVAL"]))
+
+    post = Post.objects.filter(id=post_id, is_deleted=False).select_related('user').first()
+    if post is None:
+        return None
+    PostLikedSubscription.broadcast(
+        group=f"post_liked_{post_id}",
+        payload={'post': post_snapshot(post), 'likes_count': post.like_count}
+    )
+    return post.like_count
+
+
+# ----------------------
+# Live home feed
+# ----------------------
+# Users with an open feedUpdated subscription, scored by how many they have open
+FEED_ONLINE_KEY = "feed:online"
+
+
+def feed_group(user_id):
+    return f"feed_{user_id}"
+
+
+def feed_connected(user_id):
+    get_redis().zincrby(FEED_ONLINE_KEY, 1, str(user_id))
+
+
+def feed_disconnected(user_id):
+    redis = get_redis()
+    if redis.zincrby(FEED_ONLINE_KEY, -1, str(user_id)) <= 0:
+        redis.zrem(FEED_ONLINE_KEY, str(user_id))
+
+
+def online_audience(author_id):
+    """
+    Yield, in batches, the users in the post's audience (see
+    timelines.audience) who have the live feed open. Starts from whichever
+    is smaller, the online users or the author's followers, so the work
+    follows the real audience rather than either population.
+    """
+    redis = get_redis()
+    online = redis.zcard(FEED_ONLINE_KEY)
+    if not online:
+        return
+
+    followers_count = UserStats.objects.filter(
+        user_id=author_id
+    ).values_list('followers_count', flat=True).first() or 0
+    if online < followers_count:
+        members = redis.zrange(FEED_ONLINE_KEY, 0, -1)
+        if str(author_id) in members:
+            yield [author_id]
+        for start in range(0, len(members), FANOUT_BATCH_SIZE):
+            followers = list(Follow.objects.filter(
+                followee_id=author_id, follower_id__in=members[start:start + FANOUT_BATCH_SIZE]
+            ).values_list('follower_id', flat=True))
+            if followers:
+                yield followers
+        return
+
+    for user_ids in audience(author_id):
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zscore(FEED_ONLINE_KEY, str(user_id))
+        connected = [user_id for user_id, score in zip(user_ids, pipe.execute()) if score]
+        if connected:
+            yield connected
+
+
+def publish_feed_update(post_id, author_id):
+    """Push a new post to the feedUpdated groups of its online audience. Returns the number of groups sent to."""
+    from .schema.snapshots import post_snapshot
+    from .schema.subscriptions import FeedUpdatedSubscription
+
+    snapshot = None
+    sent = 0
+    for user_ids in online_audience(author_id):
+        if snapshot is None:
+            post = Post.objects.filter(id=post_id, is_deleted=False).select_related('user').first()
+            if post is None:
+                return 0
+            snapshot = post_snapshot(post)
+        for user_id in user_ids:
+            FeedUpdatedSubscription.broadcast(group=feed_group(user_id), payload=snapshot)
+        sent += len(user_ids)
+    return sent
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from django.db import connection
+from django.db.models import Count, F, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from .models import Comment
+
+MAX_DEPTH = 10
+MAX_REPLIES_PER_NODE = 20
+
+TABLE = Comment._meta.db_table
+
+# Top-level comments are paged by (created_at, id); below them each node
+# contributes at most `replies` children, so the walk is bounded by
+# first * replies ** max_depth rows however large the thread is. Each step
+# seeks idx_comment_thread, and reply counts are only taken for the
+# comments returned.
+TREE_SQL = f"""
+WITH RECURSIVE tree AS (
+    (
+        SELECT c.id, 0 AS depth,
+               ROW_NUMBER() OVER (ORDER BY c.created_at, c.id) <= %(first)s AS expand
+        FROM {TABLE} c
+        WHERE c.post_id = %(post_id)s AND c.parent_comment_id IS NULL AND NOT c.is_deleted
+            {{after}}
+        ORDER BY c.created_at, c.id
+        LIMIT %(first)s + 1
+    )
+    UNION ALL
+    SELECT child.id, tree.depth + 1, TRUE
+    FROM tree
+    CROSS JOIN LATERAL (
+        SELECT r.id FROM {TABLE} r
+        WHERE r.post_id = %(post_id)s AND r.parent_comment_id = tree.id AND NOT r.is_deleted
+        ORDER BY r.created_at, r.id
+        LIMIT %(replies)s
+    ) child
+    WHERE tree.expand AND tree.depth < %(max_depth)s
+)
+SELECT c.*, tree.depth,
+       (SELECT COUNT(*) FROM {TABLE} r
+        WHERE r.post_id = c.post_id AND r.parent_comment_id = c.id AND NOT r.is_deleted) AS reply_count
+FROM tree JOIN {TABLE} c ON c.id = tree.id
+ORDER BY tree.depth, c.created_at, c.id
+"""
+
+
+def _postgres_rows(post_id, first, after, max_depth, replies):
+    params = {"post_id": str(post_id), "first": first, "replies": replies, "max_depth": max_depth}
+    after_sql = ""
+    if after:
+        after_sql = "AND (c.created_at, c.id) > (%(after_created_at)s, %(after_id)s)"
+        params.update(after_created_at=after[0], after_id=str(after[1]))
+    return list(Comment.objects.raw(TREE_SQL.format(after=after_sql), params))
+
+
+def _level_rows(post_id, first, after, max_depth, replies):
+    """The same walk one level per query, for backends without LATERAL joins."""
+    roots = Comment.objects.filter(post_id=post_id, parent_comment=None, is_deleted=False)
+    if after:
+        created_at, pk = after
+        roots = roots.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+    rows = list(roots.order_by('created_at', 'id')[:first + 1])
+    for row in rows:
+        row.depth = 0
+
+    level = [row.id for row in rows[:first]]
+    for depth in range(1, max_depth + 1):
+        if not level:
+            break
+        children = list(Comment.objects.filter(
+            parent_comment_id__in=level, is_deleted=False
+        ).annotate(position=Window(
+            RowNumber(), partition_by=F('parent_comment_id'), order_by=(F('created_at').asc(), F('id').asc())
+        )).filter(position__lte=replies).order_by('created_at', 'id'))
+        for row in children:
+            row.depth = depth
+        rows.extend(children)
+        level = [row.id for row in children]
+
+    counts = dict(Comment.objects.filter(
+        parent_comment_id__in=[row.id for row in rows], is_deleted=False
+    ).values('parent_comment_id').annotate(total=Count('id')).order_by().values_list('parent_comment_id', 'total'))
+    for row in rows:
+        row.reply_count = counts.get(row.id, 0)
+    return rows
+
+
+def load_tree(post_id, first, after=None, max_depth=3, replies=3):
+    """
+    Load a page of a post's top-level comments and up to `replies` replies
+    per comment, `max_depth` levels deep.
+
+    Returns (roots, has_next_page, comments). Every comment carries `depth`,
+    `reply_count` (all of its live replies) and `tree_replies` (those
+    loaded); `comments` lists every loaded comment, with users attached.
+    """
+    max_depth = min(max(max_depth, 0), MAX_DEPTH)
+    replies = min(max(replies, 0), MAX_REPLIES_PER_NODE)
+    load = _postgres_rows if connection.vendor == "postgresql" else _level_rows
+    rows = load(post_id, first, after, max_depth, replies)
+
+    roots = [row for row in rows if row.depth == 0]
+    has_next_page = len(roots) > first
+    if has_next_page:
+        extra = roots.pop()
+        rows = [row for row in rows if row is not extra]
+
+    children = defaultdict(list)
+    for row in rows:
+        if row.depth:
+            children[row.parent_comment_id].append(row)
+    for row in rows:
+        row.tree_replies = children.get(row.id, [])
+
+    prefetch_related_objects(rows, 'user')
+    return roots, has_next_page, rows
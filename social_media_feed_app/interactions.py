@@ -0,0 +1,381 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from .models import CustomUser, Interaction, InteractionDailyRollup
+from . import affinity
+
+logger = logging.getLogger(__name__)
+
+
+def interaction_log_settings():
+    return settings.INTERACTION_LOG
+
+
+class InteractionBuffer:
+    """
+    Bounded in-process queue of Interaction rows, written with bulk_create.
+
+    A background thread drains the queue every FLUSH_INTERVAL seconds, or as
+    soon as a batch is full. When the queue is full the producer gives it
+    ENQUEUE_TIMEOUT seconds to drain, then writes a batch itself: requests
+    slow down under sustained overload instead of events being dropped.
+    Only when that write fails too, e.g. with the database down, and the
+    queue is still full after another ENQUEUE_TIMEOUT is the event dropped
+    and counted, so a request never waits on the database indefinitely.
+
+    Delivery is at-least-once. A batch that fails to insert is kept and
+    retried before anything newer, and rows carry their primary key from
+    the moment they are logged, so re-inserting a batch that did commit is
+    a no-op.
+    """
+
+    def __init__(self, buffer_size, batch_size, flush_interval, enqueue_timeout, background=True):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.background = background
+        self.written = 0
+        self.overflows = 0
+        self.failures = 0
+        self.dropped = 0
+        self._flush_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(self.buffer_size)
+        self._pending = []
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return self._queue.qsize() + len(self._pending)
+
+    def put(self, row):
+        if self._pid != os.getpid():
+            # Forked after the parent started buffering; its queue and thread are not ours
+            self._reset()
+        if self.background and self._thread is None:
+            self._start()
+
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.overflows += 1
+            try:
+                self.flush(max_batches=1)
+            except Exception:
+                self.failures += 1
+                logger.exception("Writing buffered interactions on overflow failed")
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self.dropped += 1
+                logger.warning("Interaction buffer is full; dropped a %s event", row.interaction_type)
+                return
+
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, max_batches=None):
+        """Write buffered rows, oldest first. Returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while max_batches is None or max_batches > 0:
+                if not self._pending:
+                    self._pending = self._take(self.batch_size)
+                if not self._pending:
+                    break
+                written += self._write(self._pending)
+                self._pending = []
+                if max_batches is not None:
+                    max_batches -= 1
+        self.written += written
+        return written
+
+    def _take(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows):
+        try:
+            self._insert(rows)
+        except IntegrityError:
+            # A user was deleted while their events were buffered; drop only those
+            live = set(CustomUser.objects.filter(
+                id__in={row.user_id for row in rows}
+            ).values_list('id', flat=True))
+            rows = [row for row in rows if row.user_id in live]
+            self._insert(rows)
+        return len(rows)
+
+    def _insert(self, rows):
+        # ignore_conflicts skips rows a retried batch already stored; leave
+        # them out of the affinity update too, so each event counts once
+        with transaction.atomic():
+            stored = set(Interaction.objects.filter(
+                id__in=[row.id for row in rows]
+            ).values_list('id', flat=True))
+            Interaction.objects.bulk_create(rows, ignore_conflicts=True)
+            affinity.record_interactions([row for row in rows if row.id not in stored])
+
+    def _start(self):
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.failures += 1
+                logger.exception("Writing %d buffered interactions failed; retrying", len(self))
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = interaction_log_settings()
+                _buffer = InteractionBuffer(
+                    buffer_size=config["BUFFER_SIZE"],
+                    batch_size=config["BATCH_SIZE"],
+                    flush_interval=config["FLUSH_INTERVAL"],
+                    enqueue_timeout=config["ENQUEUE_TIMEOUT"],
+                    background=config["BACKGROUND_FLUSH"],
+                )
+    return _buffer
+
+
+def log(user_id, target_type, target_id, interaction_type, metadata=None):
+    """
+    Record an interaction without writing it inside the caller's request.
+
+    The row is buffered once the surrounding transaction commits, so events
+    from rolled-back mutations are never written and never reference rows
+    that do not exist yet.
+    """
+    row = Interaction(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        target_type=target_type,
+        target_id=target_id,
+        interaction_type=interaction_type,
+        metadata=metadata,
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: get_buffer().put(row))
+
+
+def flush():
+    """Write every buffered interaction now."""
+    return get_buffer().flush() if _buffer is not None else 0
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Buffered interactions were lost at shutdown")
+
+
+# ----------------------
+# Storage: rollups, partitions and retention
+# ----------------------
+TABLE = Interaction._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+ROLLUP_BATCH_SIZE = 1000
+
+
+def retention_settings():
+    return settings.INTERACTION_RETENTION
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rollup_day(day):
+    """
+    Upsert the InteractionDailyRollup rows for one day from the raw events.
+    Idempotent, so a day can be rolled up again as late events arrive.
+    """
+    start, end = day_bounds(day)
+    totals = Interaction.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).values('target_type', 'target_id', 'interaction_type').annotate(
+        total=Count('id'), users=Count('user_id', distinct=True)
+    ).order_by()
+
+    rows = [
+        InteractionDailyRollup(
+            day=day,
+            target_type=row['target_type'],
+            target_id=row['target_id'],
+            interaction_type=row['interaction_type'],
+            count=row['total'],
+            unique_users=row['users'],
+        )
+        for row in totals.iterator(chunk_size=ROLLUP_BATCH_SIZE)
+    ]
+    InteractionDailyRollup.objects.bulk_create(
+        rows,
+        batch_size=ROLLUP_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['target_type', 'target_id', 'interaction_type', 'day'],
+        update_fields=['count', 'unique_users'],
+    )
+    return len(rows)
+
+
+def rollup_pending(today=None):
+    """
+    Roll up every day since the last rolled-up one, through today. The last
+    ROLLUP_LOOKBACK_DAYS are always redone to pick up buffered events that
+    were written after their day was first rolled up.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=retention_settings()["ROLLUP_LOOKBACK_DAYS"])
+    latest = InteractionDailyRollup.objects.aggregate(day=Max('day'))['day']
+    if latest is None:
+        earliest = Interaction.objects.aggregate(at=Min('created_at'))['at']
+        latest = timezone.localdate(earliest) if earliest else today
+    start = min(start, latest)
+
+    days = 0
+    while start <= today:
+        rollup_day(start)
+        start += timedelta(days=1)
+        days += 1
+    return days
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y_%m}"
+
+
+def is_partitioned():
+    """Whether the Interaction table is range-partitioned, which only Postgres supports."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions():
+    """Names of the monthly partitions attached to the Interaction table."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+        """, [TABLE])
+        return {name for (name,) in cursor.fetchall() if name != DEFAULT_PARTITION}
+
+
+def create_partition(month):
+    """
+    Create and attach the partition for one month. Rows that landed in the
+    default partition because it was missing are moved into it.
+    """
+    name = partition_name(month)
+    start, end = day_bounds(month)[0], day_bounds(next_month(month))[0]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s RETURNING *
+            )
+            INSERT INTO "{name}" SELECT * FROM moved
+        """, [start, end])
+        # Bounds are literals: DDL takes no bind parameters
+        cursor.execute(
+            f"""ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" """
+            f"""FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"""
+        )
+    return name
+
+
+def ensure_partitions(today=None):
+    """Create the partitions for this month and the next PARTITIONS_AHEAD months."""
+    month = month_start(today or timezone.localdate())
+    existing = partitions()
+    created = []
+    for _ in range(retention_settings()["PARTITIONS_AHEAD"] + 1):
+        if partition_name(month) not in existing:
+            created.append(create_partition(month))
+        month = next_month(month)
+    return created
+
+
+def expire_raw_events(today=None):
+    """
+    Remove raw events older than RETENTION_DAYS. Partitioned tables detach or
+    drop whole months that have fully expired; other backends delete rows.
+    """
+    config = retention_settings()
+    cutoff = (today or timezone.localdate()) - timedelta(days=config["RETENTION_DAYS"])
+
+    if not is_partitioned():
+        deleted, _ = Interaction.objects.filter(created_at__lt=day_bounds(cutoff)[0]).delete()
+        return deleted
+
+    expired = []
+    with connection.cursor() as cursor:
+        for name in sorted(partitions()):
+            month = datetime.strptime(name[-7:], "%Y_%m").date()
+            if next_month(month) > cutoff:
+                continue
+            if config["EXPIRED_PARTITIONS"] == "detach":
+                # Kept as a standalone table for archiving
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            else:
+                cursor.execute(f'DROP TABLE "{name}"')
+            expired.append(name)
+    return expired
+
+
+def maintain():
+    """Prepare upcoming partitions, roll up raw events, then expire old ones."""
+    if is_partitioned():
+        ensure_partitions()
+    # Rollups run first, so no day is expired before it has been rolled up
+    rollup_pending()
+    expire_raw_events()
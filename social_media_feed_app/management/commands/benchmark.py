@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from ...benchmarks import OPERATIONS, compare, run_suite, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and replay every GraphQL query and mutation, "
+        "reporting p50/p95/p99 latency, throughput and SQL queries per operation"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--posts-per-user", type=int, default=10)
+        parser.add_argument("--follows-per-user", type=int, default=20)
+        parser.add_argument("--likes-per-post", type=int, default=5)
+        parser.add_argument("--comments-per-post", type=int, default=3)
+        parser.add_argument("--iterations", type=int, default=200, help="Timed calls per operation")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed calls per operation")
+        parser.add_argument("--concurrency", type=int, default=4, help="Worker threads per operation")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed for the dataset and calls")
+        parser.add_argument("--only", help="Comma-separated operation names, e.g. allPosts,likePost")
+        parser.add_argument("--output", help="Write the results as a JSON baseline to this path")
+        parser.add_argument("--compare", help="Baseline JSON to diff the results against")
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            help="Fail when a p95 is slower than the baseline by more than this fraction, e.g. 0.2",
+        )
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database afterwards")
+        parser.add_argument(
+            "--eager-tasks", action="store_true",
+            help="Run Celery tasks inline, so fan-out cost is included in mutation latency",
+        )
+
+    def handle(self, *args, **options):
+        names = None
+        if options["only"]:
+            names = set(options["only"].split(","))
+            unknown = names - {operation.name for operation in OPERATIONS}
+            if unknown:
+                raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+
+        if options["eager_tasks"]:
+            from social_media_feed_backend.celery import app
+            app.conf.task_always_eager = True
+
+        old_name = connection.settings_dict["NAME"]
+        self.stdout.write("Creating benchmark database...")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            dataset = seed_dataset(
+                users=options["users"],
+                posts_per_user=options["posts_per_user"],
+                follows_per_user=options["follows_per_user"],
+                likes_per_post=options["likes_per_post"],
+                comments_per_post=options["comments_per_post"],
+                seed=options["seed"],
+            )
+            self.stdout.write(f"Seeded {dataset.sizes}")
+
+            results = run_suite(
+                dataset,
+                names=names,
+                iterations=options["iterations"],
+                concurrency=options["concurrency"],
+                warmup=options["warmup"],
+                seed=options["seed"],
+            )
+        finally:
+            if not options["keepdb"]:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2) + "\n")
+            self.stdout.write(f"Wrote baseline to {options['output']}")
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            rows, regressions = compare(baseline, results, options["max_regression"])
+            self.stdout.write(f"\nCompared with {baseline['meta'].get('commit') or options['compare']}:")
+            for name, metric, old, new, change in rows:
+                self.stdout.write(f"  {name:<18} {metric:<15} {old:>10} -> {new:<10} {change:+.1%}")
+            if regressions:
+                raise CommandError("Regressions: " + ", ".join(f"{name} {metric}" for name, metric, *_ in regressions))
+
+    def report(self, results):
+        self.stdout.write(
+            f"\n{'operation':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'queries':>8} {'errors':>7}"
+        )
+        for name, result in results["operations"].items():
+            self.stdout.write(
+                f"{name:<18} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+                f"{result['throughput_per_s']:>9} {result['queries_per_op']:>8} {result['errors']:>7}"
+            )
+            if result["first_error"]:
+                self.stdout.write(self.style.WARNING(f"  first error: {result['first_error']}"))
+
+        self.stdout.write(f"\n{'subscribers':<18} {'bytes':>9} {'build q':>9} {'deliver q':>9} {'deliver ms':>11}")
+        for count, result in results.get("broadcasts", {}).items():
+            self.stdout.write(
+                f"{count:<18} {result['payload_bytes']:>9} {result['build_queries']:>9} "
+                f"{result['delivery_queries']:>9} {result['delivery_ms']:>11}"
+            )
+
+        self.stdout.write(f"\n{'scored candidates':<18} {'p50 ms':>9} {'p95 ms':>9}")
+        for count, result in results.get("feed_scoring", {}).items():
+            self.stdout.write(f"{count:<18} {result['p50_ms']:>9} {result['p95_ms']:>9}")
@@ -0,0 +1,31 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, parse
+from ...schema.documents import register
+
+
+class Command(BaseCommand):
+    help = "Register GraphQL documents in the persisted query store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help=".graphql files, or directories to search for them")
+
+    def handle(self, *args, **options):
+        files = []
+        for path in map(Path, options["paths"]):
+            if path.is_dir():
+                files.extend(sorted(path.rglob("*.graphql")))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f"{path} does not exist")
+
+        for file in files:
+            query = file.read_text()
+            try:
+                parse(query)
+            except GraphQLError as error:
+                raise CommandError(f"{file}: {error.message}")
+            self.stdout.write(f"{register(query)}  {file}")
+
+        self.stdout.write(self.style.SUCCESS(f"Registered {len(files)} queries"))
@@ -1,4 +1,6 @@
+import os
 import random
+import time
 import uuid
 from django.core.management.base import BaseCommand
 from faker import Faker
@@ -7,13 +9,32 @@ from ...models import (
     PostLike, CommentLike, Share,
     Follow, Friendship, Message, Interaction
 )
+from ...seeding import DEFAULT_PASSWORD, SeedPlan, bulk_seed
 
 fake = Faker()
 
 class Command(BaseCommand):
-    help = "Seed the database with sample data"
+    help = (
+        "Seed the database with sample data. Pass --users to bulk-load a dataset "
+        "of that size for capacity testing instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, help="Bulk mode: number of users to create")
+        parser.add_argument("--posts-per-user", type=int, default=10)
+        parser.add_argument("--follows-per-user", type=int, default=20)
+        parser.add_argument("--likes-per-post", type=int, default=5, help="Average; varies per post")
+        parser.add_argument("--comments-per-post", type=int, default=2, help="Average; varies per post")
+        parser.add_argument("--shares-per-post", type=int, default=1, help="Average; varies per post")
+        parser.add_argument("--days", type=int, default=30, help="Spread creation times over this many days")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk INSERT")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes, each loading a partition of users")
+        parser.add_argument("--seed", type=int, help="Random seed, for reproducible datasets")
 
     def handle(self, *args, **kwargs):
+        if kwargs["users"]:
+            return self.handle_bulk(kwargs)
+
         self.stdout.write("Seeding database...")
 
         # -----------------------
@@ -144,4 +165,40 @@ class Command(BaseCommand):
 
         self.stdout.write("Created interactions")
 
-        self.stdout.write(self.style.SUCCESS("Database seeding completed!"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("Database seeding completed!"))
+
+    def handle_bulk(self, options):
+        """
+        Load a large dataset with batched bulk_create across a process pool.
+        Signals do not fire, so denormalized counters are written with each
+        post and user stats are recomputed once at the end; timelines and
+        trending leaderboards rebuild lazily on first read.
+        """
+        plan = SeedPlan(
+            options["users"],
+            posts_per_user=options["posts_per_user"],
+            follows_per_user=options["follows_per_user"],
+            likes_per_post=options["likes_per_post"],
+            comments_per_post=options["comments_per_post"],
+            shares_per_post=options["shares_per_post"],
+            days=options["days"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"Bulk seeding {plan.users} users ({plan.posts_per_user} posts each) "
+            f"with {options['workers']} workers, run {plan.run}, seed {plan.seed}..."
+        )
+        started = time.monotonic()
+
+        def progress(phase, totals):
+            summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+            self.stdout.write(f"  [{time.monotonic() - started:.0f}s] {phase}: {summary}")
+
+        totals = bulk_seed(plan, workers=options["workers"], on_progress=progress)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {sum(totals.values())} rows in {time.monotonic() - started:.1f}s. "
+            f"Users are {plan.username(0)}..{plan.username(plan.users - 1)} with password "
+            f"'{DEFAULT_PASSWORD}'"
+        ))
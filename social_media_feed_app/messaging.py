@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, When, Window
+from django.db.models.functions import RowNumber
+from .models import Message, UserStats
+
+
+def peer_of(user_id):
+    """The other participant of each of the user's messages."""
+    return Case(When(sender_id=user_id, then=F('receiver_id')), default=F('sender_id'))
+
+
+def between(user_id, peer_id):
+    """Every message exchanged by two users, in either direction (idx_message_conversation)."""
+    return Message.objects.filter(
+        Q(sender_id=user_id, receiver_id=peer_id) | Q(sender_id=peer_id, receiver_id=user_id)
+    )
+
+
+def latest_messages(user_id):
+    """
+    The newest message of each of the user's conversations, in one query:
+    messages are numbered newest first per peer and only the first is kept.
+    Filters added by the caller, e.g. a page cursor, apply outside the
+    window, so they never promote an older message to a conversation's
+    latest.
+    """
+    latest = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=peer_of(user_id),
+            order_by=(F('created_at').desc(), F('id').desc()),
+        )
+    ).filter(position=1).values('id')
+    return Message.objects.filter(id__in=latest).select_related('sender', 'receiver')
+
+
+def unread_from(user_id, peer_ids):
+    """Unread messages per sender among `peer_ids`, read off idx_message_unread."""
+    rows = Message.objects.filter(
+        receiver_id=user_id, sender_id__in=peer_ids, is_read=False
+    ).values('sender_id').annotate(total=Count('id')).order_by()
+    return {row['sender_id']: row['total'] for row in rows}
+
+
+def unread_count(user_id):
+    """The inbox badge, from the UserStats counter rather than a COUNT over unread rows."""
+    count = UserStats.objects.filter(pk=user_id).values_list('unread_messages', flat=True).first()
+    return max(count or 0, 0)
+
+
+def mark_conversation_read(user_id, peer_id):
+    """Mark everything the peer sent the user as read in one UPDATE. Returns how many were unread."""
+    with transaction.atomic():
+        read = Message.objects.filter(sender_id=peer_id, receiver_id=user_id, is_read=False).update(is_read=True)
+        if read:
+            UserStats.adjust(user_id, unread_messages=-read)
+    return read
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:58
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('social_media_feed_app', 'Post')
+    PostLike = apps.get_model('social_media_feed_app', 'PostLike')
+    Comment = apps.get_model('social_media_feed_app', 'Comment')
+    Share = apps.get_model('social_media_feed_app', 'Share')
+
+    def count_of(model, **filters):
+        return Coalesce(Subquery(
+            model.objects.filter(post=OuterRef('pk'), **filters)
+            .order_by().values('post').annotate(total=Count('id')).values('total'),
+            output_field=IntegerField()
+        ), Value(0))
+
+    Post.objects.update(
+        like_count=count_of(PostLike),
+        comment_count=count_of(Comment, is_deleted=False),
+        share_count=count_of(Share),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_media_feed_app', '0002_add_database_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='share_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_user_stats(apps, schema_editor):
+    CustomUser = apps.get_model('social_media_feed_app', 'CustomUser')
+    UserStats = apps.get_model('social_media_feed_app', 'UserStats')
+    Post = apps.get_model('social_media_feed_app', 'Post')
+    Follow = apps.get_model('social_media_feed_app', 'Follow')
+
+    def count_of(model, field, **filters):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('user_id')}, **filters)
+            .order_by().values(field).annotate(total=Count('id')).values('total'),
+            output_field=IntegerField()
+        ), Value(0))
+
+    def sum_of(counter):
+        return Coalesce(Subquery(
+            Post.objects.filter(user_id=OuterRef('user_id'))
+            .order_by().values('user_id').annotate(total=Sum(counter)).values('total'),
+            output_field=IntegerField()
+        ), Value(0))
+
+    top_post = Post.objects.filter(user_id=OuterRef('user_id'), is_deleted=False).annotate(
+        total=F('like_count') + F('comment_count') + F('share_count')
+    ).order_by('-total', '-created_at')
+
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in CustomUser.objects.values_list('pk', flat=True).iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    UserStats.objects.update(
+        total_posts=count_of(Post, 'user_id', is_deleted=False),
+        total_likes=sum_of('like_count'),
+        total_comments=sum_of('comment_count'),
+        total_shares=sum_of('share_count'),
+        followers_count=count_of(Follow, 'followee_id'),
+        following_count=count_of(Follow, 'follower_id'),
+        top_post_id=Subquery(top_post.values('id')[:1]),
+        top_post_engagement=Coalesce(Subquery(top_post.values('total')[:1]), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_media_feed_app', '0003_post_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_posts', models.IntegerField(default=0)),
+                ('total_likes', models.IntegerField(default=0)),
+                ('total_comments', models.IntegerField(default=0)),
+                ('total_shares', models.IntegerField(default=0)),
+                ('followers_count', models.IntegerField(default=0)),
+                ('following_count', models.IntegerField(default=0)),
+                ('top_post_engagement', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('top_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='social_media_feed_app.post')),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_media_feed_app', '0004_user_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interaction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:41
+
+from datetime import date
+
+from django.db import migrations, models
+
+TABLE = 'social_media_feed_app_interaction'
+USER_TABLE = 'social_media_feed_app_customuser'
+PARTITIONS_AHEAD = 3
+
+# Shared by the partitioned and plain tables
+INDEXES = f"""
+    CREATE INDEX {TABLE}_user_id_idx ON {TABLE} (user_id);
+    CREATE INDEX idx_interaction_user_type ON {TABLE} (user_id, interaction_type, created_at DESC);
+    CREATE INDEX idx_interaction_target ON {TABLE} (target_type, target_id, interaction_type);
+    ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk FOREIGN KEY (user_id)
+        REFERENCES {USER_TABLE} (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_interactions(apps, schema_editor):
+    """
+    Rebuild the Interaction table range-partitioned by month of created_at.
+    Partitions cover the existing rows through PARTITIONS_AHEAD months from
+    now; maintain_interactions creates later ones. A default partition
+    catches rows if it ever falls behind.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT date_trunc('month', COALESCE(MIN(created_at), NOW()))::date, "
+                       f"date_trunc('month', NOW())::date FROM {TABLE}")
+        month, current = cursor.fetchone()
+
+    last = current
+    for _ in range(PARTITIONS_AHEAD):
+        last = next_month(last)
+
+    schema_editor.execute(f"""
+        CREATE TABLE {TABLE}_partitioned (LIKE {TABLE} INCLUDING DEFAULTS)
+            PARTITION BY RANGE (created_at);
+        ALTER TABLE {TABLE}_partitioned ADD CONSTRAINT {TABLE}_pkey_partitioned PRIMARY KEY (id, created_at);
+        CREATE TABLE {TABLE}_default PARTITION OF {TABLE}_partitioned DEFAULT;
+    """)
+    while month <= last:
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE}_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        )
+        month = next_month(month)
+
+    schema_editor.execute(f"""
+        INSERT INTO {TABLE}_partitioned SELECT * FROM {TABLE};
+        DROP TABLE {TABLE};
+        ALTER TABLE {TABLE}_partitioned RENAME TO {TABLE};
+        ALTER TABLE {TABLE} RENAME CONSTRAINT {TABLE}_pkey_partitioned TO {TABLE}_pkey;
+        {INDEXES}
+    """)
+
+
+def unpartition_interactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f"""
+        CREATE TABLE {TABLE}_plain (LIKE {TABLE} INCLUDING DEFAULTS);
+        INSERT INTO {TABLE}_plain SELECT * FROM {TABLE};
+        DROP TABLE {TABLE};
+        ALTER TABLE {TABLE}_plain RENAME TO {TABLE};
+        ALTER TABLE {TABLE} ADD PRIMARY KEY (id);
+        {INDEXES}
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_media_feed_app', '0005_interaction_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('target_type', models.CharField(max_length=20)),
+                ('target_id', models.UUIDField()),
+                ('interaction_type', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('unique_users', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('target_type', 'target_id', 'interaction_type', 'day'), name='unique_interaction_rollup')],
+            },
+        ),
+        migrations.RunPython(partition_interactions, unpartition_interactions),
+    ]
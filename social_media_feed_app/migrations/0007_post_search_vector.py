@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:05
+
+from django.db import migrations
+
+TABLE = 'social_media_feed_app_post'
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_search_vectors(apps, schema_editor):
+    """Fill search_vector in batches, each committed on its own, by firing the trigger."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(f"""
+                UPDATE {TABLE} SET title = title
+                WHERE id IN (SELECT id FROM {TABLE} WHERE search_vector IS NULL LIMIT {BACKFILL_BATCH_SIZE})
+            """)
+            if cursor.rowcount == 0:
+                break
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY and the batched backfill cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('social_media_feed_app', '0006_interaction_partitions'),
+    ]
+
+    operations = [
+        # Nullable with no default, so adding it does not rewrite the table
+        migrations.RunSQL(
+            sql=[
+                f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector;",
+                """
+                CREATE OR REPLACE FUNCTION post_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector :=
+                        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+                """,
+                f"""
+                CREATE TRIGGER post_search_vector_update
+                    BEFORE INSERT OR UPDATE OF title, content ON {TABLE}
+                    FOR EACH ROW EXECUTE FUNCTION post_search_vector_update();
+                """,
+            ],
+            reverse_sql=[
+                f"DROP TRIGGER IF EXISTS post_search_vector_update ON {TABLE};",
+                "DROP FUNCTION IF EXISTS post_search_vector_update();",
+                f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector;",
+            ]
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        # Soft-deleted posts are never searched, so they are left out of the index
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_post_search ON {TABLE} USING gin(search_vector) WHERE is_deleted = false;",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS idx_post_search;"
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+TABLE = 'social_media_feed_app_message'
+STATS_TABLE = 'social_media_feed_app_userstats'
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('social_media_feed_app', '0007_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='unread_messages',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql=f"""
+                UPDATE {STATS_TABLE} SET unread_messages = (
+                    SELECT COUNT(*) FROM {TABLE}
+                    WHERE {TABLE}.receiver_id = {STATS_TABLE}.user_id AND NOT {TABLE}.is_read
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop
+        ),
+        # idx_message_conversation leads with the sender; the inbox also needs
+        # each user's received messages grouped by who sent them
+        migrations.RunSQL(
+            sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_inbox ON {TABLE}(receiver_id, sender_id, created_at DESC);",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS idx_message_inbox;"
+        ),
+    ]
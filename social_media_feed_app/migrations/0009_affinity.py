@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_media_feed_app', '0008_message_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Affinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-score'], name='idx_affinity_user_score')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'author'), name='unique_affinity')],
+            },
+        ),
+    ]
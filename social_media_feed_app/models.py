@@ -1,6 +1,9 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Count, IntegerField, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 
@@ -34,12 +37,35 @@ class Post(models.Model):
     media_file = models.FileField(upload_to='post_media/', blank=True, null=True)
     media_type = models.CharField(max_length=20, blank=True, null=True)  # 'image', 'video', 'audio', 'gif'
     is_deleted = models.BooleanField(default=False)
+    # Denormalized engagement counters, kept in step by signals and
+    # repaired by the reconcile_post_counters task
+    like_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)  # non-deleted comments, replies included
+    share_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # is_deleted as last loaded or saved; None when it was deferred. Lets the
+    # post_save handler apply a deletion once rather than on every later save.
+    _saved_is_deleted = False
+
     def __str__(self):
         return f"{self.user.username}: {self.title or 'No Title'}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        post._saved_is_deleted = post.__dict__.get('is_deleted')
+        return post
+
+    @classmethod
+    def adjust_counters(cls, post_id, **deltas):
+        """Atomically add deltas, e.g. like_count=1, to a post's counters and its author's stats."""
+        cls.objects.filter(pk=post_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        UserStats.adjust_for_post(post_id, **deltas)
+
 
 # ----------------------
 # Comments
@@ -56,6 +82,14 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def soft_delete(self):
+        """Hide the comment and take it off its post's comment_count."""
+        with transaction.atomic():
+            deleted = Comment.objects.filter(pk=self.pk, is_deleted=False).update(is_deleted=True)
+            if deleted:
+                Post.adjust_counters(self.post_id, comment_count=-1)
+        self.is_deleted = True
+
 
 # ----------------------
 # Post Likes
@@ -173,7 +207,185 @@ class Interaction(models.Model):
     target_id = models.UUIDField()  # points to UUID of target object
     interaction_type = models.CharField(max_length=20, choices=INTERACTION_TYPES)
     metadata = models.JSONField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the interaction happened; buffered rows are written later
+    created_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
-        return f"Interactions type {self.interaction_type} by {self.user.username}"
\ No newline at end of file
+        return f"Interactions type {self.interaction_type} by {self.user.username}"
+
+
+class InteractionDailyRollup(models.Model):
+    """
+    Interactions per target, type and day, rolled up from the raw events by
+    maintain_interactions. Analytics read these, since raw events are only
+    kept for INTERACTION_RETENTION["RETENTION_DAYS"].
+    """
+    day = models.DateField()
+    target_type = models.CharField(max_length=20)
+    target_id = models.UUIDField()
+    interaction_type = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    unique_users = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves lookups of one target's history by day
+            models.UniqueConstraint(
+                fields=["target_type", "target_id", "interaction_type", "day"],
+                name="unique_interaction_rollup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.interaction_type} on {self.target_type} {self.target_id} ({self.day})"
+
+
+class Affinity(models.Model):
+    """
+    How much a user engages with an author, kept up to date from the
+    interaction stream by affinity.record. Scores decay exponentially, but
+    are stored forward-decayed: each event adds its weight scaled up by
+    how far it happened after affinity.EPOCH, so an event only ever adds to
+    a row and one user's rows compare correctly without rewriting any.
+    Read current values through affinity.scores.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="affinities")
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"], name="unique_affinity"),
+        ]
+        indexes = [
+            # A user's strongest authors, and the rows pruned past AFFINITY["MAX_AUTHORS_PER_USER"]
+            models.Index(fields=["user", "-score"], name="idx_affinity_user_score"),
+        ]
+
+    def __str__(self):
+        return f"Affinity of {self.user_id} for {self.author_id}"
+
+
+# ----------------------
+# User Stats
+# ----------------------
+def post_engagement():
+    """Unweighted engagement of a post, computed from its denormalized counters."""
+    return F("like_count") + F("comment_count") + F("share_count")
+
+
+def _count_of(model, field, **filters):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("user_id")}, **filters)
+        .order_by().values(field).annotate(total=Count("id")).values("total"),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def _sum_of(counter):
+    # Engagement received on every post the user wrote, deleted ones included
+    return Coalesce(Subquery(
+        Post.objects.filter(user_id=OuterRef("user_id"))
+        .order_by().values("user_id").annotate(total=Sum(counter)).values("total"),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def _top_post():
+    return Post.objects.filter(
+        user_id=OuterRef("user_id"), is_deleted=False
+    ).annotate(total=post_engagement()).order_by("-total", "-created_at")
+
+
+class UserStats(models.Model):
+    """
+    Per-user rollup behind the userStats query, kept in step by signals and
+    the Post counter updates and recomputed in bulk by recompute_user_stats.
+    """
+    # Maps Post counter fields onto the author's totals
+    POST_COUNTERS = {
+        "like_count": "total_likes",
+        "comment_count": "total_comments",
+        "share_count": "total_shares",
+    }
+
+    user = models.OneToOneField(CustomUser, primary_key=True, on_delete=models.CASCADE, related_name="stats")
+    total_posts = models.IntegerField(default=0)  # non-deleted posts
+    total_likes = models.IntegerField(default=0)
+    total_comments = models.IntegerField(default=0)
+    total_shares = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    # Unread messages received, behind the inbox badge; raised on send and
+    # lowered by messaging.mark_conversation_read
+    unread_messages = models.IntegerField(default=0)
+    top_post = models.ForeignKey(Post, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    top_post_engagement = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.user_id}"
+
+    @property
+    def engagement_rate(self):
+        engagement = self.total_likes + self.total_comments + self.total_shares
+        return engagement / self.total_posts if self.total_posts > 0 else 0
+
+    @classmethod
+    def adjust(cls, user_id, **deltas):
+        """Atomically add deltas, e.g. followers_count=1, to a user's totals."""
+        cls.objects.filter(pk=user_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+    @classmethod
+    def adjust_for_post(cls, post_id, **counter_deltas):
+        """Roll a change to a post's counters up into its author's totals and top post."""
+        stats = cls.objects.filter(pk__in=Post.objects.filter(pk=post_id).values("user_id"))
+        stats.update(**{
+            cls.POST_COUNTERS[counter]: F(cls.POST_COUNTERS[counter]) + delta
+            for counter, delta in counter_deltas.items()
+        })
+        if sum(counter_deltas.values()) > 0:
+            cls.offer_top_post(post_id)
+        else:
+            cls._refresh_top_post(stats.filter(top_post_id=post_id))
+
+    @classmethod
+    def offer_top_post(cls, post_id):
+        """Make a post its author's top post if it now has the most engagement."""
+        post = Post.objects.filter(pk=post_id, is_deleted=False)
+        engagement = Subquery(post.annotate(total=post_engagement()).values("total")[:1])
+        cls.objects.filter(
+            Q(top_post__isnull=True) | Q(top_post_id=post_id) | Q(top_post_engagement__lt=engagement),
+            pk__in=post.values("user_id"),
+        ).update(top_post_id=post_id, top_post_engagement=engagement)
+
+    @classmethod
+    def refresh_top_post(cls, user_id, post_id):
+        """Pick a new top post for a user if `post_id` was it and has lost engagement or been deleted."""
+        cls._refresh_top_post(cls.objects.filter(pk=user_id, top_post_id=post_id))
+
+    @staticmethod
+    def _refresh_top_post(stats):
+        stats.update(
+            top_post_id=Subquery(_top_post().values("id")[:1]),
+            top_post_engagement=Coalesce(Subquery(_top_post().values("total")[:1]), Value(0)),
+        )
+
+    @classmethod
+    def recompute(cls, user_ids):
+        """Rebuild the rollups for the given users from the source tables."""
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        return cls.objects.filter(pk__in=user_ids).update(
+            total_posts=_count_of(Post, "user_id", is_deleted=False),
+            total_likes=_sum_of("like_count"),
+            total_comments=_sum_of("comment_count"),
+            total_shares=_sum_of("share_count"),
+            followers_count=_count_of(Follow, "followee_id"),
+            following_count=_count_of(Follow, "follower_id"),
+            unread_messages=_count_of(Message, "receiver_id", is_read=False),
+            top_post_id=Subquery(_top_post().values("id")[:1]),
+            top_post_engagement=Coalesce(Subquery(_top_post().values("total")[:1]), Value(0)),
+        )
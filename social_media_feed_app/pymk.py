@@ -0,0 +1,212 @@
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from .models import CustomUser, Follow, Friendship
+from .redis_store import get_redis
+
+EDGE_CHUNK_SIZE = 10000
+
+
+def pymk_settings():
+    return settings.PEOPLE_YOU_MAY_KNOW
+
+
+def suggestions_key(user_id):
+    return f"pymk:{user_id}"
+
+
+def _ranges(starts, lengths):
+    """Concatenate arange(start, start + length) for every pair, without a Python loop."""
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+def _contains(sorted_values, values):
+    """Vectorized membership test against an already sorted array."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+def _edges(index, rows):
+    """Map (user_id, user_id) rows onto index arrays, skipping users created since the snapshot."""
+    pairs = [(index[a], index[b]) for a, b in rows if a in index and b in index]
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    src, dst = np.array(pairs, dtype=np.int64).T
+    return src, dst
+
+
+class FollowGraph:
+    """
+    A snapshot of the follow graph in compressed sparse row form. Users are
+    numbered by their position in `user_ids`, and user i's neighbours are
+    indices[indptr[i]:indptr[i + 1]], sorted. Accepted friendships count
+    as follows in both directions.
+
+    `edges` and `blocked` hold (user, other) pairs encoded as
+    user * size + other, sorted, for vectorized membership tests.
+    """
+
+    def __init__(self, user_ids, indptr, indices, edges, blocked):
+        self.user_ids = user_ids
+        self.size = len(user_ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.edges = edges
+        self.blocked = blocked
+
+    @classmethod
+    def load(cls):
+        user_ids = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+        index = {pk: i for i, pk in enumerate(user_ids)}
+
+        def rows(queryset, *fields):
+            return queryset.values_list(*fields).iterator(chunk_size=EDGE_CHUNK_SIZE)
+
+        follow_src, follow_dst = _edges(index, rows(Follow.objects.all(), 'follower_id', 'followee_id'))
+        friend_src, friend_dst = _edges(index, rows(
+            Friendship.objects.filter(status='accepted'), 'requester_id', 'receiver_id'
+        ))
+        blocked_src, blocked_dst = _edges(index, rows(
+            Friendship.objects.filter(status='blocked'), 'requester_id', 'receiver_id'
+        ))
+        return cls.from_edges(
+            user_ids,
+            np.concatenate([follow_src, friend_src, friend_dst]),
+            np.concatenate([follow_dst, friend_dst, friend_src]),
+            np.concatenate([blocked_src, blocked_dst]),
+            np.concatenate([blocked_dst, blocked_src]),
+        )
+
+    @classmethod
+    def from_edges(cls, user_ids, src, dst, blocked_src, blocked_dst):
+        size = len(user_ids)
+        keep = src != dst
+        # np.unique sorts, so the edges come out grouped by source, targets ascending
+        edges = np.unique(src[keep] * size + dst[keep])
+        sources = edges // size
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+        indices = (edges % size).astype(np.int32)
+        blocked = np.unique(blocked_src * size + blocked_dst)
+        return cls(user_ids, indptr, indices, edges, blocked)
+
+    def batches(self, max_paths):
+        """
+        Split the users into runs of roughly `max_paths` 2-hop paths: a run
+        takes every user whose walk starts within its budget, so it exceeds
+        the budget by at most its last user's paths.
+        """
+        degrees = np.diff(self.indptr)
+        owners = np.repeat(np.arange(self.size), degrees)
+        paths = np.bincount(owners, weights=degrees[self.indices], minlength=self.size).astype(np.int64)
+        runs = (np.cumsum(paths) - paths) // max_paths
+        yield from np.split(np.arange(self.size), np.flatnonzero(np.diff(runs)) + 1)
+
+    def suggest(self, users, limit):
+        """
+        The top `limit` friends-of-friends for each of `users`, by number of
+        mutual connections, ties going to the highest index, which is how
+        the stored sorted sets order them too. Returns parallel (user,
+        candidate, mutuals) arrays grouped by user.
+        """
+        degrees = np.diff(self.indptr)
+
+        # Every path user -> neighbour -> candidate, one hop at a time
+        first = degrees[users]
+        owners = np.repeat(users, first)
+        neighbours = self.indices[_ranges(self.indptr[users], first)]
+        second = degrees[neighbours]
+        owners = np.repeat(owners, second)
+        candidates = self.indices[_ranges(self.indptr[neighbours], second)]
+
+        pairs, mutuals = np.unique(owners * self.size + candidates, return_counts=True)
+        owners, candidates = pairs // self.size, pairs % self.size
+        keep = (owners != candidates) & ~_contains(self.edges, pairs) & ~_contains(self.blocked, pairs)
+        owners, candidates, mutuals = owners[keep], candidates[keep], mutuals[keep]
+
+        order = np.lexsort((-candidates, -mutuals, owners))
+        owners, candidates, mutuals = owners[order], candidates[order], mutuals[order]
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        rank = np.arange(len(owners)) - np.repeat(starts, np.diff(np.r_[starts, len(owners)]))
+        top = rank < limit
+        return owners[top], candidates[top], mutuals[top]
+
+
+def rebuild():
+    """
+    Recompute every user's suggestions from a fresh graph snapshot and
+    replace the stored lists. Returns the number of users with suggestions.
+    """
+    config = pymk_settings()
+    graph = FollowGraph.load()
+    redis = get_redis()
+    suggested = 0
+
+    for users in graph.batches(config["MAX_PATHS_PER_BATCH"]):
+        owners, candidates, mutuals = graph.suggest(users, config["SUGGESTIONS_PER_USER"])
+        by_owner = {}
+        for owner, candidate, count in zip(owners.tolist(), candidates.tolist(), mutuals.tolist()):
+            by_owner.setdefault(owner, {})[str(graph.user_ids[candidate])] = count
+
+        pipe = redis.pipeline()
+        for user in users.tolist():
+            key = suggestions_key(graph.user_ids[user])
+            pipe.delete(key)
+            if user in by_owner:
+                pipe.zadd(key, by_owner[user])
+        pipe.execute()
+        suggested += len(by_owner)
+    return suggested
+
+
+def _connected(user_id):
+    """Users never to suggest to `user_id`: those they follow and those blocked either way."""
+    return Q(id=user_id) | Q(id__in=Follow.objects.filter(follower_id=user_id).values('followee_id')) | Q(
+        id__in=Friendship.objects.filter(requester_id=user_id, status='blocked').values('receiver_id')
+    ) | Q(id__in=Friendship.objects.filter(receiver_id=user_id, status='blocked').values('requester_id'))
+
+
+def _followees_of(user_id, excluding_for):
+    config = pymk_settings()
+    return list(CustomUser.objects.filter(
+        id__in=Follow.objects.filter(follower_id=user_id).values('followee_id')
+    ).exclude(_connected(excluding_for)).order_by('pk').values_list('pk', flat=True)[:config["DELTA_FANOUT"]])
+
+
+def apply_follow(follower_id, followee_id):
+    """
+    Fold a new follow into the follower's own suggestions until the next
+    rebuild: the followee is no longer suggested and each of the people
+    they follow gains a mutual connection. Other users' lists catch up at
+    the next rebuild.
+    """
+    key = suggestions_key(follower_id)
+    pipe = get_redis().pipeline()
+    pipe.zrem(key, str(followee_id))
+    for candidate in _followees_of(followee_id, excluding_for=follower_id):
+        pipe.zincrby(key, 1, str(candidate))
+    pipe.zremrangebyrank(key, 0, -(pymk_settings()["SUGGESTIONS_PER_USER"] + 1))
+    pipe.execute()
+
+
+def apply_unfollow(follower_id, followee_id):
+    """Take the mutual connections an unfollowed user provided back out of the follower's suggestions."""
+    key = suggestions_key(follower_id)
+    pipe = get_redis().pipeline()
+    for candidate in _followees_of(followee_id, excluding_for=follower_id):
+        pipe.zincrby(key, -1, str(candidate))
+    pipe.zremrangebyscore(key, '-inf', 0)
+    pipe.execute()
+
+
+def suggested_users(user_id, limit):
+    """The stored suggestions for a user, most mutual connections first."""
+    ids = get_redis().zrevrange(suggestions_key(user_id), 0, limit - 1)
+    users = CustomUser.objects.in_bulk(ids)
+    return [users[pk] for pk in (CustomUser._meta.pk.to_python(pk) for pk in ids) if pk in users]
@@ -0,0 +1,85 @@
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .affinity import scores as affinity_scores
+from .models import Follow, Post
+from . import timelines
+
+# Post columns the scorer reads, in the order they are fetched
+FEATURE_FIELDS = ("id", "user_id", "created_at", "like_count", "comment_count", "share_count")
+
+
+def feed_ranking_settings():
+    return settings.FEED_RANKING
+
+
+def candidates(user_id):
+    """
+    The newest FEED_RANKING["CANDIDATES"] posts of the user's home feed as
+    FEATURE_FIELDS rows. Post IDs come from the materialized timeline when
+    it covers them, otherwise from the database.
+    """
+    limit = feed_ranking_settings()["CANDIDATES"]
+    posts = Post.objects.filter(is_deleted=False)
+    post_ids = timelines.read(user_id, 0, limit)
+    if post_ids is not None:
+        posts = posts.filter(id__in=post_ids)
+    else:
+        user_ids = list(Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True))
+        posts = posts.filter(user_id__in=user_ids + [user_id]).order_by('-created_at')[:limit]
+    return list(posts.values_list(*FEATURE_FIELDS))
+
+
+def score(age_seconds, affinity, likes, comments, shares, config=None):
+    """
+    Score candidates in one vectorized pass over parallel arrays:
+
+        RECENCY * 0.5 ** (age / HALF_LIFE)
+        + AFFINITY * log1p(affinity)
+        + ENGAGEMENT * log1p(weighted likes, comments and shares)
+
+    The logs keep one prolific author or viral post from drowning out
+    everything else; recency decays to half every HALF_LIFE_HOURS.
+    """
+    config = config or feed_ranking_settings()
+    weights = config["WEIGHTS"]
+    engagement_weights = config["ENGAGEMENT_WEIGHTS"]
+    half_life = config["HALF_LIFE_HOURS"] * 3600
+
+    engagement = (
+        engagement_weights["LIKES"] * likes
+        + engagement_weights["COMMENTS"] * comments
+        + engagement_weights["SHARES"] * shares
+    )
+    return (
+        weights["RECENCY"] * np.exp2(-np.maximum(age_seconds, 0) / half_life)
+        + weights["AFFINITY"] * np.log1p(affinity)
+        + weights["ENGAGEMENT"] * np.log1p(np.maximum(engagement, 0))
+    )
+
+
+def rank(rows, affinity, now=None):
+    """Order FEATURE_FIELDS rows by score, best first, keeping their order on ties. Returns their post IDs."""
+    if not rows:
+        return []
+    now = (now or timezone.now()).timestamp()
+    post_ids, author_ids, created_at, likes, comments, shares = zip(*rows)
+
+    scores = score(
+        now - np.fromiter((created.timestamp() for created in created_at), dtype=np.float64, count=len(rows)),
+        np.fromiter((affinity.get(author_id, 0) for author_id in author_ids), dtype=np.float64, count=len(rows)),
+        np.array(likes, dtype=np.float64),
+        np.array(comments, dtype=np.float64),
+        np.array(shares, dtype=np.float64),
+    )
+    return [post_ids[i] for i in np.argsort(-scores, kind='stable')]
+
+
+def relevance_page(user_id, offset, limit):
+    """One page of the user's feed ranked by relevance: IDs of the posts at [offset, offset + limit)."""
+    rows = candidates(user_id)
+    # Newest first, so the stable sort breaks ties in favour of newer posts
+    rows.sort(key=lambda row: row[2], reverse=True)
+    affinity = affinity_scores(user_id, {row[1] for row in rows})
+    return [str(post_id) for post_id in rank(rows, affinity)[offset:offset + limit]]
+
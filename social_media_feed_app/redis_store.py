@@ -0,0 +1,238 @@
+import threading
+from django.conf import settings
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """
+    Return the shared client for timelines, leaderboards and counters.
+
+    FEED_STORE["BACKEND"] selects a real Redis server ("redis") or the
+    in-process stand-in ("memory") used by the test suite.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = settings.FEED_STORE
+                if config["BACKEND"] == "memory":
+                    _client = InMemoryRedis()
+                else:
+                    import redis
+                    _client = redis.Redis.from_url(config["URL"], decode_responses=True)
+    return _client
+
+
+def _parse_bound(value):
+    """Parse a ZRANGEBYSCORE bound ('-inf', '+inf', '(1.5', 1.5) into (score, exclusive)."""
+    if isinstance(value, str):
+        return float(value.lstrip("(")), value.startswith("(")
+    return float(value), False
+
+
+def _slice(items, start, end):
+    # Redis ranges are inclusive and accept negative indexes
+    length = len(items)
+    if start < 0:
+        start = max(length + start, 0)
+    if end < 0:
+        end = length + end
+        if end < 0:
+            # Past the start of the set, e.g. trimming a set smaller than its cap
+            return []
+    return items[start:end + 1]
+
+
+class InMemoryRedis:
+    """
+    Minimal, thread-safe stand-in for the subset of redis-py used by the app.
+
+    Values behave like a client created with decode_responses=True: members
+    and keys are returned as strings, scores as floats.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+
+    # ----------------------
+    # Keys
+    # ----------------------
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if name in self._data)
+
+    def expire(self, name, seconds):
+        # Keys never expire in-process; callers only use TTLs as a memory bound
+        with self._lock:
+            return name in self._data
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+    # ----------------------
+    # Strings
+    # ----------------------
+    def get(self, name):
+        with self._lock:
+            value = self._data.get(name)
+            return None if value is None else str(value)
+
+    def set(self, name, value, ex=None, nx=False):
+        # `ex` is accepted for parity; keys never expire in-process
+        with self._lock:
+            if nx and name in self._data:
+                return None
+            self._data[name] = value
+            return True
+
+    def incrby(self, name, amount=1):
+        with self._lock:
+            self._data[name] = int(self._data.get(name, 0)) + amount
+            return self._data[name]
+
+    # ----------------------
+    # Sorted sets
+    # ----------------------
+    def _zset(self, name, create=False):
+        zset = self._data.get(name)
+        if zset is None and create:
+            zset = self._data[name] = {}
+        return zset if zset is not None else {}
+
+    def _sorted(self, name):
+        return sorted(self._zset(name).items(), key=lambda item: (item[1], item[0]))
+
+    def zadd(self, name, mapping, nx=False, xx=False, gt=False, lt=False, incr=False):
+        with self._lock:
+            zset = self._zset(name, create=True)
+            added = 0
+            result = None
+            for member, score in mapping.items():
+                member, score = str(member), float(score)
+                current = zset.get(member)
+                if current is None:
+                    if xx:
+                        continue
+                    added += 1
+                elif nx:
+                    continue
+                if incr:
+                    score += current or 0.0
+                if current is not None and ((gt and score <= current) or (lt and score >= current)):
+                    continue
+                zset[member] = result = score
+            if not zset:
+                del self._data[name]
+            return result if incr else added
+
+    def zincrby(self, name, amount, value):
+        with self._lock:
+            zset = self._zset(name, create=True)
+            value = str(value)
+            zset[value] = zset.get(value, 0.0) + float(amount)
+            return zset[value]
+
+    def zrem(self, name, *values):
+        with self._lock:
+            zset = self._zset(name)
+            removed = sum(1 for value in values if zset.pop(str(value), None) is not None)
+            if name in self._data and not zset:
+                del self._data[name]
+            return removed
+
+    def zscore(self, name, value):
+        with self._lock:
+            return self._zset(name).get(str(value))
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._zset(name))
+
+    def zcount(self, name, min, max):
+        with self._lock:
+            return len(self._range_by_score(name, min, max, reverse=False))
+
+    def zrange(self, name, start, end, withscores=False):
+        with self._lock:
+            items = _slice(self._sorted(name), start, end)
+        return items if withscores else [member for member, _ in items]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        with self._lock:
+            items = _slice(self._sorted(name)[::-1], start, end)
+        return items if withscores else [member for member, _ in items]
+
+    def _range_by_score(self, name, low, high, reverse):
+        low, low_exclusive = _parse_bound(low)
+        high, high_exclusive = _parse_bound(high)
+        items = [
+            (member, score) for member, score in self._sorted(name)
+            if (score > low if low_exclusive else score >= low)
+            and (score < high if high_exclusive else score <= high)
+        ]
+        return items[::-1] if reverse else items
+
+    def zrangebyscore(self, name, min, max, start=None, num=None, withscores=False):
+        with self._lock:
+            items = self._range_by_score(name, min, max, reverse=False)
+        if start is not None:
+            items = items[start:start + num if num is not None and num >= 0 else None]
+        return items if withscores else [member for member, _ in items]
+
+    def zrevrangebyscore(self, name, max, min, start=None, num=None, withscores=False):
+        with self._lock:
+            items = self._range_by_score(name, min, max, reverse=True)
+        if start is not None:
+            items = items[start:start + num if num is not None and num >= 0 else None]
+        return items if withscores else [member for member, _ in items]
+
+    def zremrangebyrank(self, name, min, max):
+        with self._lock:
+            doomed = _slice(self._sorted(name), min, max)
+            return self.zrem(name, *[member for member, _ in doomed]) if doomed else 0
+
+    def zremrangebyscore(self, name, min, max):
+        with self._lock:
+            doomed = self._range_by_score(name, min, max, reverse=False)
+            return self.zrem(name, *[member for member, _ in doomed]) if doomed else 0
+
+
+class _InMemoryPipeline:
+    """Buffers commands and runs them under the store lock on execute()."""
+
+    def __init__(self, store):
+        self._store = store
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+    def execute(self):
+        with self._store._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
@@ -0,0 +1,169 @@
+from django.conf import settings
+from graphql import (
+    GraphQLError, ValidationRule, get_named_type, get_nullable_type,
+    is_leaf_type, is_list_type, value_from_ast,
+)
+from graphql.language import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.pyutils import Undefined
+
+# Arguments that bound how many items a field returns
+SIZE_ARGUMENTS = ("first", "last", "limit")
+
+# Lists nested inside a page that the page field's own arguments bound:
+# (type, field) -> (argument giving each list's size, argument giving how
+# many levels of it are loaded)
+NESTED_LISTS = {
+    ("CommentTreeNodeType", "replies"): ("repliesPerNode", "maxDepth"),
+}
+
+
+def cost_settings():
+    return settings.GRAPHQL_QUERY_COST
+
+
+class CostEstimator:
+    """
+    Estimates the cost of an operation from its selection set.
+
+    Every object field costs 1 and leaf fields are free. A field that returns
+    a list, or takes a `first`/`limit` argument, multiplies the cost of its
+    selections by that size; unbounded lists such as reverse relations count
+    as DEFAULT_LIST_SIZE items. A field that takes a size argument but
+    returns a page object, such as a connection, is fetched once and its
+    size bounds the lists directly inside it (`edges`) instead; lists listed
+    in NESTED_LISTS take their size and depth from that field's arguments.
+    """
+
+    def __init__(self, schema, fragments, variables=None):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.default_list_size = cost_settings()["DEFAULT_LIST_SIZE"]
+
+    def estimate(self, operation):
+        """Return (cost, depth) for an operation definition."""
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return 0, 0
+        return self._selection_set(root_type, operation.selection_set, set())
+
+    def _selection_set(self, parent_type, selection_set, visited, page=None):
+        cost = depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self._field(parent_type, selection, visited, page)
+            elif isinstance(selection, InlineFragmentNode):
+                field_cost, field_depth = self._fragment(parent_type, selection, visited, page)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    # Unknown or cyclic spreads are reported by the standard rules
+                    continue
+                field_cost, field_depth = self._fragment(parent_type, fragment, visited | {name}, page)
+            else:
+                continue
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def _fragment(self, parent_type, fragment, visited, page=None):
+        if fragment.type_condition is not None:
+            parent_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+        return self._selection_set(parent_type, fragment.selection_set, visited, page)
+
+    def _field(self, parent_type, node, visited, page=None):
+        """
+        Price one field. `page` describes the enclosing page field, if any:
+        its resolved `arguments`, the `size` that bounds the lists directly
+        inside it (None further down) and the nesting `level` reached.
+        """
+        field = getattr(parent_type, "fields", {}).get(node.name.value)
+        if field is None or is_leaf_type(get_named_type(field.type)):
+            # Leaf fields, __typename and introspection fields are free
+            return 0, 1
+
+        multiplier, child_page = self._multiplier(parent_type, field, node, page)
+        child_cost, child_depth = 0, 0
+        if node.selection_set is not None:
+            child_cost, child_depth = self._selection_set(
+                get_named_type(field.type), node.selection_set, visited, child_page
+            )
+        return multiplier * (1 + child_cost), 1 + child_depth
+
+    def _arguments(self, field, node):
+        """The field's argument values, with variables substituted and defaults filled in."""
+        given = {argument.name.value: argument.value for argument in node.arguments or ()}
+        values = {}
+        for name, definition in field.args.items():
+            value = Undefined
+            if name in given:
+                value = value_from_ast(given[name], definition.type, self.variables)
+            if value is Undefined or value is None:
+                value = definition.default_value
+            if value is not Undefined:
+                values[name] = value
+        return values
+
+    def _multiplier(self, parent_type, field, node, page=None):
+        """Return (multiplier, page for the fields directly under it)."""
+        nested = NESTED_LISTS.get((parent_type.name, node.name.value))
+        if nested is not None and page is not None:
+            size_argument, depth_argument = nested
+            level = page["level"] + 1
+            size = page["arguments"].get(size_argument)
+            if isinstance(size, int):
+                limit = page["arguments"].get(depth_argument)
+                multiplier = max(size, 0) if not isinstance(limit, int) or level <= limit else 0
+                return multiplier, {**page, "size": None, "level": level}
+
+        arguments = self._arguments(field, node)
+        size = next((arguments[name] for name in SIZE_ARGUMENTS if isinstance(arguments.get(name), int)), None)
+        is_list = is_list_type(get_nullable_type(field.type))
+        if size is not None:
+            size = max(size, 0)
+            return (size, None) if is_list else (1, {"arguments": arguments, "size": size, "level": 0})
+        if is_list:
+            if page is not None and page["size"] is not None:
+                return page["size"], {**page, "size": None}
+            return self.default_list_size, None
+        return 1, None
+
+
+def query_cost_rule(variables=None, operation_name=None, on_cost=None):
+    """
+    Build a validation rule that rejects the operation being executed when it
+    exceeds the configured MAX_COST or MAX_DEPTH, before any resolver runs.
+
+    Validation rules only see the document, so the rule is built per request
+    with the request's variables. `on_cost(cost, depth, rejected)` is called
+    with the estimate and may return an error message to reject an operation
+    that is within the limits, e.g. when a client has spent its budget.
+    """
+
+    class QueryCostRule(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            if operation_name and (node.name is None or node.name.value != operation_name):
+                return
+
+            fragments = {
+                definition.name.value: definition
+                for definition in self.context.document.definitions
+                if isinstance(definition, FragmentDefinitionNode)
+            }
+            cost, depth = CostEstimator(self.context.schema, fragments, variables).estimate(node)
+
+            limits = cost_settings()
+            if cost > limits["MAX_COST"]:
+                message = f"Query cost {cost} exceeds the maximum allowed cost of {limits['MAX_COST']}."
+            elif depth > limits["MAX_DEPTH"]:
+                message = f"Query depth {depth} exceeds the maximum allowed depth of {limits['MAX_DEPTH']}."
+            else:
+                message = None
+
+            if on_cost is not None:
+                message = on_cost(cost, depth, rejected=message is not None) or message
+            if message:
+                self.report_error(GraphQLError(message, node))
+
+    return QueryCostRule
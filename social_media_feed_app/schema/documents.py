@@ -0,0 +1,161 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from graphql import GraphQLError, parse, validate
+from social_media_feed_app.redis_store import get_redis
+
+
+def persisted_query_settings():
+    return settings.GRAPHQL_PERSISTED_QUERIES
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def store_key(sha):
+    return f"persisted_query:{sha}"
+
+
+class PersistedQueryError(GraphQLError):
+    """Error for persisted query lookups, carrying the code clients switch on."""
+
+    def __init__(self, message, code):
+        super().__init__(message, extensions={"code": code})
+
+
+class CachedDocument:
+    """A parsed document and the result of the standard validation rules."""
+
+    __slots__ = ("query", "document", "errors", "persisted")
+
+    def __init__(self, query, document, errors, persisted):
+        self.query = query
+        self.document = document
+        self.errors = errors
+        self.persisted = persisted
+
+
+class DocumentCache:
+    """Thread-safe LRU of CachedDocuments keyed by the SHA-256 of the query text."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sha):
+        with self._lock:
+            entry = self._entries.get(sha)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sha)
+            self.hits += 1
+            return entry
+
+    def put(self, sha, entry):
+        with self._lock:
+            self._entries[sha] = entry
+            self._entries.move_to_end(sha)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def document_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DocumentCache(persisted_query_settings()["CACHE_SIZE"])
+    return _cache
+
+
+def requested_hash(extensions):
+    """Return the sha256Hash of an Apollo-style `persistedQuery` extension, if any."""
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get("persistedQuery")
+    if isinstance(persisted, dict) and persisted.get("version", 1) == 1:
+        return persisted.get("sha256Hash")
+    return None
+
+
+def register(query, ttl=None):
+    """Add a query to the persisted query store and return its hash."""
+    sha = query_hash(query)
+    get_redis().set(store_key(sha), query, ex=ttl)
+    return sha
+
+
+def _compile(schema, query, persisted):
+    try:
+        document = parse(query)
+    except GraphQLError as error:
+        return CachedDocument(query, None, [error], persisted)
+    return CachedDocument(query, document, validate(schema, document), persisted)
+
+
+def resolve_document(schema, query=None, sha=None):
+    """
+    Return the CachedDocument for a request, parsing and validating it only
+    the first time its text is seen.
+
+    `sha` is the client's persisted query hash. Without `query` it is looked
+    up in the store; with it, the pair is verified and registered. When
+    REQUIRE_PERSISTED is set, only queries already in the store are accepted
+    and nothing is registered.
+    """
+    config = persisted_query_settings()
+    redis = get_redis()
+
+    if query:
+        actual = query_hash(query)
+        if sha and sha != actual:
+            raise PersistedQueryError("provided sha does not match query", "INVALID_PERSISTED_QUERY_HASH")
+        client_sent_hash, sha = bool(sha), actual
+    else:
+        client_sent_hash = True
+
+    cache = document_cache()
+    entry = cache.get(sha)
+    if entry is None:
+        if not query:
+            query = redis.get(store_key(sha))
+            if query is None:
+                raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            persisted = True
+        else:
+            persisted = bool(redis.exists(store_key(sha)))
+        entry = _compile(schema, query, persisted)
+        cache.put(sha, entry)
+
+    if config["REQUIRE_PERSISTED"]:
+        if not entry.persisted:
+            # It may have been registered since it was cached
+            entry.persisted = bool(redis.exists(store_key(sha)))
+        if not entry.persisted:
+            raise PersistedQueryError("Only persisted queries are allowed.", "PERSISTED_QUERY_REQUIRED")
+    elif client_sent_hash and not entry.persisted and not entry.errors:
+        register(entry.query, ttl=config["TTL"])
+        entry.persisted = True
+
+    return entry
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from social_media_feed_app.models import Comment, CommentLike, PostLike
+
+
+class BatchLoader:
+    """
+    Synchronous, request-scoped loader.
+
+    List resolvers call `expect()` with the keys of the page they are about to
+    return. The first `load()` that misses the cache resolves every expected key
+    with a single call to `batch_load_fn`, so a page of N rows costs one query
+    per field instead of N.
+    """
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._pending = set()
+
+    def expect(self, keys):
+        self._pending.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            keys = list(self._pending)
+            self._pending.clear()
+            results = self.batch_load_fn(keys)
+            for k in keys:
+                self._cache[k] = results.get(k, self.default)
+        return self._cache[key]
+
+    def prime(self, key, value):
+        self._cache[key] = value
+        self._pending.discard(key)
+
+    def clear(self, key):
+        self._cache.pop(key, None)
+
+
+def _count_by(queryset, field, keys):
+    rows = queryset.filter(**{f"{field}__in": keys}).values(field).annotate(total=Count("id")).order_by()
+    return {row[field]: row["total"] for row in rows}
+
+
+class Loaders:
+    """All loaders for one GraphQL request, keyed by model primary key."""
+
+    def __init__(self, user):
+        self.user = user
+
+        # Post engagement counts are denormalized onto the row, so only the
+        # viewer-specific flag needs batching
+        self.post_liked_by_user = BatchLoader(self._load_post_liked_by_user, default=False)
+
+        self.comment_likes_count = BatchLoader(
+            lambda keys: _count_by(CommentLike.objects, "comment_id", keys), default=0
+        )
+        self.comment_liked_by_user = BatchLoader(self._load_comment_liked_by_user, default=False)
+        self.comment_reply_count = BatchLoader(
+            lambda keys: _count_by(Comment.objects.filter(is_deleted=False), "parent_comment_id", keys), default=0
+        )
+        # One loader per preview size, since the size is a field argument
+        self._reply_previews = {}
+        self._comment_keys = set()
+
+    def _load_post_liked_by_user(self, keys):
+        liked = PostLike.objects.filter(user=self.user, post_id__in=keys).values_list("post_id", flat=True)
+        return {post_id: True for post_id in liked}
+
+    def _load_comment_liked_by_user(self, keys):
+        liked = CommentLike.objects.filter(user=self.user, comment_id__in=keys).values_list("comment_id", flat=True)
+        return {comment_id: True for comment_id in liked}
+
+    def _load_reply_previews(self, keys, first):
+        # Numbering replies within each parent keeps the result at most
+        # `first` rows per comment, however many replies a comment has
+        replies = Comment.objects.filter(
+            parent_comment_id__in=keys, is_deleted=False
+        ).annotate(position=Window(
+            RowNumber(), partition_by=F("parent_comment_id"), order_by=(F("created_at").asc(), F("id").asc())
+        )).filter(position__lte=first).select_related("user").order_by("created_at", "id")
+
+        previews = defaultdict(list)
+        for reply in replies:
+            previews[reply.parent_comment_id].append(reply)
+        self.expect_comments([reply for rows in previews.values() for reply in rows])
+        return previews
+
+    def reply_preview(self, first):
+        loader = self._reply_previews.get(first)
+        if loader is None:
+            loader = BatchLoader(lambda keys: self._load_reply_previews(keys, first), default=[])
+            loader.expect(self._comment_keys)
+            self._reply_previews[first] = loader
+        return loader
+
+    def expect_posts(self, posts):
+        self.post_liked_by_user.expect([post.id for post in posts])
+
+    def expect_comments(self, comments):
+        keys = [comment.id for comment in comments]
+        self.comment_likes_count.expect(keys)
+        self.comment_liked_by_user.expect(keys)
+        self.comment_reply_count.expect(keys)
+        self._comment_keys.update(keys)
+        for loader in self._reply_previews.values():
+            loader.expect(keys)
+
+
+def get_loaders(info):
+    """Return the loaders for the current request, creating them on first use."""
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if not isinstance(loaders, Loaders):
+        loaders = Loaders(context.user)
+        setattr(context, "loaders", loaders)
+    return loaders
+
+
+def fresh_loaders(info):
+    """
+    Replace the context's loaders with empty ones and return them.
+
+    A subscription's context lives as long as its socket, so each publish
+    starts from fresh loaders instead of whatever earlier events cached.
+    """
+    loaders = Loaders(info.context.user)
+    setattr(info.context, "loaders", loaders)
+    return loaders
@@ -1,12 +1,16 @@
+import uuid
 import graphene
 import graphql_jwt
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.db import transaction
 from .types import *
 from .inputs import *
 from social_media_feed_app.models import *
 from .subscriptions import PostCreatedSubscription
+from .snapshots import post_snapshot
+from social_media_feed_app import messaging
 
 class RegisterUser(graphene.Mutation):
     success = graphene.Boolean()
@@ -132,68 +136,6 @@ class UpdateUserProfile(graphene.Mutation):
                 errors=[str(e)]
             )
 
-class CreatePost(graphene.Mutation):
-    success = graphene.Boolean()
-    message = graphene.String()
-    post = graphene.Field(PostType)
-    errors = graphene.List(graphene.String)
-    
-    class Arguments:
-        input = CreatePostInput(required=True)
-    
-    def mutate(self, info, input):
-        user = info.context.user
-        if not user.is_authenticated:
-            return CreatePost(
-                success=False,
-                message="Authentication required",
-                errors=["You must be logged in to create a post"]
-            )
-        
-        try:
-            if not input.content.strip():
-                return CreatePost(
-                    success=False,
-                    message="Content cannot be empty",
-                    errors=["Content is required"]
-                )
-            
-            post = Post.objects.create(
-                user=user,
-                title=input.title,
-                content=input.content.strip(),
-                media_type=input.media_type
-            )
-            
-            # ✅ Fixed subscription broadcasting
-            from .subscriptions import PostCreatedSubscription
-            
-            # Broadcast to general post created group
-            PostCreatedSubscription.broadcast(
-                payload=post,
-                group="post_created"
-            )
-            
-            # Broadcast to user-specific group
-            PostCreatedSubscription.broadcast(
-                payload=post,
-                group=f"post_created_by_{user.id}"
-            )
-            
-            return CreatePost(
-                success=True,
-                message="Post created successfully",
-                post=post,
-                errors=[]
-            )
-            
-        except Exception as e:
-            return CreatePost(
-                success=False,
-                message="An error occurred while creating the post",
-                errors=[str(e)]
-            )
-
 class UpdatePost(graphene.Mutation):
     success = graphene.Boolean()
     message = graphene.String()
@@ -268,9 +210,11 @@ class DeletePost(graphene.Mutation):
             )
         
         try:
-            post = Post.objects.get(id=id, user=user, is_deleted=False)
-            post.is_deleted = True
-            post.save()
+            with transaction.atomic():
+                # Locked so concurrent deletes apply the side effects once
+                post = Post.objects.select_for_update().get(id=id, user=user, is_deleted=False)
+                post.is_deleted = True
+                post.save()
             
             return DeletePost(
                 success=True,
@@ -309,11 +253,13 @@ class LikePost(graphene.Mutation):
             )
         
         try:
-            # Check if already liked
-            like, created = PostLike.objects.get_or_create(
-                post=post,
-                user=user
-            )
+            # Check if already liked; the like_count update commits with the row
+            with transaction.atomic():
+                like, created = PostLike.objects.get_or_create(
+                    post=post,
+                    user=user
+                )
+            post.refresh_from_db(fields=['like_count'])
             
             if created:
                 return LikePost(
@@ -362,7 +308,9 @@ class UnlikePost(graphene.Mutation):
         
         try:
             like = PostLike.objects.get(post=post, user=user)
-            like.delete()
+            with transaction.atomic():
+                like.delete()
+            post.refresh_from_db(fields=['like_count'])
             
             return UnlikePost(
                 success=True,
@@ -432,12 +380,13 @@ class CreateComment(graphene.Mutation):
                     errors=["Content is required"]
                 )
                 
-            comment = Comment.objects.create(
-                post=post,
-                user=user,
-                parent_comment=parent_comment,
-                content=input.content.strip()
-            )
+            with transaction.atomic():
+                comment = Comment.objects.create(
+                    post=post,
+                    user=user,
+                    parent_comment=parent_comment,
+                    content=input.content.strip()
+                )
             
             return CreateComment(
                 success=True,
@@ -511,6 +460,16 @@ class CreatePost(graphene.Mutation):
                 media_type=media_type
             )
             
+            # One snapshot serves every subscriber of both groups, sent once
+            # the post is committed so subscribers can load it
+            snapshot = post_snapshot(post)
+            
+            def broadcast():
+                PostCreatedSubscription.broadcast(payload=snapshot, group="post_created")
+                PostCreatedSubscription.broadcast(payload=snapshot, group=f"post_created_by_{user.id}")
+            
+            transaction.on_commit(broadcast)
+            
             # Return success response
             return CreatePost(
                 success=True,
@@ -556,12 +515,13 @@ class SharePost(graphene.Mutation):
             )
         
         try:
-            # Check if already shared
-            share, created = Share.objects.get_or_create(
-                post=post,
-                user=user,
-                defaults={'caption': input.caption}
-            )
+            # Check if already shared; the share_count update commits with the row
+            with transaction.atomic():
+                share, created = Share.objects.get_or_create(
+                    post=post,
+                    user=user,
+                    defaults={'caption': input.caption}
+                )
             
             if created:
                 return SharePost(
@@ -686,7 +646,96 @@ class UnfollowUser(graphene.Mutation):
                 message=f"You were not following {followee.username}",
                 followee=followee
             )
-   
+
+
+class SendMessage(graphene.Mutation):
+    success = graphene.Boolean()
+    message = graphene.String()
+    sent_message = graphene.Field(MessageType)
+    
+    class Arguments:
+        receiver_id = graphene.ID(required=True)
+        content = graphene.String(required=True)
+    
+    def mutate(self, info, receiver_id, content):
+        user = info.context.user
+        if not user.is_authenticated:
+            return SendMessage(
+                success=False,
+                message="Authentication required"
+            )
+        
+        try:
+            receiver_id = uuid.UUID(str(receiver_id))
+        except ValueError:
+            return SendMessage(
+                success=False,
+                message="User not found"
+            )
+        
+        if user.id == receiver_id:
+            return SendMessage(
+                success=False,
+                message="You cannot message yourself"
+            )
+        
+        if not content.strip():
+            return SendMessage(
+                success=False,
+                message="Message cannot be empty"
+            )
+        
+        if not CustomUser.objects.filter(id=receiver_id).exists():
+            return SendMessage(
+                success=False,
+                message="User not found"
+            )
+        
+        # The receiver's unread counter is raised in the same transaction
+        with transaction.atomic():
+            sent = Message.objects.create(sender=user, receiver_id=receiver_id, content=content.strip())
+        
+        return SendMessage(
+            success=True,
+            message="Message sent",
+            sent_message=sent
+        )
+
+class MarkConversationRead(graphene.Mutation):
+    success = graphene.Boolean()
+    message = graphene.String()
+    marked_count = graphene.Int()
+    unread_count = graphene.Int()
+    
+    class Arguments:
+        peer_id = graphene.ID(required=True)
+    
+    def mutate(self, info, peer_id):
+        user = info.context.user
+        if not user.is_authenticated:
+            return MarkConversationRead(
+                success=False,
+                message="Authentication required"
+            )
+        
+        try:
+            peer_id = uuid.UUID(str(peer_id))
+        except ValueError:
+            peer_id = None
+        if peer_id is None or not CustomUser.objects.filter(id=peer_id).exists():
+            return MarkConversationRead(
+                success=False,
+                message="User not found"
+            )
+        
+        marked = messaging.mark_conversation_read(user.id, peer_id)
+        return MarkConversationRead(
+            success=True,
+            message=f"Marked {marked} messages as read",
+            marked_count=marked,
+            unread_count=messaging.unread_count(user.id)
+        )
+
 
 class Mutation(graphene.ObjectType):
     # Authentication
@@ -707,4 +756,8 @@ class Mutation(graphene.ObjectType):
     unlike_post = UnlikePost.Field()
     share_post = SharePost.Field()
     follow_user = FollowUser.Field()
-    unfollow_user = UnfollowUser.Field()
\ No newline at end of file
+    unfollow_user = UnfollowUser.Field()
+    
+    # Messaging mutations
+    send_message = SendMessage.Field()
+    mark_conversation_read = MarkConversationRead.Field()
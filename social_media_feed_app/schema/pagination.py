@@ -0,0 +1,81 @@
+import base64
+import uuid
+from datetime import datetime
+from graphene import relay
+from graphql import GraphQLError
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, pk):
+    """Encode a row's (created_at, id) sort key as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by `encode_cursor` back into (created_at, id)."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise GraphQLError("Invalid cursor.")
+
+
+def encode_score_cursor(score, pk):
+    """Encode a (score, id) sort key, for rankings that are not ordered by time."""
+    raw = f"{score!r}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_score_cursor(cursor):
+    try:
+        score, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(score), uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise GraphQLError("Invalid cursor.")
+
+
+def page_size(first):
+    if first < 0:
+        raise GraphQLError("Argument 'first' must be a non-negative integer.")
+    return min(first, MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, first, after=None, descending=True):
+    """
+    Return (rows, has_next_page) for the page of `queryset` following `after`.
+
+    Rows are ordered by (created_at, id). The seek predicate keeps a plain range
+    condition on created_at so it can use the (.., created_at) indexes; the id
+    comparison only breaks ties between rows created in the same microsecond.
+    """
+    first = page_size(first)
+    if after:
+        created_at, pk = decode_cursor(after)
+        if descending:
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+        else:
+            queryset = queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+
+    ordering = ('-created_at', '-id') if descending else ('created_at', 'id')
+    rows = list(queryset.order_by(*ordering)[:first + 1])
+    return rows[:first], len(rows) > first
+
+
+def build_connection(connection_type, rows, has_next_page, after=None, cursor_for=None):
+    """
+    Wrap a page of rows in a Relay connection with cursors and pageInfo.
+    Cursors encode (created_at, id) unless `cursor_for(row)` says otherwise.
+    """
+    cursor_for = cursor_for or (lambda row: encode_cursor(row.created_at, row.id))
+    edges = [connection_type.Edge(node=row, cursor=cursor_for(row)) for row in rows]
+    return connection_type(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=has_next_page,
+        ),
+    )
@@ -0,0 +1,157 @@
+import random
+import threading
+from time import perf_counter
+from django.conf import settings
+from django.db import connection
+
+
+def profiling_settings():
+    return settings.GRAPHQL_PROFILING
+
+
+def field_path(path):
+    """Dotted path of a resolved field with list indexes dropped, e.g. userFeed.likesCount."""
+    return ".".join(str(key) for key in path.as_list() if not isinstance(key, int))
+
+
+class FieldStats:
+    __slots__ = ("calls", "seconds", "max_seconds", "queries", "query_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, calls, seconds, max_seconds, queries, query_seconds):
+        self.calls += calls
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, max_seconds)
+        self.queries += queries
+        self.query_seconds += query_seconds
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "totalMs": round(self.seconds * 1000, 3),
+            "maxMs": round(self.max_seconds * 1000, 3),
+            "queries": self.queries,
+            "queryMs": round(self.query_seconds * 1000, 3),
+        }
+
+
+class ResolverProfile:
+    """Timings for one request, keyed by field path."""
+
+    def __init__(self, operation_name, expose=False):
+        self.operation_name = operation_name
+        self.expose = expose
+        self.fields = {}
+
+    def record(self, path, seconds, queries, query_seconds):
+        stats = self.fields.get(path)
+        if stats is None:
+            stats = self.fields[path] = FieldStats()
+        stats.add(1, seconds, seconds, queries, query_seconds)
+
+    def as_dict(self):
+        return {path: stats.as_dict() for path, stats in self.fields.items()}
+
+
+class ProfileAggregate:
+    """Process-wide totals of sampled requests, keyed by operation name then field path."""
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def merge(self, profile):
+        with self._lock:
+            operation = self._operations.setdefault(profile.operation_name, {"requests": 0, "fields": {}})
+            operation["requests"] += 1
+            for path, stats in profile.fields.items():
+                total = operation["fields"].get(path)
+                if total is None:
+                    total = operation["fields"][path] = FieldStats()
+                total.add(stats.calls, stats.seconds, stats.max_seconds, stats.queries, stats.query_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "requests": operation["requests"],
+                    "fields": {path: stats.as_dict() for path, stats in operation["fields"].items()},
+                }
+                for name, operation in self._operations.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+aggregate = ProfileAggregate()
+
+
+def _start_profile(info):
+    """Decide once per request whether to profile it, and return its profile or None."""
+    context = info.context
+    profile = getattr(context, "resolver_profile", None)
+    if profile is False or isinstance(profile, ResolverProfile):
+        return profile or None
+
+    config = profiling_settings()
+    expose = bool(getattr(context, "META", {}).get("HTTP_X_PROFILE_RESOLVERS")) and (
+        config["EXPOSE_EXTENSIONS"] or getattr(getattr(context, "user", None), "is_staff", False)
+    )
+    if expose or random.random() < config["SAMPLE_RATE"]:
+        operation = info.operation.name.value if info.operation.name else "anonymous"
+        profile = ResolverProfile(operation, expose=expose)
+    else:
+        profile = False
+    setattr(context, "resolver_profile", profile)
+    return profile or None
+
+
+def finish_profile(context):
+    """Fold a request's profile into the aggregate and return it, or None if it was not sampled."""
+    profile = getattr(context, "resolver_profile", None)
+    if not isinstance(profile, ResolverProfile):
+        return None
+    aggregate.merge(profile)
+    return profile
+
+
+class ResolverProfilingMiddleware:
+    """
+    Records wall time and the number and duration of SQL queries for every
+    resolved field of a sampled request.
+
+    SAMPLE_RATE of requests are profiled; the rest pay only for one attribute
+    lookup per field. Clients can ask for a profile in the response
+    `extensions` with an X-Profile-Resolvers header when EXPOSE_EXTENSIONS is
+    on or they are staff.
+    """
+
+    def resolve(self, next, root, info, **args):
+        profile = _start_profile(info)
+        if profile is None:
+            return next(root, info, **args)
+
+        queries = [0, 0.0]
+
+        def count_queries(execute, sql, params, many, context):
+            start = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += perf_counter() - start
+
+        start = perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                return next(root, info, **args)
+        finally:
+            profile.record(field_path(info.path), perf_counter() - start, queries[0], queries[1])
@@ -1,11 +1,27 @@
+import uuid
 import graphene
-from django.db.models import Count, Q, F
+from django.db.models import F, Subquery
 from django.utils import timezone
 from datetime import timedelta
 from .types import *
+from .loaders import get_loaders
+from .pagination import (
+    keyset_page, build_connection, decode_cursor, encode_cursor, page_size,
+    encode_score_cursor, decode_score_cursor
+)
 from social_media_feed_app.models import *
+from social_media_feed_app import comment_tree, messaging, pymk, search, timelines, trending
+from social_media_feed_app.ranking import relevance_page
 from graphql import GraphQLError
 
+def posts_in_order(post_ids):
+    """Fetch live posts by ID, preserving the order of `post_ids`."""
+    posts_by_id = Post.objects.filter(
+        id__in=post_ids,
+        is_deleted=False
+    ).select_related('user').in_bulk()
+    return [posts_by_id[post_id] for post_id in map(uuid.UUID, post_ids) if post_id in posts_by_id]
+
 class Query(graphene.ObjectType):
     # Post queries
     all_posts = graphene.List(
@@ -23,29 +39,104 @@ class Query(graphene.ObjectType):
     user_feed = graphene.List(
         PostType,
         limit=graphene.Int(default_value=10),
-        offset=graphene.Int(default_value=0)
+        offset=graphene.Int(default_value=0),
+        ranking=FeedRanking(default_value=FeedRanking.CHRONOLOGICAL)
+    )
+    
+    
+    # Cursor-paginated post queries
+    all_posts_connection = graphene.Field(
+        PostConnection,
+        first=graphene.Int(default_value=10),
+        after=graphene.String(),
+        user_id=graphene.ID()
+    )
+    user_feed_connection = graphene.Field(
+        PostConnection,
+        first=graphene.Int(default_value=10),
+        after=graphene.String()
+    )
+    search_posts = graphene.Field(
+        PostConnection,
+        query=graphene.String(required=True),
+        first=graphene.Int(default_value=10),
+        after=graphene.String()
     )
     
     # Comment queries
     post_comments = graphene.List(CommentType, post_id=graphene.ID(required=True))
     comment_replies = graphene.List(CommentType, comment_id=graphene.ID(required=True))
+    post_comments_connection = graphene.Field(
+        CommentConnection,
+        post_id=graphene.ID(required=True),
+        first=graphene.Int(default_value=20),
+        after=graphene.String()
+    )
+    comment_replies_connection = graphene.Field(
+        CommentConnection,
+        comment_id=graphene.ID(required=True),
+        first=graphene.Int(default_value=20),
+        after=graphene.String()
+    )
+    comment_tree = graphene.Field(
+        CommentTreeType,
+        post_id=graphene.ID(required=True),
+        max_depth=graphene.Int(default_value=3),
+        replies_per_node=graphene.Int(default_value=3),
+        first=graphene.Int(default_value=20),
+        after=graphene.String()
+    )
     
     # User queries
     user_by_id = graphene.Field(CustomUserType, id=graphene.ID(required=True))
     user_stats = graphene.Field(UserStatsType, id=graphene.ID(required=True))
-    search_users = graphene.List(CustomUserType, query=graphene.String(required=True))
+    search_users = graphene.List(
+        CustomUserType,
+        query=graphene.String(required=True),
+        limit=graphene.Int(default_value=10)
+    )
+    autocomplete_users = graphene.List(
+        CustomUserType,
+        prefix=graphene.String(required=True),
+        limit=graphene.Int(default_value=10)
+    )
+    suggested_users = graphene.List(CustomUserType, limit=graphene.Int(default_value=10))
+    
+    # Messaging queries
+    conversations = graphene.Field(
+        ConversationConnection,
+        first=graphene.Int(default_value=20),
+        after=graphene.String()
+    )
+    messages = graphene.Field(
+        MessageConnection,
+        peer_id=graphene.ID(required=True),
+        first=graphene.Int(default_value=20),
+        after=graphene.String()
+    )
+    unread_message_count = graphene.Int()
+    
+    # Analytics, read from the daily rollups
+    interaction_stats = graphene.List(
+        InteractionRollupType,
+        target_type=graphene.String(required=True),
+        target_id=graphene.ID(required=True),
+        days=graphene.Int(default_value=30)
+    )
     
     def resolve_all_posts(self, info, limit=10, offset=0, user_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("Authentication credentials were not provided.")
-        queryset = Post.objects.filter(is_deleted=False).select_related('user').prefetch_related('likes', 'comments', 'shares')
+        queryset = Post.objects.filter(is_deleted=False).select_related('user')
         
         if user_id:
             queryset = queryset.filter(user_id=user_id)
         
         queryset = queryset.order_by('-created_at')
-        return queryset[offset:offset + limit]
+        posts = list(queryset[offset:offset + limit])
+        get_loaders(info).expect_posts(posts)
+        return posts
     
     def resolve_post_by_id(self, info, id):
         user = info.context.user
@@ -61,21 +152,36 @@ class Query(graphene.ObjectType):
         except Post.DoesNotExist:
             return None
         
-    def resolve_user_feed(self, info, limit=10, offset=0):
+    def resolve_user_feed(self, info, limit=10, offset=0, ranking=FeedRanking.CHRONOLOGICAL):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("Authentication credentials were not provided.")
         
+        if ranking == FeedRanking.RELEVANCE:
+            # Only the newest FEED_RANKING["CANDIDATES"] posts are ranked
+            posts = posts_in_order(relevance_page(user.id, offset, limit))
+            get_loaders(info).expect_posts(posts)
+            return posts
+        
+        post_ids = timelines.read(user.id, offset, limit)
+        if post_ids is not None:
+            posts = posts_in_order(post_ids)
+            get_loaders(info).expect_posts(posts)
+            return posts
+        
+        # Page lies beyond the materialized timeline; read it from the database
         following_users = Follow.objects.filter(follower=user).values_list('followee_id', flat=True)
         user_ids = list(following_users) + [user.id]
         
         queryset = Post.objects.filter(
             user_id__in=user_ids,
             is_deleted=False
-        ).select_related('user').prefetch_related('likes', 'comments', 'shares')
+        ).select_related('user')
         
         queryset = queryset.order_by('-created_at')
-        return queryset[offset:offset + limit]
+        posts = list(queryset[offset:offset + limit])
+        get_loaders(info).expect_posts(posts)
+        return posts
     
     def resolve_post_comments(self, info, post_id):
         
@@ -83,11 +189,13 @@ class Query(graphene.ObjectType):
         if not user.is_authenticated:
             raise GraphQLError("Authentication credentials were not provided.")
         
-        return Comment.objects.filter(
+        comments = list(Comment.objects.filter(
             post_id=post_id,
             parent_comment=None,
             is_deleted=False
-        ).select_related('user').prefetch_related('replies', 'likes').order_by('created_at')
+        ).select_related('user').order_by('created_at'))
+        get_loaders(info).expect_comments(comments)
+        return comments
     
     def resolve_comment_replies(self, info, comment_id):
         
@@ -95,10 +203,132 @@ class Query(graphene.ObjectType):
         if not user.is_authenticated:
             raise GraphQLError("Authentication credentials were not provided.")
         
-        return Comment.objects.filter(
+        comments = list(Comment.objects.filter(
+            parent_comment_id=comment_id,
+            is_deleted=False
+        ).select_related('user').order_by('created_at'))
+        get_loaders(info).expect_comments(comments)
+        return comments
+    
+    def resolve_all_posts_connection(self, info, first=10, after=None, user_id=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        # Seeks on idx_post_timeline, or idx_post_feed when filtered by author
+        queryset = Post.objects.filter(is_deleted=False).select_related('user')
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        
+        posts, has_next_page = keyset_page(queryset, first, after)
+        get_loaders(info).expect_posts(posts)
+        return build_connection(PostConnection, posts, has_next_page, after)
+    
+    def resolve_user_feed_connection(self, info, first=10, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        first = page_size(first)
+        post_ids = timelines.read_after(user.id, decode_cursor(after) if after else None, first + 1)
+        if post_ids is not None:
+            posts = posts_in_order(post_ids)
+            has_next_page = len(posts) > first
+            posts = posts[:first]
+        else:
+            # Page runs past the materialized timeline; seek on idx_post_feed
+            following_users = Follow.objects.filter(follower=user).values_list('followee_id', flat=True)
+            queryset = Post.objects.filter(
+                user_id__in=list(following_users) + [user.id],
+                is_deleted=False
+            ).select_related('user')
+            posts, has_next_page = keyset_page(queryset, first, after)
+        
+        get_loaders(info).expect_posts(posts)
+        return build_connection(PostConnection, posts, has_next_page, after)
+    
+    def resolve_search_posts(self, info, query, first=10, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        posts, has_next_page = search.search_posts(
+            query, page_size(first), decode_score_cursor(after) if after else None
+        )
+        get_loaders(info).expect_posts(posts)
+        return build_connection(
+            PostConnection, posts, has_next_page, after,
+            cursor_for=lambda post: encode_score_cursor(post.search_score, post.id)
+        )
+    
+    def resolve_post_comments_connection(self, info, post_id, first=20, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        # Seeks on idx_comment_toplevel
+        queryset = Comment.objects.filter(
+            post_id=post_id,
+            parent_comment=None,
+            is_deleted=False
+        ).select_related('user')
+        
+        comments, has_next_page = keyset_page(queryset, first, after, descending=False)
+        get_loaders(info).expect_comments(comments)
+        return build_connection(CommentConnection, comments, has_next_page, after)
+    
+    def resolve_comment_replies_connection(self, info, comment_id, first=20, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        # Filtering on the parent's post as well lets the seek use idx_comment_thread
+        queryset = Comment.objects.filter(
+            post_id=Subquery(Comment.objects.filter(id=comment_id).values('post_id')[:1]),
             parent_comment_id=comment_id,
             is_deleted=False
-        ).select_related('user').prefetch_related('likes').order_by('created_at')
+        ).select_related('user')
+        
+        comments, has_next_page = keyset_page(queryset, first, after, descending=False)
+        get_loaders(info).expect_comments(comments)
+        return build_connection(CommentConnection, comments, has_next_page, after)
+    
+    def resolve_comment_tree(self, info, post_id, max_depth=3, replies_per_node=3, first=20, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        first = page_size(first)
+        roots, has_next_page, comments = comment_tree.load_tree(
+            post_id, first, decode_cursor(after) if after else None,
+            max_depth=max_depth, replies=replies_per_node
+        )
+        loaders = get_loaders(info)
+        loaders.expect_comments(comments)
+        for comment in comments:
+            loaders.comment_reply_count.prime(comment.id, comment.reply_count)
+        
+        def node(comment):
+            replies = comment.tree_replies
+            has_more = comment.reply_count > len(replies)
+            return CommentTreeNodeType(
+                comment=comment,
+                depth=comment.depth,
+                reply_count=comment.reply_count,
+                replies=[node(reply) for reply in replies],
+                has_more_replies=has_more,
+                replies_cursor=encode_cursor(replies[-1].created_at, replies[-1].id) if has_more and replies else None
+            )
+        
+        return CommentTreeType(
+            nodes=[node(root) for root in roots],
+            page_info=graphene.relay.PageInfo(
+                start_cursor=encode_cursor(roots[0].created_at, roots[0].id) if roots else None,
+                end_cursor=encode_cursor(roots[-1].created_at, roots[-1].id) if roots else None,
+                has_previous_page=bool(after),
+                has_next_page=has_next_page,
+            )
+        )
     
     def resolve_trending_posts(self, info, limit=10, hours=24):
         
@@ -108,17 +338,37 @@ class Query(graphene.ObjectType):
         
         time_threshold = timezone.now() - timedelta(hours=hours)
         
+        # Standard windows (1h/24h/7d) are read from the decayed leaderboard,
+        # reading further down it while expired or deleted posts leave the page short
+        post_ids = trending.top_post_ids(hours, limit)
+        if post_ids is not None:
+            posts, offset = [], 0
+            while True:
+                posts += [post for post in posts_in_order(post_ids) if post.created_at >= time_threshold]
+                offset += len(post_ids)
+                if len(posts) >= limit or len(post_ids) < limit * 2:
+                    break
+                post_ids = trending.top_post_ids(hours, limit, offset)
+            posts = posts[:limit]
+            get_loaders(info).expect_posts(posts)
+            return posts
+        
+        # Every engagement on a post created inside the window is itself inside
+        # the window, so the denormalized counters equal the windowed counts
         queryset = Post.objects.filter(
             created_at__gte=time_threshold,
             is_deleted=False
         ).annotate(
-            recent_likes=Count('likes', filter=Q(likes__created_at__gte=time_threshold)),
-            recent_comments=Count('comments', filter=Q(comments__created_at__gte=time_threshold, comments__is_deleted=False)),
-            recent_shares=Count('shares', filter=Q(shares__created_at__gte=time_threshold)),
-            engagement_score=F('recent_likes') + F('recent_comments') * 2 + F('recent_shares') * 3
-        ).select_related('user').prefetch_related('likes', 'comments', 'shares')
+            engagement_score=(
+                F('like_count') * trending.LIKE_WEIGHT
+                + F('comment_count') * trending.COMMENT_WEIGHT
+                + F('share_count') * trending.SHARE_WEIGHT
+            )
+        ).select_related('user')
         
-        return queryset.order_by('-engagement_score')[:limit]
+        posts = list(queryset.order_by('-engagement_score')[:limit])
+        get_loaders(info).expect_posts(posts)
+        return posts
     
     def resolve_user_by_id(self, info, id):
         
@@ -140,38 +390,103 @@ class Query(graphene.ObjectType):
             raise GraphQLError("Authentication credentials were not provided.")
         
         try:
-            user = CustomUser.objects.get(id=id)
-        except CustomUser.DoesNotExist:
-            return None
+            stats = UserStats.objects.select_related('top_post__user').get(user_id=id)
+        except UserStats.DoesNotExist:
+            if not CustomUser.objects.filter(id=id).exists():
+                return None
+            # Rollup missing (e.g. a user created without signals); build it now
+            UserStats.recompute([id])
+            stats = UserStats.objects.select_related('top_post__user').get(user_id=id)
+        
+        return UserStatsType(
+            total_posts=stats.total_posts,
+            total_likes=stats.total_likes,
+            total_comments=stats.total_comments,
+            total_shares=stats.total_shares,
+            followers_count=stats.followers_count,
+            following_count=stats.following_count,
+            engagement_rate=stats.engagement_rate,
+            top_performing_post=stats.top_post
+        )
+    
+    def resolve_interaction_stats(self, info, target_type, target_id, days=30):
+        
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
         
-        total_posts = user.posts.filter(is_deleted=False).count()
-        total_likes = PostLike.objects.filter(post__user=user).count()
-        total_comments = Comment.objects.filter(post__user=user, is_deleted=False).count()
-        total_shares = Share.objects.filter(post__user=user).count()
-        followers_count = user.followers.count()
-        following_count = user.following.count()
+        try:
+            target_id = uuid.UUID(str(target_id))
+        except ValueError:
+            raise GraphQLError("Invalid target ID.")
         
-        total_engagement = total_likes + total_comments + total_shares
-        engagement_rate = (total_engagement / max(total_posts, 1)) if total_posts > 0 else 0
+        if not user.is_staff:
+            owned = {'post': Post, 'comment': Comment}
+            if target_type == 'user':
+                allowed = target_id == user.id
+            elif target_type in owned:
+                allowed = owned[target_type].objects.filter(id=target_id, user=user).exists()
+            else:
+                allowed = False
+            if not allowed:
+                raise GraphQLError("You can only view analytics for yourself and your own content.")
         
-        top_post = user.posts.filter(is_deleted=False).annotate(
-            engagement=Count('likes') + Count('comments') + Count('shares')
-        ).order_by('-engagement').first()
+        since = timezone.localdate() - timedelta(days=max(days, 1) - 1)
+        return InteractionDailyRollup.objects.filter(
+            target_type=target_type,
+            target_id=target_id,
+            day__gte=since
+        ).order_by('day', 'interaction_type')
+    
+    def resolve_search_users(self, info, query, limit=10):
+        return search.search_users(query, limit=limit)
+    
+    def resolve_autocomplete_users(self, info, prefix, limit=10):
+        return search.autocomplete_users(prefix, limit=limit)
+    
+    def resolve_suggested_users(self, info, limit=10):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
         
-        return UserStatsType(
-            total_posts=total_posts,
-            total_likes=total_likes,
-            total_comments=total_comments,
-            total_shares=total_shares,
-            followers_count=followers_count,
-            following_count=following_count,
-            engagement_rate=engagement_rate,
-            top_performing_post=top_post
+        limit = min(max(limit, 0), pymk.pymk_settings()["SUGGESTIONS_PER_USER"])
+        if not limit:
+            return []
+        return pymk.suggested_users(user.id, limit)
+    
+    def resolve_conversations(self, info, first=20, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        # Conversations are ordered by their newest message, newest first
+        messages, has_next_page = keyset_page(messaging.latest_messages(user.id), first, after)
+        peers = [message.receiver if message.sender_id == user.id else message.sender for message in messages]
+        unread = messaging.unread_from(user.id, [peer.id for peer in peers])
+        conversations = [
+            ConversationType(peer=peer, last_message=message, unread_count=unread.get(peer.id, 0))
+            for peer, message in zip(peers, messages)
+        ]
+        return build_connection(
+            ConversationConnection, conversations, has_next_page, after,
+            cursor_for=lambda conversation: encode_cursor(conversation.last_message.created_at, conversation.last_message.id)
         )
     
-    def resolve_search_users(self, info, query):
-        return CustomUser.objects.filter(
-            Q(username__icontains=query) | 
-            Q(first_name__icontains=query) | 
-            Q(last_name__icontains=query)
-        )[:10]
\ No newline at end of file
+    def resolve_messages(self, info, peer_id, first=20, after=None):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        
+        try:
+            peer_id = uuid.UUID(str(peer_id))
+        except ValueError:
+            raise GraphQLError("Invalid peer ID.")
+        
+        messages, has_next_page = keyset_page(messaging.between(user.id, peer_id), first, after)
+        return build_connection(MessageConnection, messages, has_next_page, after)
+    
+    def resolve_unread_message_count(self, info):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        return messaging.unread_count(user.id)
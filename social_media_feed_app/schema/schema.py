@@ -2,5 +2,14 @@ import graphene
 from .queries import Query
 from .mutations import Mutation
 from .subscriptions import Subscription
+from .cost import query_cost_rule
 
-schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
+
+
+def validation_rules(variables=None, operation_name=None, on_cost=None):
+    """
+    Rules run on every request. The standard rules only depend on the
+    document, so they run once per query text (see documents.resolve_document).
+    """
+    return (query_cost_rule(variables, operation_name, on_cost),)
@@ -0,0 +1,49 @@
+import uuid
+from django.db.models.fields.files import FieldFile
+from social_media_feed_app.models import CustomUser, Post
+
+# Snapshots are lists of values in these orders rather than dicts, so field
+# names are not repeated in every message sent through the channel layer.
+# Only what subscribers can render is included: no emails or passwords.
+POST_FIELDS = (
+    "id", "title", "content", "media_file", "media_type",
+    "like_count", "comment_count", "share_count", "created_at", "updated_at",
+)
+USER_FIELDS = ("id", "username", "first_name", "last_name", "profile_pic", "bio", "is_verified", "created_at")
+
+
+def _value(instance, name):
+    value = getattr(instance, name)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, FieldFile):
+        return value.name or None
+    return value
+
+
+def _snapshot(instance, fields):
+    return [_value(instance, name) for name in fields]
+
+
+def _render(model, fields, values, **extra):
+    instance = model(**{
+        name: model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)
+    }, **extra)
+    # Behave like a row loaded from the database, not one waiting to be saved
+    instance._state.adding = False
+    instance._state.db = "default"
+    return instance
+
+
+def post_snapshot(post):
+    """
+    Snapshot a post and its author for a broadcast. Build it once per event,
+    from a post whose `user` is already loaded.
+    """
+    return _snapshot(post, POST_FIELDS) + [_snapshot(post.user, USER_FIELDS)]
+
+
+def render_post(snapshot):
+    """Rebuild the Post, with its author, from `post_snapshot` output without querying."""
+    *values, user = snapshot
+    return _render(Post, POST_FIELDS, values, user=_render(CustomUser, USER_FIELDS, user))
@@ -1,6 +1,11 @@
 import graphene
 import channels_graphql_ws
+from asgiref.sync import sync_to_async
+from graphql import GraphQLError
+from social_media_feed_app import broadcasts
 from .types import PostType, CustomUserType, CommentType
+from .loaders import fresh_loaders
+from .snapshots import render_post
 
 class PostCreatedSubscription(channels_graphql_ws.Subscription):
     """Subscription for new posts."""
@@ -23,8 +28,11 @@ class PostCreatedSubscription(channels_graphql_ws.Subscription):
     @staticmethod
     def publish(payload, info, user_id=None):
         """Called when triggering the subscription."""
-        # payload is the post object from the broadcast
-        return PostCreatedSubscription(post=payload)
+        # payload is a post_snapshot, rendered without touching the database
+        post = render_post(payload)
+        # Nobody has liked a post that was just created
+        fresh_loaders(info).post_liked_by_user.prime(post.id, False)
+        return PostCreatedSubscription(post=post)
 
 class PostLikedSubscription(channels_graphql_ws.Subscription):
     """Subscription for post likes."""
@@ -43,10 +51,21 @@ class PostLikedSubscription(channels_graphql_ws.Subscription):
     
     @staticmethod
     def publish(payload, info, post_id):
-        """Called when publishing like events."""
-        # payload should be a dict with post, user, likes_count
+        """
+        Called when publishing like events.
+
+        Unlike the other publishes, isLikedByUser cannot be primed: the
+        broadcast is shared by every subscriber and each may have liked or
+        unliked the post since. A subscriber that selects it costs one
+        query per emit, which like_broadcast_settings() coalesces to at
+        most one per MIN_INTERVAL per post; anonymous subscribers and those
+        that do not select it cost none.
+        """
+        # payload is a dict with a post_snapshot and the coalesced likes_count;
+        # `user` is only set when an update stands for a single like
+        fresh_loaders(info)
         return PostLikedSubscription(
-            post=payload.get('post'),
+            post=render_post(payload['post']),
             user=payload.get('user'),
             likes_count=payload.get('likes_count', 0)
         )
@@ -69,13 +88,44 @@ class CommentCreatedSubscription(channels_graphql_ws.Subscription):
     def publish(payload, info, post_id):
         """Called when publishing comment events."""
         # payload is the comment object
+        fresh_loaders(info)
         return CommentCreatedSubscription(
             comment=payload,
             post=payload.post if hasattr(payload, 'post') else None
         )
 
+class FeedUpdatedSubscription(channels_graphql_ws.Subscription):
+    """Subscription for new posts in the viewer's home feed."""
+    
+    post = graphene.Field(PostType)
+    
+    @staticmethod
+    async def subscribe(root, info):
+        """Subscribe to the viewer's own feed group."""
+        # Posts are routed to the groups of the author's connected followers,
+        # so each socket only receives what belongs in its feed
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Authentication credentials were not provided.")
+        await sync_to_async(broadcasts.feed_connected)(user.id)
+        return [broadcasts.feed_group(user.id)]
+    
+    @staticmethod
+    async def unsubscribed(root, info):
+        """Called when the subscription is stopped, or by GraphqlWsConsumer.disconnect when its socket closes."""
+        await sync_to_async(broadcasts.feed_disconnected)(info.context.user.id)
+    
+    @staticmethod
+    def publish(payload, info):
+        """Called when publishing feed events."""
+        # payload is a post_snapshot, built once for every recipient
+        post = render_post(payload)
+        fresh_loaders(info).post_liked_by_user.prime(post.id, False)
+        return FeedUpdatedSubscription(post=post)
+
 class Subscription(graphene.ObjectType):
     """Main subscription class that combines all subscriptions."""
     post_created = PostCreatedSubscription.Field()
     post_liked = PostLikedSubscription.Field()
-    comment_created = CommentCreatedSubscription.Field()
\ No newline at end of file
+    comment_created = CommentCreatedSubscription.Field()
+    feed_updated = FeedUpdatedSubscription.Field()
\ No newline at end of file
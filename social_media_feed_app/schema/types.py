@@ -2,8 +2,10 @@ import graphene
 from graphene_django import DjangoObjectType
 from social_media_feed_app.models import (
     Comment, CommentLike, CustomUser, Post, PostLike, 
-    Share, Follow, Friendship, Message, Interaction
+    Share, Follow, Friendship, Message, Interaction, InteractionDailyRollup
 )
+from .loaders import get_loaders
+from .pagination import page_size
 
 class CustomUserType(DjangoObjectType):
     class Meta:
@@ -18,39 +20,77 @@ class PostType(DjangoObjectType):
     
     class Meta:
         model = Post
-        fields = "__all__"
+        # like_count is served as likesCount; commentCount and shareCount are
+        # the declared fields above, which take the place of their columns
+        exclude = ("like_count",)
         
     def resolve_likes_count(self, info):
-        return self.likes.count()
+        return self.like_count
     
     def resolve_comment_count(self, info):
-        return self.comments.filter(is_deleted=False).count()
+        return self.comment_count
     
     def resolve_share_count(self, info):
-        return self.shares.count()
+        return self.share_count
     
     def resolve_is_liked_by_user(self, info):
         user = info.context.user
         if not user.is_authenticated:
             return False
-        return self.likes.filter(user=user).exists()
+        return get_loaders(info).post_liked_by_user.load(self.id)
         
 class CommentType(DjangoObjectType):
     likes_count = graphene.Int()
     is_liked_by_user = graphene.Boolean()
+    reply_count = graphene.Int()
+    reply_preview = graphene.List(lambda: CommentType, first=graphene.Int(default_value=3))
     
     class Meta:
         model = Comment
         fields = "__all__"
     
     def resolve_likes_count(self, info):
-        return self.likes.count()
+        return get_loaders(info).comment_likes_count.load(self.id)
     
     def resolve_is_liked_by_user(self, info):
         user = info.context.user
         if not user.is_authenticated:
             return False
-        return self.likes.filter(user=user).exists()
+        return get_loaders(info).comment_liked_by_user.load(self.id)
+    
+    def resolve_reply_count(self, info):
+        return get_loaders(info).comment_reply_count.load(self.id)
+    
+    def resolve_reply_preview(self, info, first=3):
+        """The first `first` replies, oldest first; page on with commentRepliesConnection."""
+        return get_loaders(info).reply_preview(page_size(first)).load(self.id)
+        
+class FeedRanking(graphene.Enum):
+    """How userFeed orders posts"""
+    CHRONOLOGICAL = "chronological"
+    RELEVANCE = "relevance"
+
+class PostConnection(graphene.relay.Connection):
+    class Meta:
+        node = PostType
+
+class CommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = CommentType
+        
+class CommentTreeNodeType(graphene.ObjectType):
+    comment = graphene.Field(CommentType)
+    depth = graphene.Int()
+    reply_count = graphene.Int()
+    replies = graphene.List(lambda: CommentTreeNodeType)
+    has_more_replies = graphene.Boolean()
+    # Pass as `after` to commentRepliesConnection to load the rest; null when
+    # no replies were loaded, i.e. start from the first
+    replies_cursor = graphene.String()
+
+class CommentTreeType(graphene.ObjectType):
+    nodes = graphene.List(CommentTreeNodeType)
+    page_info = graphene.Field(graphene.relay.PageInfo)
         
 class CommentLikeType(DjangoObjectType):
     class Meta:
@@ -81,12 +121,30 @@ class MessageType(DjangoObjectType):
     class Meta:
         model = Message
         fields = "__all__"
+
+class MessageConnection(graphene.relay.Connection):
+    class Meta:
+        node = MessageType
+
+class ConversationType(graphene.ObjectType):
+    peer = graphene.Field(CustomUserType)
+    last_message = graphene.Field(MessageType)
+    unread_count = graphene.Int()
+
+class ConversationConnection(graphene.relay.Connection):
+    class Meta:
+        node = ConversationType
         
 class InteractionType(DjangoObjectType):
     class Meta:
         model = Interaction
         fields = "__all__"
 
+class InteractionRollupType(DjangoObjectType):
+    class Meta:
+        model = InteractionDailyRollup
+        fields = ("day", "target_type", "target_id", "interaction_type", "count", "unique_users")
+
 class UserStatsType(graphene.ObjectType):
     total_posts = graphene.Int()
     total_likes = graphene.Int()
@@ -0,0 +1,427 @@
+import bisect
+import math
+import re
+import threading
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Expression, F, FloatField, Func, Q, TextField, Value
+from django.db.models.functions import Coalesce, Greatest, Log
+from .models import CustomUser, Post, UserStats
+from .redis_store import get_redis
+
+# pg_trgm's default threshold for the % operator
+SIMILARITY_THRESHOLD = 0.3
+# Added per tenfold increase in followers, so popular accounts rank higher
+# among similarly close matches
+FOLLOWER_BOOST = 0.1
+MAX_RESULTS = 50
+
+
+def search_settings():
+    return settings.USER_SEARCH
+
+
+def _pattern(text, prefix_only=False):
+    escaped = re.sub(r"([\\%_])", r"\\\1", text)
+    return f"{escaped}%" if prefix_only else f"%{escaped}%"
+
+
+# ----------------------
+# Trigrams, as pg_trgm computes them
+# ----------------------
+def trigrams(text):
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def score(user_similarity, followers):
+    return user_similarity + FOLLOWER_BOOST * math.log10(1 + followers)
+
+
+# ----------------------
+# PostgreSQL: pg_trgm indexes from migration 0002
+# ----------------------
+class FullName(Func):
+    """first_name || ' ' || last_name, written exactly as idx_user_search_name indexes it."""
+    template = "(%(expressions)s)"
+    arg_joiner = " || ' ' || "
+    output_field = TextField()
+
+    def __init__(self):
+        super().__init__(F("first_name"), F("last_name"))
+
+
+class ILike(Func):
+    """`expression ILIKE pattern`, which gin_trgm_ops indexes serve (unlike Django's UPPER(...) LIKE)."""
+    template = "%(expressions)s"
+    arg_joiner = " ILIKE "
+    output_field = BooleanField()
+
+
+class TrigramMatch(Func):
+    """`expression % text`: trigram similarity above pg_trgm.similarity_threshold, index-backed."""
+    template = "%(expressions)s"
+    arg_joiner = " %% "
+    output_field = BooleanField()
+
+
+class Similarity(Func):
+    function = "SIMILARITY"
+    output_field = FloatField()
+
+
+def _ranked(queryset, query):
+    followers = Coalesce(F("stats__followers_count"), 0)
+    closeness = Greatest(Similarity(F("username"), Value(query)), Similarity(FullName(), Value(query)))
+    return queryset.annotate(
+        rank=closeness + FOLLOWER_BOOST * Log(10, followers + 1)
+    ).order_by("-rank", "username")
+
+
+def _postgres_search(query, limit):
+    # Trigram indexes cannot narrow a substring shorter than a trigram
+    pattern = Value(_pattern(query, prefix_only=len(query) < 3))
+    users = list(_ranked(
+        CustomUser.objects.filter(ILike(F("username"), pattern) | ILike(FullName(), pattern)), query
+    )[:limit])
+    if users:
+        return users
+    # Nothing contains the text; offer near misses such as typos
+    return list(_ranked(
+        CustomUser.objects.filter(TrigramMatch(F("username"), Value(query)) | TrigramMatch(FullName(), Value(query))),
+        query
+    )[:limit])
+
+
+def _postgres_autocomplete(prefix, limit):
+    pattern = Value(_pattern(prefix, prefix_only=True))
+    return list(CustomUser.objects.filter(
+        ILike(F("username"), pattern) | ILike(FullName(), pattern)
+    ).order_by(Coalesce(F("stats__followers_count"), 0).desc(), "username").values_list("id", flat=True)[:limit])
+
+
+# ----------------------
+# Other backends: in-process index, for development and tests
+# ----------------------
+class MemoryIndex:
+    """
+    Prefix and trigram index over usernames and full names, built from the
+    database on first use and kept current by the CustomUser signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._keys = []
+        self._grams = defaultdict(set)
+
+    @staticmethod
+    def _texts(username, first_name, last_name):
+        return username.lower(), f"{first_name} {last_name}".lower()
+
+    @staticmethod
+    def _grams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, user_id, username, first_name, last_name):
+        with self._lock:
+            self._discard(user_id)
+            names = self._texts(username, first_name, last_name)
+            self._names[user_id] = names
+            for name in names:
+                bisect.insort(self._keys, (name, user_id))
+                for gram in self._grams_of(name):
+                    self._grams[gram].add(user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id):
+        names = self._names.pop(user_id, None)
+        for name in names or ():
+            key = (name, user_id)
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+            for gram in self._grams_of(name):
+                self._grams[gram].discard(user_id)
+
+    def names(self, user_id):
+        return self._names.get(user_id)
+
+    def starting_with(self, prefix):
+        prefix = prefix.lower()
+        with self._lock:
+            matches = set()
+            for name, user_id in self._keys[bisect.bisect_left(self._keys, (prefix,)):]:
+                if not name.startswith(prefix):
+                    break
+                matches.add(user_id)
+            return matches
+
+    def containing(self, text):
+        text = text.lower()
+        if len(text) < 3:
+            return self.starting_with(text)
+        with self._lock:
+            candidates = set.intersection(*(self._grams.get(gram, set()) for gram in self._grams_of(text)))
+            return {user_id for user_id in candidates if any(text in name for name in self._names[user_id])}
+
+    def similar_to(self, text):
+        text = text.lower()
+        with self._lock:
+            candidates = set().union(*(self._grams.get(gram, set()) for gram in self._grams_of(text)))
+            return {
+                user_id for user_id in candidates
+                if max(similarity(name, text) for name in self._names[user_id]) >= SIMILARITY_THRESHOLD
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def memory_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = MemoryIndex()
+                for row in CustomUser.objects.values_list("id", "username", "first_name", "last_name").iterator():
+                    index.add(*row)
+                _index = index
+    return _index
+
+
+def index_user(user):
+    """Keep the in-process index, if one has been built, in step with a saved user."""
+    if _index is not None:
+        _index.add(user.id, user.username, user.first_name, user.last_name)
+
+
+def unindex_user(user_id):
+    if _index is not None:
+        _index.remove(user_id)
+
+
+def _memory_rank(user_ids, query=None):
+    """Load users by ID, ranked like _ranked (or by followers alone without a query)."""
+    users = CustomUser.objects.in_bulk(user_ids)
+    for missing in set(user_ids) - set(users):
+        # Deleted without a signal, e.g. by a rolled-back transaction
+        unindex_user(missing)
+    followers = dict(UserStats.objects.filter(user_id__in=users).values_list("user_id", "followers_count"))
+
+    def key(user):
+        count = followers.get(user.id, 0)
+        if query is None:
+            return (-count, user.username)
+        names = memory_index().names(user.id) or (user.username,)
+        return (-score(max(similarity(name, query) for name in names), count), user.username)
+
+    return sorted(users.values(), key=key)
+
+
+def _memory_search(query, limit):
+    index = memory_index()
+    user_ids = index.containing(query) or index.similar_to(query)
+    return _memory_rank(user_ids, query)[:limit]
+
+
+def _memory_autocomplete(prefix, limit):
+    return [user.id for user in _memory_rank(memory_index().starting_with(prefix))[:limit]]
+
+
+# ----------------------
+# Public API
+# ----------------------
+def search_users(query, limit=10):
+    """
+    Users whose username or full name contains `query`, or, when none do,
+    whose names are trigram-similar to it. Ranked by similarity, boosted by
+    follower count.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    limit = min(max(limit, 1), MAX_RESULTS)
+    if connection.vendor == "postgresql":
+        return _postgres_search(query, limit)
+    return _memory_search(query, limit)
+
+
+def prefix_cache_key(prefix, limit):
+    return f"user_search:prefix:{limit}:{prefix}"
+
+
+def autocomplete_users(prefix, limit=10):
+    """
+    Users whose username or full name ("first last") starts with `prefix`,
+    most followed first. Short prefixes match the most users and are typed by everyone, so
+    their results are cached for PREFIX_CACHE_TTL seconds.
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    limit = min(max(limit, 1), MAX_RESULTS)
+    config = search_settings()
+    cacheable = len(prefix) <= config["PREFIX_CACHE_MAX_LENGTH"]
+
+    user_ids = None
+    if cacheable:
+        cached = get_redis().get(prefix_cache_key(prefix, limit))
+        if cached is not None:
+            user_ids = cached.split(",") if cached else []
+
+    if user_ids is None:
+        if connection.vendor == "postgresql":
+            user_ids = [str(user_id) for user_id in _postgres_autocomplete(prefix, limit)]
+        else:
+            user_ids = [str(user_id) for user_id in _memory_autocomplete(prefix, limit)]
+        if cacheable:
+            get_redis().set(prefix_cache_key(prefix, limit), ",".join(user_ids), ex=config["PREFIX_CACHE_TTL"])
+
+    users = CustomUser.objects.in_bulk(user_ids)
+    return [users[user_id] for user_id in map(uuid.UUID, user_ids) if user_id in users]
+
+
+# ----------------------
+# Posts: full-text search over title and content
+# ----------------------
+MAX_QUERY_LENGTH = 200
+# ts_rank weights of the A (title) and B (content) labels
+TITLE_WEIGHT, CONTENT_WEIGHT = 1.0, 0.4
+
+
+def post_search_settings():
+    return settings.POST_SEARCH
+
+
+def post_score(rank, created_at):
+    """
+    log2(relevance) + age bonus: a post must be twice as relevant to outrank
+    one HALF_LIFE_DAYS newer. Unlike a decay from now(), the score of a post
+    never changes, so it can be paginated with a keyset cursor.
+    """
+    return math.log2(max(rank, 1e-6)) + created_at.timestamp() / half_life_seconds()
+
+
+def half_life_seconds():
+    return post_search_settings()["HALF_LIFE_DAYS"] * 86400
+
+
+class PostSearchVector(Expression):
+    """
+    Post.search_vector, maintained by a trigger from migration 0007. It is
+    not declared on the model, so Django never reads or writes it.
+    """
+    output_field = TextField()
+
+    def as_sql(self, compiler, connection):
+        # Qualified with the query's own alias, which differs inside subqueries
+        alias = compiler.quote_name_unless_alias(compiler.query.get_initial_alias())
+        return f"{alias}.search_vector", []
+
+
+class WebSearchQuery(Func):
+    function = "websearch_to_tsquery"
+    template = "%(function)s('english', %(expressions)s)"
+    output_field = TextField()
+
+
+class TextMatch(Func):
+    """search_vector @@ query, served by idx_post_search."""
+    template = "%(expressions)s"
+    arg_joiner = " @@ "
+    output_field = BooleanField()
+
+    def __init__(self, query):
+        super().__init__(PostSearchVector(), WebSearchQuery(query))
+
+
+class TextScore(Func):
+    """post_score() in SQL. ts_rank_cd normalization 32 scales rank into [0, 1) like the fallback."""
+    output_field = FloatField()
+
+    def __init__(self, query):
+        super().__init__(PostSearchVector(), WebSearchQuery(query), F("created_at"))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (vector, vector_params), (query, query_params), (created_at, created_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        sql = (
+            f"(LOG(2, GREATEST(ts_rank_cd({vector}, {query}, 32), 1e-6)::numeric)"
+            f" + EXTRACT(EPOCH FROM {created_at}) / %s)::double precision"
+        )
+        return sql, (*vector_params, *query_params, *created_params, half_life_seconds())
+
+
+def _postgres_post_search(query, first, after):
+    config = post_search_settings()
+    # Common terms match millions of posts; only the newest matches are ranked.
+    # Seeks idx_post_timeline filtering on the vector, or idx_post_search then
+    # sorts, whichever the planner expects to be cheaper.
+    candidates = Post.objects.filter(is_deleted=False).filter(
+        TextMatch(Value(query))
+    ).order_by('-created_at').values('id')[:config["MAX_CANDIDATES"]]
+
+    queryset = Post.objects.filter(id__in=candidates).annotate(
+        search_score=TextScore(Value(query))
+    ).select_related('user')
+    if after:
+        score, pk = after
+        queryset = queryset.filter(Q(search_score__lt=score) | Q(search_score=score, id__lt=pk))
+    return list(queryset.order_by('-search_score', '-id')[:first + 1])
+
+
+def _memory_post_search(query, first, after):
+    terms = re.findall(r"[^\W_]+", query.lower())
+    if not terms:
+        return []
+    queryset = Post.objects.filter(is_deleted=False)
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+    # Like the PostgreSQL path, rank only the newest MAX_CANDIDATES matches
+    queryset = queryset.order_by('-created_at')[:post_search_settings()["MAX_CANDIDATES"]]
+
+    ranked = []
+    for post_id, title, created_at in queryset.values_list('id', 'title', 'created_at'):
+        title = (title or '').lower()
+        weight = sum(TITLE_WEIGHT if term in title else CONTENT_WEIGHT for term in terms) / len(terms)
+        ranked.append((post_score(weight / (weight + 1), created_at), post_id))
+    ranked.sort(reverse=True)
+    if after:
+        ranked = [key for key in ranked if key < after]
+    ranked = ranked[:first + 1]
+
+    posts = Post.objects.select_related('user').in_bulk([post_id for _, post_id in ranked])
+    for score, post_id in ranked:
+        posts[post_id].search_score = score
+    return [posts[post_id] for _, post_id in ranked]
+
+
+def search_posts(query, first, after=None):
+    """
+    Return (posts, has_next_page) for the page of posts matching `query`
+    after the (score, id) key `after`. Posts carry their `search_score`.
+    """
+    query = query.strip()[:MAX_QUERY_LENGTH]
+    if not query:
+        return [], False
+    if connection.vendor == "postgresql":
+        posts = _postgres_post_search(query, first, after)
+    else:
+        posts = _memory_post_search(query, first, after)
+    return posts[:first], len(posts) > first
@@ -0,0 +1,225 @@
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.utils import timezone
+from .models import CustomUser, Post, PostLike, Comment, Share, Follow
+
+DEFAULT_PASSWORD = "password123"
+
+
+class SeedPlan:
+    """
+    Sizes and seed for a bulk load. Picklable, so every worker process can
+    derive any user's ID and username from its index without reading the
+    database.
+    """
+
+    def __init__(self, users, posts_per_user=10, follows_per_user=20, likes_per_post=5,
+                 comments_per_post=2, shares_per_post=1, days=30, batch_size=5000, seed=None):
+        self.users = users
+        self.posts_per_user = posts_per_user
+        self.follows_per_user = min(follows_per_user, users - 1)
+        self.likes_per_post = likes_per_post
+        self.comments_per_post = comments_per_post
+        self.shares_per_post = shares_per_post
+        self.days = days
+        self.batch_size = batch_size
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.namespace = uuid.UUID(int=random.Random(self.seed).getrandbits(128))
+        self.run = self.namespace.hex[:6]
+        self.now = timezone.now()
+        # Hash once; PBKDF2 per row would dominate the load
+        self.password = make_password(DEFAULT_PASSWORD)
+
+    def user_id(self, index):
+        return uuid.uuid5(self.namespace, str(index))
+
+    def username(self, index):
+        return f"user_{self.run}_{index}"
+
+    def rng(self, *key):
+        return random.Random(f"{self.seed}:{':'.join(map(str, key))}")
+
+    def around(self, average, rng):
+        """A per-row count averaging `average`."""
+        return rng.randint(0, 2 * average) if average else 0
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create write the generated created_at/updated_at values."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# Insert order, so rows are never written before the rows they reference
+MODEL_ORDER = (CustomUser, Follow, Post, PostLike, Share, Comment)
+
+
+class _Batches:
+    """Buffers rows per model and bulk-inserts every buffer once one fills."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {model: [] for model in MODEL_ORDER}
+        self.counts = {}
+
+    def add(self, row):
+        rows = self.pending[type(row)]
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model in MODEL_ORDER:
+            rows = self.pending[model]
+            if rows:
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+                self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(rows)
+                self.pending[model] = []
+
+
+def seed_users(plan, start, end):
+    """Insert users [start, end) of the plan."""
+    batches = _Batches(plan.batch_size)
+    with explicit_timestamps(CustomUser):
+        for index in range(start, end):
+            joined = plan.now - timedelta(days=plan.days, seconds=index % 86400)
+            batches.add(CustomUser(
+                id=plan.user_id(index),
+                username=plan.username(index),
+                email=f"{plan.username(index)}@example.com",
+                first_name=f"User{index}",
+                last_name=plan.run,
+                password=plan.password,
+                created_at=joined,
+                updated_at=joined,
+            ))
+        batches.flush()
+    return batches.counts
+
+
+def seed_content(plan, start, end):
+    """
+    Insert the follows of users [start, end), their posts, and the likes,
+    comments and shares on those posts. Counters are set on each Post as it
+    is generated, since bulk_create fires no signals.
+    """
+    batches = _Batches(plan.batch_size)
+    window = plan.days * 86400
+    with explicit_timestamps(Post, Follow, PostLike, Comment, Share):
+        for index in range(start, end):
+            rng = plan.rng("user", index)
+            author_id = plan.user_id(index)
+
+            for followee in rng.sample(range(plan.users - 1), plan.follows_per_user):
+                if followee >= index:
+                    followee += 1  # skip self
+                batches.add(Follow(
+                    follower_id=author_id, followee_id=plan.user_id(followee),
+                    created_at=plan.now - timedelta(seconds=rng.randrange(window)),
+                ))
+
+            for n in range(plan.posts_per_user):
+                created_at = plan.now - timedelta(seconds=rng.randrange(window))
+                age = max(int((plan.now - created_at).total_seconds()), 1)
+                likers = rng.sample(range(plan.users), min(plan.around(plan.likes_per_post, rng), plan.users))
+                sharers = rng.sample(range(plan.users), min(plan.around(plan.shares_per_post, rng), plan.users))
+                comment_count = plan.around(plan.comments_per_post, rng)
+
+                post = Post(
+                    id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                    user_id=author_id,
+                    title=f"Post {n} by {plan.username(index)}",
+                    content=f"Seeded content {n} for capacity testing",
+                    media_type=rng.choice(["text", "image", "video"]),
+                    like_count=len(likers),
+                    comment_count=comment_count,
+                    share_count=len(sharers),
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+                batches.add(post)
+
+                def later():
+                    return created_at + timedelta(seconds=rng.randrange(age))
+
+                for liker in likers:
+                    batches.add(PostLike(post_id=post.id, user_id=plan.user_id(liker), created_at=later()))
+                for sharer in sharers:
+                    batches.add(Share(post_id=post.id, user_id=plan.user_id(sharer), created_at=later()))
+                for c in range(comment_count):
+                    at = later()
+                    batches.add(Comment(
+                        post_id=post.id, user_id=plan.user_id(rng.randrange(plan.users)),
+                        content=f"Seeded comment {c}", created_at=at, updated_at=at,
+                    ))
+        batches.flush()
+    return batches.counts
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _partitions(total, parts):
+    size = -(-total // parts)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def _run(function, plan, workers, on_progress):
+    totals = {}
+    partitions = _partitions(plan.users, max(workers * 4, 1))
+
+    def add(counts):
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+        if on_progress:
+            on_progress(function.__name__, totals)
+
+    if workers <= 1:
+        for start, end in partitions:
+            add(function(plan, start, end))
+        return totals
+
+    # Children must open their own connections rather than share the parent's
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for counts in pool.map(function, *zip(*[(plan, start, end) for start, end in partitions])):
+            add(counts)
+    return totals
+
+
+def bulk_seed(plan, workers=1, on_progress=None):
+    """
+    Load `plan` with batched bulk_create across a pool of `workers`
+    processes, each handling a partition of users. Users go in first so
+    content partitions can reference any of them. Returns row counts by model.
+
+    bulk_create fires no signals, so user stats and the trending windows are
+    rebuilt once at the end instead of row by row.
+    """
+    from . import trending
+    from .tasks import recompute_user_stats
+
+    totals = _run(seed_users, plan, workers, on_progress)
+    totals.update(_run(seed_content, plan, workers, on_progress))
+    recompute_user_stats()
+    for hours in trending.WINDOWS:
+        trending.rebuild(hours)
+    return totals
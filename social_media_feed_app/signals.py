@@ -1,18 +1,30 @@
-from django.db.models.signals import post_save
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .tasks import sending_email_on_registration
+from .tasks import (
+    sending_email_on_registration, fanout_post_to_timelines,
+    remove_post_from_timelines, backfill_timeline, trim_timeline, broadcast_feed_update,
+    update_suggestions
+)
+from .timelines import post_score
+from . import broadcasts, interactions, search, trending
 from django.contrib.auth.signals import user_logged_in
-from .models import CustomUser, Post, PostLike, Comment, Follow, Interaction
+from .models import CustomUser, Post, PostLike, Comment, Share, Follow, Message, UserStats
 
 @receiver(post_save, sender=CustomUser)
 def user_created_handler(sender, instance, created, **kwargs):
     """Handle actions when a new user is created"""
+    search.index_user(instance)
+    
     if created:
         print(f"New user registered: {instance.username} ({instance.email})")
         
-        # Create welcome interaction
-        Interaction.objects.create(
-            user=instance,
+        UserStats.objects.create(user=instance)
+        
+        # Log welcome interaction
+        interactions.log(
+            user_id=instance.id,
             target_type='user',
             target_id=instance.id,
             interaction_type='view',
@@ -30,75 +42,197 @@ def user_created_handler(sender, instance, created, **kwargs):
         # - Add to default groups
         # - Create notification preferences
 
+@receiver(post_delete, sender=CustomUser)
+def user_deleted_handler(sender, instance, **kwargs):
+    """Handle when a user is deleted"""
+    search.unindex_user(instance.id)
+
 @receiver(post_save, sender=Post)
 def post_created_handler(sender, instance, created, **kwargs):
     """Handle actions when a new post is created"""
     if created:
-        print(f"New post created by {instance.user.username}: {instance.title or instance.content[:50]}...")
+        print(f"New post created by {instance.user_id}: {instance.title or instance.content[:50]}...")
         
-        # Create interaction record
-        Interaction.objects.create(
-            user=instance.user,
+        # Log interaction
+        interactions.log(
+            user_id=instance.user_id,
             target_type='post',
             target_id=instance.id,
             interaction_type='view',
             metadata={'action': 'post_created'}
         )
+        
+        UserStats.adjust(instance.user_id, total_posts=1)
+        UserStats.offer_top_post(instance.id)
+        transaction.on_commit(partial(trending.track_post, instance.id, instance.created_at))
+        
+        # Queued once the post commits, so the worker can see it
+        transaction.on_commit(partial(
+            fanout_post_to_timelines.delay,
+            post_id=str(instance.id),
+            author_id=str(instance.user_id),
+            score=post_score(instance.created_at)
+        ))
+        transaction.on_commit(partial(
+            broadcast_feed_update.delay,
+            post_id=str(instance.id),
+            author_id=str(instance.user_id)
+        ))
+    elif instance.is_deleted and instance._saved_is_deleted is not True:
+        # Only on the save that deletes it, not later saves of a deleted post
+        UserStats.adjust(instance.user_id, total_posts=-1)
+        UserStats.refresh_top_post(instance.user_id, instance.id)
+        transaction.on_commit(partial(trending.untrack_post, instance.id))
+        transaction.on_commit(partial(
+            remove_post_from_timelines.delay,
+            post_id=str(instance.id),
+            author_id=str(instance.user_id)
+        ))
+    instance._saved_is_deleted = instance.is_deleted
 
 @receiver(post_save, sender=PostLike)
 def post_liked_handler(sender, instance, created, **kwargs):
     """Handle when a post is liked"""
     if created:
-        # Create interaction record
-        Interaction.objects.create(
-            user=instance.user,
+        Post.adjust_counters(instance.post_id, like_count=1)
+        trending.engagement_changed(instance.post_id, trending.LIKE_WEIGHT, instance.created_at)
+        broadcasts.like_changed(instance.post_id)
+        
+        # Log interaction; the mutation passes the Post it loaded, so no query
+        interactions.log(
+            user_id=instance.user_id,
             target_type='post',
-            target_id=instance.post.id,
+            target_id=instance.post_id,
             interaction_type='like',
-            metadata={'liked_user_id': str(instance.post.user.id)}
+            metadata={'liked_user_id': str(instance.post.user_id)}
         )
         
-        print(f"{instance.user.username} liked {instance.post.user.username}'s post")
+        print(f"{instance.user_id} liked post {instance.post_id}")
+
+@receiver(post_delete, sender=PostLike)
+def post_unliked_handler(sender, instance, **kwargs):
+    """Handle when a post like is removed"""
+    Post.adjust_counters(instance.post_id, like_count=-1)
+    trending.engagement_changed(instance.post_id, -trending.LIKE_WEIGHT, instance.created_at)
+    broadcasts.like_changed(instance.post_id)
 
 @receiver(post_save, sender=Comment)
 def comment_created_handler(sender, instance, created, **kwargs):
     """Handle when a comment is created"""
     if created:
-        # Create interaction record
-        Interaction.objects.create(
-            user=instance.user,
+        if not instance.is_deleted:
+            Post.adjust_counters(instance.post_id, comment_count=1)
+            trending.engagement_changed(instance.post_id, trending.COMMENT_WEIGHT, instance.created_at)
+        
+        # Log interaction
+        interactions.log(
+            user_id=instance.user_id,
             target_type='comment',
             target_id=instance.id,
             interaction_type='comment',
             metadata={
-                'post_id': str(instance.post.id),
-                'post_owner_id': str(instance.post.user.id)
+                'post_id': str(instance.post_id),
+                'post_owner_id': str(instance.post.user_id)
             }
         )
 
+@receiver(post_delete, sender=Comment)
+def comment_deleted_handler(sender, instance, **kwargs):
+    """Handle when a comment row is removed (soft deletes go through Comment.soft_delete)"""
+    if not instance.is_deleted:
+        Post.adjust_counters(instance.post_id, comment_count=-1)
+        trending.engagement_changed(instance.post_id, -trending.COMMENT_WEIGHT, instance.created_at)
+
+@receiver(post_save, sender=Share)
+def post_shared_handler(sender, instance, created, **kwargs):
+    """Handle when a post is shared"""
+    if created:
+        Post.adjust_counters(instance.post_id, share_count=1)
+        trending.engagement_changed(instance.post_id, trending.SHARE_WEIGHT, instance.created_at)
+        
+        interactions.log(
+            user_id=instance.user_id,
+            target_type='post',
+            target_id=instance.post_id,
+            interaction_type='share',
+            metadata={'post_owner_id': str(instance.post.user_id)}
+        )
+
+@receiver(post_delete, sender=Share)
+def post_unshared_handler(sender, instance, **kwargs):
+    """Handle when a share is removed"""
+    Post.adjust_counters(instance.post_id, share_count=-1)
+    trending.engagement_changed(instance.post_id, -trending.SHARE_WEIGHT, instance.created_at)
+
 @receiver(post_save, sender=Follow)
 def user_followed_handler(sender, instance, created, **kwargs):
     """Handle when someone follows a user"""
     if created:
-        # Create interaction record
-        Interaction.objects.create(
-            user=instance.follower,
+        UserStats.adjust(instance.followee_id, followers_count=1)
+        UserStats.adjust(instance.follower_id, following_count=1)
+        
+        # Log interaction
+        interactions.log(
+            user_id=instance.follower_id,
             target_type='user',
-            target_id=instance.followee.id,
+            target_id=instance.followee_id,
             interaction_type='follow',
-            metadata={'followed_user_id': str(instance.followee.id)}
+            metadata={'followed_user_id': str(instance.followee_id)}
         )
         
-        print(f"{instance.follower.username} started following {instance.followee.username}")
+        print(f"{instance.follower_id} started following {instance.followee_id}")
+        
+        transaction.on_commit(partial(
+            backfill_timeline.delay,
+            follower_id=str(instance.follower_id),
+            followee_id=str(instance.followee_id)
+        ))
+        # Run against the committed follow graph
+        transaction.on_commit(partial(
+            update_suggestions.delay,
+            follower_id=str(instance.follower_id),
+            followee_id=str(instance.followee_id),
+            followed=True
+        ))
+
+@receiver(post_delete, sender=Follow)
+def user_unfollowed_handler(sender, instance, **kwargs):
+    """Handle when someone unfollows a user"""
+    UserStats.adjust(instance.followee_id, followers_count=-1)
+    UserStats.adjust(instance.follower_id, following_count=-1)
+    
+    transaction.on_commit(partial(
+        trim_timeline.delay,
+        follower_id=str(instance.follower_id),
+        followee_id=str(instance.followee_id)
+    ))
+    transaction.on_commit(partial(
+        update_suggestions.delay,
+        follower_id=str(instance.follower_id),
+        followee_id=str(instance.followee_id),
+        followed=False
+    ))
+
+@receiver(post_save, sender=Message)
+def message_sent_handler(sender, instance, created, **kwargs):
+    """Handle when a message is sent"""
+    if created and not instance.is_read:
+        UserStats.adjust(instance.receiver_id, unread_messages=1)
+
+@receiver(post_delete, sender=Message)
+def message_deleted_handler(sender, instance, **kwargs):
+    """Handle when a message is removed"""
+    if not instance.is_read:
+        UserStats.adjust(instance.receiver_id, unread_messages=-1)
 
 @receiver(user_logged_in)
 def user_logged_in_handler(sender, request, user, **kwargs):
     """Handle when user logs in"""
     print(f"User {user.username} logged in from IP: {request.META.get('REMOTE_ADDR')}")
     
-    # Create login interaction
-    Interaction.objects.create(
-        user=user,
+    # Log login interaction
+    interactions.log(
+        user_id=user.id,
         target_type='user',
         target_id=user.id,
         interaction_type='view',
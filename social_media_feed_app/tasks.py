@@ -36,3 +36,218 @@ def sending_email_on_registration(user_email, user_name=None):
     )
     
     return f"Email sent to {user_email}"
+
+
+@shared_task
+def fanout_post_to_timelines(post_id, author_id, score):
+    """
+    Pushes a newly created post into the home timelines of its author and followers.
+    
+    Args:
+        post_id (str): The ID of the new post.
+        author_id (str): The ID of the post's author.
+        score (float): The timeline score, derived from the post's creation time.
+    """
+    from . import timelines
+    timelines.fanout_post(post_id, author_id, score)
+
+
+@shared_task
+def remove_post_from_timelines(post_id, author_id):
+    """
+    Removes a deleted post from the home timelines of its author and followers.
+    
+    Args:
+        post_id (str): The ID of the deleted post.
+        author_id (str): The ID of the post's author.
+    """
+    from . import timelines
+    timelines.remove_post(post_id, author_id)
+
+
+@shared_task
+def backfill_timeline(follower_id, followee_id):
+    """
+    Merges a newly followed user's recent posts into the follower's timeline.
+    """
+    from . import timelines
+    timelines.backfill(follower_id, followee_id)
+
+
+@shared_task
+def trim_timeline(follower_id, followee_id):
+    """
+    Removes an unfollowed user's posts from the follower's timeline.
+    """
+    from . import timelines
+    timelines.trim(follower_id, followee_id)
+
+
+@shared_task
+def reconcile_post_counters(batch_size=1000):
+    """
+    Detects and repairs drift between Post's denormalized engagement counters
+    and the PostLike, Comment and Share rows they summarize.
+    
+    Posts are scanned in primary-key batches. Drifted rows are repaired with a
+    single UPDATE that recomputes the counts in the database, so increments
+    that land while the task runs are not lost.
+    
+    Args:
+        batch_size (int): Number of posts compared per batch.
+    
+    Returns:
+        int: The number of posts that were repaired.
+    """
+    from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+    from .models import Post, PostLike, Comment, Share
+    
+    def count_of(model, **filters):
+        return Coalesce(Subquery(
+            model.objects.filter(post=OuterRef('pk'), **filters)
+            .order_by().values('post').annotate(total=Count('id')).values('total'),
+            output_field=IntegerField()
+        ), Value(0))
+    
+    actual_counts = {
+        'like_count': count_of(PostLike),
+        'comment_count': count_of(Comment, is_deleted=False),
+        'share_count': count_of(Share),
+    }
+    
+    repaired = 0
+    last_pk = None
+    while True:
+        batch = Post.objects.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch.annotate(
+            actual_likes=actual_counts['like_count'],
+            actual_comments=actual_counts['comment_count'],
+            actual_shares=actual_counts['share_count'],
+        ).values_list(
+            'pk', 'like_count', 'comment_count', 'share_count',
+            'actual_likes', 'actual_comments', 'actual_shares'
+        )[:batch_size])
+        if not rows:
+            return repaired
+        
+        drifted = [row[0] for row in rows if row[1:4] != row[4:7]]
+        if drifted:
+            repaired += Post.objects.filter(pk__in=drifted).update(**actual_counts)
+        last_pk = rows[-1][0]
+
+
+@shared_task
+def compact_trending():
+    """
+    Expires aged-out posts from the trending leaderboards and rescales their
+    decayed scores when needed.
+    """
+    from . import trending
+    trending.compact()
+
+
+@shared_task
+def maintain_interactions():
+    """
+    Creates upcoming Interaction partitions, rolls raw events up into
+    InteractionDailyRollup, and expires events past the retention period.
+    """
+    from . import interactions
+    interactions.maintain()
+
+
+@shared_task
+def broadcast_like_count(post_id):
+    """
+    Sends one coalesced likesCount update to a post's PostLikedSubscription
+    subscribers. Scheduled by broadcasts.schedule.
+    """
+    from . import broadcasts
+    return broadcasts.emit(post_id)
+
+
+@shared_task
+def broadcast_feed_update(post_id, author_id):
+    """
+    Pushes a new post to the feedUpdated subscriptions of the author's
+    followers who are connected.
+    """
+    from . import broadcasts
+    return broadcasts.publish_feed_update(post_id, author_id)
+
+
+@shared_task
+def rebuild_suggestions():
+    """
+    Recomputes every user's people-you-may-know list from a snapshot of the
+    follow graph.
+    
+    Returns:
+        int: The number of users with suggestions.
+    """
+    from . import pymk
+    return pymk.rebuild()
+
+
+@shared_task
+def update_suggestions(follower_id, followee_id, followed):
+    """
+    Applies one follow or unfollow to the follower's people-you-may-know
+    list until the next rebuild_suggestions.
+    """
+    from . import pymk
+    if followed:
+        pymk.apply_follow(follower_id, followee_id)
+    else:
+        pymk.apply_unfollow(follower_id, followee_id)
+
+
+@shared_task
+def recompute_user_stats(batch_size=1000):
+    """
+    Rebuilds every UserStats rollup from the source tables, repairing any
+    drift in the incremental updates.
+    
+    Engagement totals are summed from Post's denormalized counters, so this
+    is best run after reconcile_post_counters.
+    
+    Args:
+        batch_size (int): Number of users recomputed per UPDATE.
+    
+    Returns:
+        int: The number of users recomputed.
+    """
+    from .models import CustomUser, UserStats
+    
+    recomputed = 0
+    last_pk = None
+    while True:
+        batch = CustomUser.objects.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        user_ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            return recomputed
+        
+        recomputed += UserStats.recompute(user_ids)
+        last_pk = user_ids[-1]
+
+
+@shared_task
+def rebuild_affinity(batch_size=1000):
+    """
+    Rebuilds the Affinity table by replaying the retained Interaction rows,
+    oldest first. For the initial load and for repairs; affinity is
+    otherwise kept up to date as interactions are written.
+    
+    Args:
+        batch_size (int): Number of interactions folded in per upsert.
+    
+    Returns:
+        int: The number of interactions replayed.
+    """
+    from . import affinity
+    return affinity.rebuild(batch_size)
@@ -1,12 +1,41 @@
+import asyncio
+import time
 import uuid
+import numpy as np
+from datetime import date, timedelta
 import logging
-from django.test import TestCase
+from contextlib import contextmanager
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from channels_graphql_ws.serializer import Serializer
+from graphql import GraphQLError
+from social_media_feed_backend.asgi import GraphqlWsConsumer, application
 from social_media_feed_app.models import (
-    Post, Comment, PostLike, CommentLike, Share, Follow, CustomUser
+    Post, Comment, PostLike, CommentLike, Share, Follow, CustomUser, UserStats, Interaction, Message,
+    InteractionDailyRollup, Friendship, Affinity
 )
 from .schema.queries import Query
+from .schema.schema import schema
+from .schema.documents import document_cache, query_hash, register
+from .schema import profiling
+from .schema.snapshots import post_snapshot, render_post
+from .schema.loaders import get_loaders
+from .schema.subscriptions import FeedUpdatedSubscription, PostLikedSubscription
+from .schema.types import PostType
+from .redis_store import get_redis
+from . import affinity, benchmarks, broadcasts, interactions, messaging, pymk, ranking, search, timelines, trending
+from .interactions import InteractionBuffer
+from .seeding import DEFAULT_PASSWORD, SeedPlan, bulk_seed
+from .tasks import (
+    reconcile_post_counters, compact_trending, recompute_user_stats, rebuild_suggestions, rebuild_affinity
+)
 from .schema.mutations import (
     RegisterUser, CreatePost, UpdatePost, DeletePost, LikePost, 
     UnlikePost, CreateComment, SharePost, FollowUser, UnfollowUser,
@@ -24,6 +53,9 @@ class GraphQLTestCase(TestCase):
     
     def setUp(self):
         """Set up test data"""
+        # Start every test with an empty timeline/leaderboard store
+        get_redis().flushdb()
+        
         # Create test users
         self.user1 = CustomUser.objects.create_user(
             username='testuser1',
@@ -82,6 +114,19 @@ class GraphQLTestCase(TestCase):
         
         return mock_info
     
+    @contextmanager
+    def committed(self):
+        """Run the block's on_commit work as if it had committed, writing the interactions it logged"""
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        interactions.flush()
+    
+    def execute_query(self, query, user=None, variables=None):
+        """Execute a GraphQL document against the schema as the given user"""
+        request = RequestFactory().post('/graphql')
+        request.user = user if user else self.user1
+        return schema.execute(query, context_value=request, variable_values=variables)
+    
     def create_mock_input(self, **kwargs):
         """Create mock input object"""
         mock_input = Mock()
@@ -644,4 +689,1982 @@ class EdgeCaseTests(GraphQLTestCase):
         result = mutation.mutate(info, user_id=self.non_existent_user_uuid)
         
         self.assertFalse(result.success)
-        self.assertIn("User not found", result.message)
\ No newline at end of file
+        self.assertIn("User not found", result.message)
+
+
+# ===== QUERY COUNT TESTS =====
+class LoaderQueryCountTests(GraphQLTestCase):
+    """Computed fields must be batched per page, not queried per row"""
+    
+    FEED_QUERY = """
+        query Feed($limit: Int) {
+            userFeed(limit: $limit) {
+                id
+                likesCount
+                commentCount
+                shareCount
+                isLikedByUser
+                user { username }
+            }
+        }
+    """
+    
+    def create_feed_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(user=self.user2, content=f"Feed post {i}")
+            PostLike.objects.create(post=post, user=self.user1)
+            Comment.objects.create(post=post, user=self.user1, content="Nice")
+    
+    def count_feed_queries(self, limit):
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.execute_query(self.FEED_QUERY, variables={'limit': limit})
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['userFeed']), limit)
+        return len(ctx.captured_queries), result.data['userFeed']
+    
+    def test_user_feed_query_count_is_constant(self):
+        """Test the feed costs the same number of queries for any page size"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        self.create_feed_posts(12)
+        
+        # The first read materializes the timeline
+        self.count_feed_queries(2)
+        
+        small_page_queries, _ = self.count_feed_queries(2)
+        large_page_queries, posts = self.count_feed_queries(10)
+        
+        self.assertEqual(small_page_queries, large_page_queries)
+        self.assertTrue(all(post['likesCount'] == 1 for post in posts))
+        self.assertTrue(all(post['commentCount'] == 1 for post in posts))
+        self.assertTrue(all(post['isLikedByUser'] for post in posts))
+    
+    def test_post_comments_query_count_is_constant(self):
+        """Test comment like fields are batched across the thread"""
+        query = """
+            query Comments($postId: ID!) {
+                postComments(postId: $postId) { id likesCount isLikedByUser }
+            }
+        """
+        counts = []
+        for _ in range(2):
+            for _ in range(3):
+                comment = Comment.objects.create(post=self.post1, user=self.user2, content="More")
+                CommentLike.objects.create(comment=comment, user=self.user1)
+            with CaptureQueriesContext(connection) as ctx:
+                result = self.execute_query(query, variables={'postId': str(self.post1.id)})
+            self.assertIsNone(result.errors)
+            counts.append(len(ctx.captured_queries))
+        
+        self.assertEqual(counts[0], counts[1])
+
+
+
+# ===== TIMELINE TESTS =====
+class TimelineTests(GraphQLTestCase):
+    """Test fan-out-on-write home timelines"""
+    
+    def feed_titles(self, user, limit=10, offset=0):
+        info = self.create_mock_info(user)
+        return [post.title for post in self.query_resolver.resolve_user_feed(info, limit=limit, offset=offset)]
+    
+    def test_feed_is_materialized_on_first_read(self):
+        """Test the first read builds the timeline from followed accounts"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        
+        self.assertEqual(self.feed_titles(self.user1), ["Test Post 2", "Test Post 1"])
+        self.assertEqual(get_redis().zcard(timelines.timeline_key(self.user1.id)), 2)
+    
+    def test_new_post_is_pushed_to_followers(self):
+        """Test creating a post fans out to materialized follower timelines"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        self.feed_titles(self.user1)
+        
+        with self.committed():
+            Post.objects.create(user=self.user2, title="Fresh Post", content="Fresh content")
+        
+        self.assertEqual(self.feed_titles(self.user1)[0], "Fresh Post")
+    
+    def test_deleted_post_is_removed_from_timelines(self):
+        """Test DeletePost removes the post from follower timelines"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        self.feed_titles(self.user1)
+        
+        with self.committed():
+            result = DeletePost().mutate(self.create_mock_info(self.user2), id=str(self.post2.id))
+        
+        self.assertTrue(result.success)
+        self.assertEqual(self.feed_titles(self.user1), ["Test Post 1"])
+        self.assertIsNone(get_redis().zscore(timelines.timeline_key(self.user1.id), str(self.post2.id)))
+    
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Test following merges recent posts and unfollowing removes them"""
+        self.assertEqual(self.feed_titles(self.user1), ["Test Post 1"])
+        
+        with self.committed():
+            FollowUser().mutate(self.create_mock_info(self.user1), user_id=str(self.user2.id))
+        self.assertEqual(self.feed_titles(self.user1), ["Test Post 2", "Test Post 1"])
+        
+        with self.committed():
+            UnfollowUser().mutate(self.create_mock_info(self.user1), user_id=str(self.user2.id))
+        self.assertEqual(self.feed_titles(self.user1), ["Test Post 1"])
+    
+    def test_rolled_back_delete_keeps_the_post(self):
+        """Test a delete that never commits leaves follower timelines alone"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        self.feed_titles(self.user1)
+        
+        with self.captureOnCommitCallbacks():
+            DeletePost().mutate(self.create_mock_info(self.user2), id=str(self.post2.id))
+        
+        self.assertIsNotNone(get_redis().zscore(timelines.timeline_key(self.user1.id), str(self.post2.id)))
+    
+    def test_pages_beyond_timeline_fall_back_to_database(self):
+        """Test deep pages are served from the database"""
+        with self.settings(FEED_TIMELINE_SIZE=1):
+            self.assertEqual(self.feed_titles(self.user1, limit=1, offset=0), ["Test Post 1"])
+            self.assertEqual(self.feed_titles(self.user1, limit=1, offset=1), [])
+            
+            Follow.objects.create(follower=self.user1, followee=self.user2)
+            self.assertEqual(self.feed_titles(self.user1, limit=2, offset=0), ["Test Post 2", "Test Post 1"])
+
+
+# ===== PAGINATION TESTS =====
+class CursorPaginationTests(GraphQLTestCase):
+    """Test keyset (cursor) pagination connections"""
+    
+    POSTS_QUERY = """
+        query Posts($first: Int, $after: String) {
+            allPostsConnection(first: $first, after: $after) {
+                edges { cursor node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+    
+    FEED_QUERY = """
+        query Feed($first: Int, $after: String) {
+            userFeedConnection(first: $first, after: $after) {
+                edges { node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+    
+    def walk(self, query, field, first, variables=None):
+        """Follow endCursor until the last page and return every title seen"""
+        titles, after = [], None
+        while True:
+            result = self.execute_query(query, variables={**(variables or {}), 'first': first, 'after': after})
+            self.assertIsNone(result.errors)
+            connection = result.data[field]
+            titles.extend(edge['node'].get('title') or edge['node'].get('content') for edge in connection['edges'])
+            if not connection['pageInfo']['hasNextPage']:
+                return titles
+            after = connection['pageInfo']['endCursor']
+    
+    def test_all_posts_pages_in_order(self):
+        """Test walking every page returns each post once, newest first"""
+        for i in range(3, 8):
+            Post.objects.create(user=self.user1, title=f"Test Post {i}", content="More content")
+        
+        titles = self.walk(self.POSTS_QUERY, 'allPostsConnection', first=2)
+        
+        self.assertEqual(titles, [f"Test Post {i}" for i in range(7, 0, -1)])
+    
+    def test_new_posts_do_not_shift_pages(self):
+        """Test rows created after the first page do not duplicate on the next"""
+        first_page = self.execute_query(self.POSTS_QUERY, variables={'first': 1})
+        cursor = first_page.data['allPostsConnection']['pageInfo']['endCursor']
+        
+        Post.objects.create(user=self.user1, title="Newer Post", content="Arrives between pages")
+        
+        second_page = self.execute_query(self.POSTS_QUERY, variables={'first': 1, 'after': cursor})
+        edges = second_page.data['allPostsConnection']['edges']
+        self.assertEqual([edge['node']['title'] for edge in edges], ["Test Post 1"])
+        self.assertFalse(second_page.data['allPostsConnection']['pageInfo']['hasNextPage'])
+    
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        result = self.execute_query(self.POSTS_QUERY, variables={'first': 1, 'after': 'not-a-cursor'})
+        
+        self.assertIsNotNone(result.errors)
+        self.assertIn("Invalid cursor", result.errors[0].message)
+    
+    def test_user_feed_connection(self):
+        """Test the feed connection pages through the materialized timeline"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        Post.objects.create(user=self.user2, title="Test Post 3", content="More content")
+        
+        titles = self.walk(self.FEED_QUERY, 'userFeedConnection', first=1)
+        
+        self.assertEqual(titles, ["Test Post 3", "Test Post 2", "Test Post 1"])
+    
+    def test_user_feed_connection_past_timeline(self):
+        """Test the feed connection continues from the database past the timeline"""
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        Post.objects.create(user=self.user2, title="Test Post 3", content="More content")
+        
+        with self.settings(FEED_TIMELINE_SIZE=2):
+            titles = self.walk(self.FEED_QUERY, 'userFeedConnection', first=2)
+        
+        self.assertEqual(titles, ["Test Post 3", "Test Post 2", "Test Post 1"])
+    
+    def test_comment_connections(self):
+        """Test top-level comments and replies page oldest first"""
+        Comment.objects.create(post=self.post1, user=self.user1, content="Second comment")
+        for i in range(3):
+            Comment.objects.create(post=self.post1, user=self.user1, parent_comment=self.comment1, content=f"Reply {i}")
+        
+        comments_query = """
+            query Comments($postId: ID!, $first: Int, $after: String) {
+                postCommentsConnection(postId: $postId, first: $first, after: $after) {
+                    edges { node { content } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        replies_query = """
+            query Replies($commentId: ID!, $first: Int, $after: String) {
+                commentRepliesConnection(commentId: $commentId, first: $first, after: $after) {
+                    edges { node { content } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        
+        comments = self.walk(comments_query, 'postCommentsConnection', first=1, variables={'postId': str(self.post1.id)})
+        replies = self.walk(replies_query, 'commentRepliesConnection', first=2, variables={'commentId': str(self.comment1.id)})
+        
+        self.assertEqual(comments, ["This is a test comment", "Second comment"])
+        self.assertEqual(replies, ["Reply 0", "Reply 1", "Reply 2"])
+
+
+
+# ===== COUNTER TESTS =====
+class EngagementCounterTests(GraphQLTestCase):
+    """Test denormalized engagement counters on Post"""
+    
+    def assertCounters(self, post, likes, comments, shares):
+        post.refresh_from_db()
+        self.assertEqual((post.like_count, post.comment_count, post.share_count), (likes, comments, shares))
+    
+    def test_counter_columns_keep_their_api_names(self):
+        """Test the like counter is exposed only as likesCount, not also as likeCount"""
+        fields = schema.graphql_schema.get_type('PostType').fields
+        
+        self.assertNotIn('likeCount', fields)
+        self.assertTrue({'likesCount', 'commentCount', 'shareCount'} <= set(fields))
+    
+    def test_mutations_update_counters(self):
+        """Test like, unlike, comment and share keep the counters in step"""
+        info = self.create_mock_info(self.user2)
+        
+        result = LikePost().mutate(info, post_id=str(self.post1.id))
+        self.assertEqual(result.post.like_count, 1)
+        
+        CreateComment().mutate(info, input=self.create_mock_input(
+            post_id=str(self.post1.id), content='Counted', parent_comment_id=None
+        ))
+        SharePost().mutate(info, input=self.create_mock_input(post_id=str(self.post1.id), caption=None))
+        self.assertCounters(self.post1, likes=1, comments=2, shares=1)
+        
+        # Repeating a like or share must not double count
+        LikePost().mutate(info, post_id=str(self.post1.id))
+        SharePost().mutate(info, input=self.create_mock_input(post_id=str(self.post1.id), caption=None))
+        self.assertCounters(self.post1, likes=1, comments=2, shares=1)
+        
+        result = UnlikePost().mutate(info, post_id=str(self.post1.id))
+        self.assertEqual(result.post.like_count, 0)
+        self.assertCounters(self.post1, likes=0, comments=2, shares=1)
+    
+    def test_comment_soft_delete_updates_counter(self):
+        """Test soft deleting a comment decrements the post's comment count once"""
+        self.comment1.soft_delete()
+        self.comment1.soft_delete()
+        
+        self.assertCounters(self.post1, likes=0, comments=0, shares=0)
+    
+    def test_reconcile_repairs_drift(self):
+        """Test the reconciliation task repairs drifted counters"""
+        PostLike.objects.create(post=self.post1, user=self.user2)
+        Post.objects.filter(pk=self.post1.pk).update(like_count=42, comment_count=0)
+        
+        repaired = reconcile_post_counters(batch_size=1)
+        
+        self.assertEqual(repaired, 1)
+        self.assertCounters(self.post1, likes=1, comments=1, shares=0)
+        self.assertCounters(self.post2, likes=0, comments=0, shares=0)
+
+
+class TrendingTests(GraphQLTestCase):
+    """Test the decayed trending leaderboards"""
+    
+    def test_leaderboard_tracks_engagement(self):
+        """Test likes, comments and shares move posts up the leaderboard"""
+        # Seed the windows so later events are applied incrementally
+        trending.top_post_ids(24, 10)
+        
+        with self.committed():
+            PostLike.objects.create(post=self.post2, user=self.user1)
+            Share.objects.create(post=self.post2, user=self.user1)
+        
+        self.assertEqual(trending.top_post_ids(24, 1)[0], str(self.post2.id))
+        self.assertEqual(trending.top_post_ids(1, 1)[0], str(self.post2.id))
+        
+        posts = self.query_resolver.resolve_trending_posts(self.create_mock_info(), limit=1, hours=24)
+        self.assertEqual(posts, [self.post2])
+    
+    def test_unlike_reverses_score(self):
+        """Test removing an engagement takes its weight back off"""
+        trending.top_post_ids(24, 10)
+        epoch = int(get_redis().get(trending.epoch_key(24)))
+        key = trending.leaderboard_key(24, epoch)
+        before = get_redis().zscore(key, str(self.post2.id))
+        
+        with self.committed():
+            like = PostLike.objects.create(post=self.post2, user=self.user1)
+        self.assertGreater(get_redis().zscore(key, str(self.post2.id)), before)
+        
+        # Hours later the like still takes back only what it added when it happened
+        later = time.time() + 6 * 3600
+        with patch('social_media_feed_app.trending.time.time', return_value=later):
+            with self.committed():
+                like.delete()
+        self.assertAlmostEqual(get_redis().zscore(key, str(self.post2.id)), before, places=6)
+    
+    def test_engagement_waits_for_commit(self):
+        """Test a rolled back like never reaches the leaderboard"""
+        trending.top_post_ids(24, 10)
+        epoch = int(get_redis().get(trending.epoch_key(24)))
+        key = trending.leaderboard_key(24, epoch)
+        before = get_redis().zscore(key, str(self.post2.id))
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            PostLike.objects.create(post=self.post2, user=self.user1)
+        
+        self.assertEqual(get_redis().zscore(key, str(self.post2.id)), before)
+        self.assertTrue(callbacks)
+    
+    def test_deleted_post_is_untracked(self):
+        """Test soft-deleted posts leave the leaderboard"""
+        trending.top_post_ids(24, 10)
+        with self.committed():
+            self.post1.is_deleted = True
+            self.post1.save()
+        
+        self.assertNotIn(str(self.post1.id), trending.top_post_ids(24, 10))
+        self.assertNotIn(self.post1, self.query_resolver.resolve_trending_posts(self.create_mock_info(), limit=5, hours=24))
+    
+    def test_rolled_back_post_is_not_tracked(self):
+        """Test a post whose transaction never commits stays off the leaderboard"""
+        trending.top_post_ids(24, 10)
+        with self.captureOnCommitCallbacks():
+            post = Post.objects.create(user=self.user1, content="Rolled back")
+        
+        self.assertNotIn(str(post.id), trending.top_post_ids(24, 10))
+    
+    def test_stale_leaders_are_skipped_without_shortening_the_page(self):
+        """Test the page reads further down the leaderboard when its top entries have gone"""
+        with self.committed():
+            posts = [Post.objects.create(user=self.user1, content=f"Post {n}") for n in range(4)]
+        trending.top_post_ids(24, 10)
+        redis = get_redis()
+        key = trending.leaderboard_key(24, int(redis.get(trending.epoch_key(24))))
+        for rank, post in enumerate(posts):
+            redis.zadd(key, {str(post.id): 100 - rank})
+        # The two leaders were deleted without leaving the leaderboard
+        Post.objects.filter(id__in=[posts[0].id, posts[1].id]).update(is_deleted=True)
+        
+        result = self.query_resolver.resolve_trending_posts(self.create_mock_info(), limit=1, hours=24)
+        
+        self.assertEqual(result, [posts[2]])
+    
+    def test_rebuild_seeds_existing_posts(self):
+        """Test an empty store is seeded from the post counters on first read"""
+        get_redis().flushdb()
+        
+        # post1 carries the setUp comment
+        self.assertEqual(trending.top_post_ids(24, 10), [str(self.post1.id), str(self.post2.id)])
+    
+    def test_nonstandard_window_uses_database(self):
+        """Test windows without a leaderboard are ranked in SQL"""
+        self.assertIsNone(trending.top_post_ids(12, 10))
+        
+        posts = self.query_resolver.resolve_trending_posts(self.create_mock_info(), limit=5, hours=12)
+        self.assertEqual(posts[0], self.post1)
+    
+    def test_compaction_expires_old_posts(self):
+        """Test compaction drops posts that have aged out of a window"""
+        trending.top_post_ids(1, 10)
+        two_hours_ago = self.post1.created_at.timestamp() - 2 * 3600
+        get_redis().zadd(trending.CREATED_KEY, {str(self.post1.id): two_hours_ago})
+        
+        compact_trending()
+        
+        self.assertEqual(trending.top_post_ids(1, 10), [str(self.post2.id)])
+        self.assertIn(str(self.post1.id), trending.top_post_ids(24, 10))
+    
+    def test_rebase_preserves_ranking(self):
+        """Test rescaling against a new epoch keeps relative order"""
+        trending.top_post_ids(24, 10)
+        redis = get_redis()
+        old_epoch = int(redis.get(trending.epoch_key(24)))
+        
+        trending._rebase(redis, 24, old_epoch, old_epoch + 3600)
+        
+        self.assertFalse(redis.exists(trending.leaderboard_key(24, old_epoch)))
+        self.assertEqual(trending.top_post_ids(24, 10), [str(self.post1.id), str(self.post2.id)])
+
+
+class UserStatsTests(GraphQLTestCase):
+    """Test the precomputed UserStats rollup"""
+    
+    def stats_for(self, user):
+        return UserStats.objects.get(user=user)
+    
+    def test_write_paths_update_rollup(self):
+        """Test likes, comments, shares and follows are rolled up incrementally"""
+        like = PostLike.objects.create(post=self.post1, user=self.user2)
+        Share.objects.create(post=self.post1, user=self.user2)
+        follow = Follow.objects.create(follower=self.user2, followee=self.user1)
+        
+        stats = self.stats_for(self.user1)
+        self.assertEqual(
+            (stats.total_posts, stats.total_likes, stats.total_comments, stats.total_shares, stats.followers_count),
+            (1, 1, 1, 1, 1)
+        )
+        self.assertEqual(self.stats_for(self.user2).following_count, 1)
+        
+        like.delete()
+        follow.delete()
+        self.comment1.soft_delete()
+        stats = self.stats_for(self.user1)
+        self.assertEqual((stats.total_likes, stats.total_comments, stats.followers_count), (0, 0, 0))
+    
+    def test_top_post_follows_engagement(self):
+        """Test the top post moves with engagement and post deletion"""
+        newer = Post.objects.create(user=self.user1, content="Newer post")
+        self.assertEqual(self.stats_for(self.user1).top_post_id, self.post1.id)
+        
+        PostLike.objects.create(post=newer, user=self.user2)
+        Share.objects.create(post=newer, user=self.user2)
+        self.assertEqual(self.stats_for(self.user1).top_post_id, newer.id)
+        
+        PostLike.objects.filter(post=newer).delete()
+        Share.objects.filter(post=newer).delete()
+        self.assertEqual(self.stats_for(self.user1).top_post_id, self.post1.id)
+        
+        self.post1.is_deleted = True
+        self.post1.save()
+        stats = self.stats_for(self.user1)
+        self.assertEqual((stats.total_posts, stats.top_post_id), (1, newer.id))
+
+    def test_post_deletion_applies_once(self):
+        """Test later saves of a deleted post do not repeat the deletion side effects"""
+        newer = Post.objects.create(user=self.user1, content="Newer post")
+        result = DeletePost().mutate(self.create_mock_info(self.user1), id=str(newer.id))
+        self.assertTrue(result.success)
+
+        deleted = Post.objects.get(pk=newer.pk)
+        deleted.title = "Edited after deletion"
+        deleted.save()
+        deleted.save()
+
+        with patch('social_media_feed_app.signals.remove_post_from_timelines.delay') as remove:
+            Post.objects.get(pk=newer.pk).save()
+        remove.assert_not_called()
+        self.assertEqual(self.stats_for(self.user1).total_posts, 1)
+
+    def test_user_stats_is_single_lookup(self):
+        """Test userStats reads the rollup in one query"""
+        info = self.create_mock_info()
+        
+        with self.assertNumQueries(1):
+            stats = self.query_resolver.resolve_user_stats(info, id=str(self.user1.id))
+            self.assertEqual(stats.top_performing_post.user, self.user1)
+    
+    def test_recompute_repairs_drift(self):
+        """Test the bulk recompute rebuilds missing and drifted rollups"""
+        PostLike.objects.create(post=self.post1, user=self.user2)
+        UserStats.objects.filter(user=self.user1).update(total_likes=42, top_post=None)
+        UserStats.objects.filter(user=self.user2).delete()
+        
+        self.assertEqual(recompute_user_stats(batch_size=1), 2)
+        
+        stats = self.stats_for(self.user1)
+        self.assertEqual((stats.total_likes, stats.total_comments, stats.top_post_id), (1, 1, self.post1.id))
+        self.assertEqual(self.stats_for(self.user2).total_posts, 1)
+
+
+class QueryCostTests(GraphQLTestCase):
+    """Test query cost analysis and depth limiting"""
+    
+    def post_graphql(self, query, variables=None):
+        return self.client.post(
+            '/graphql',
+            data={'query': query, 'variables': variables or {}},
+            content_type='application/json'
+        )
+    
+    def test_cost_reported_in_extensions(self):
+        """Test list arguments multiply the cost of their selections"""
+        response = self.post_graphql(
+            'query Feed($n: Int) { allPosts(limit: $n) { id user { username } } }',
+            variables={'n': 5}
+        )
+        
+        cost = response.json()['extensions']['cost']
+        # 5 posts, each costing 1 plus 1 for its user
+        self.assertEqual((cost['requested'], cost['depth']), (10, 3))
+    
+    def test_nested_reverse_relations_rejected(self):
+        """Test unbounded nested relations are rejected before resolving"""
+        query = '''
+            query Deep($id: ID!) {
+                userById(id: $id) { posts { comments { likes { user { posts { id } } } } } }
+            }
+        '''
+        with self.assertNumQueries(0):
+            response = self.post_graphql(query, variables={'id': str(self.user1.id)})
+        
+        body = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceeds the maximum allowed cost', body['errors'][0]['message'])
+        self.assertNotIn('data', body)
+        self.assertGreater(body['extensions']['cost']['requested'], body['extensions']['cost']['maximum'])
+    
+    def test_websocket_rejects_over_budget_operations(self):
+        """Test the websocket consumer prices operations with their variables before executing them"""
+
+        async def start(limit):
+            communicator = WebsocketCommunicator(application, '/graphql-ws/', subprotocols=['graphql-transport-ws'])
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'connection_init', 'payload': {}})
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'subscribe', 'id': '1', 'payload': {
+                'query': 'query Posts($n: Int) { allPosts(limit: $n) { comments { likes { id } } } }',
+                'variables': {'n': limit},
+                'operationName': 'Posts',
+            }})
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(start)(1000)
+
+        # Rejected before execution, priced with the variable: 1000 posts of 20 comments of 20 likes
+        self.assertEqual(message['type'], 'next')
+        self.assertIsNone(message['payload']['data'])
+        [error] = message['payload']['errors']
+        self.assertIn('Query cost 421000 exceeds the maximum allowed cost', error['message'])
+
+    def test_depth_limit(self):
+        """Test operations nested past MAX_DEPTH are rejected"""
+        with self.settings(GRAPHQL_QUERY_COST={
+            'MAX_COST': 10 ** 9, 'MAX_DEPTH': 3, 'DEFAULT_LIST_SIZE': 20, 'COST_PER_MINUTE': 0
+        }):
+            response = self.post_graphql('{ allPosts(limit: 1) { user { posts { id } } } }')
+        
+        self.assertIn('exceeds the maximum allowed depth of 3', response.json()['errors'][0]['message'])
+    
+    def test_fragments_are_priced(self):
+        """Test selections inside fragments count toward the cost"""
+        response = self.post_graphql('''
+            query { trendingPosts(limit: 3) { ...PostFields } }
+            fragment PostFields on PostType { id comments { id } }
+        ''')
+        
+        # 3 posts, each costing 1 plus DEFAULT_LIST_SIZE comments
+        self.assertEqual(response.json()['extensions']['cost']['requested'], 3 * (1 + 20))
+
+    def test_connection_edges_are_bounded_by_first(self):
+        """Test a connection's size bounds its edges once instead of multiplying them again"""
+        self.client.force_login(self.user1)
+        response = self.post_graphql('''
+            query { allPostsConnection(first: 100) {
+                edges { cursor node { title user { username } } }
+                pageInfo { hasNextPage endCursor }
+            } }
+        ''')
+
+        body = response.json()
+        self.assertNotIn('errors', body)
+        # The connection and its pageInfo once, then 100 edges each with a node and its user
+        self.assertEqual(body['extensions']['cost']['requested'], 1 + 1 + 100 * (1 + 1 + 1))
+    
+    def test_per_minute_budget_throttles(self):
+        """Test a client is throttled once its per-minute budget is spent"""
+        self.client.force_login(self.user1)
+        with self.settings(GRAPHQL_QUERY_COST={
+            'MAX_COST': 5000, 'MAX_DEPTH': 10, 'DEFAULT_LIST_SIZE': 20, 'COST_PER_MINUTE': 15
+        }):
+            first = self.post_graphql('{ allPosts(limit: 10) { id } }')
+            second = self.post_graphql('{ allPosts(limit: 10) { id } }')
+        
+        self.assertNotIn('errors', first.json())
+        self.assertIn('budget of 15 per minute exceeded', second.json()['errors'][0]['message'])
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    """Test automatic persisted queries and the parsed document cache"""
+    
+    QUERY = '{ trendingPosts(limit: 2) { id } }'
+    
+    def setUp(self):
+        super().setUp()
+        document_cache().clear()
+        self.sha = query_hash(self.QUERY)
+    
+    def post_graphql(self, query=None, sha=None):
+        data = {}
+        if query:
+            data['query'] = query
+        if sha:
+            data['extensions'] = {'persistedQuery': {'version': 1, 'sha256Hash': sha}}
+        return self.client.post('/graphql', data=data, content_type='application/json').json()
+    
+    def test_automatic_persisted_query_flow(self):
+        """Test an unknown hash is reported, registered with its query, then served by hash alone"""
+        body = self.post_graphql(sha=self.sha)
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+        
+        body = self.post_graphql(self.QUERY, sha=self.sha)
+        self.assertIn('trendingPosts', body['data'])
+        
+        document_cache().clear()
+        body = self.post_graphql(sha=self.sha)
+        self.assertIn('trendingPosts', body['data'])
+    
+    def test_hash_mismatch_rejected(self):
+        """Test a hash that does not match the query text is rejected"""
+        body = self.post_graphql(self.QUERY, sha=query_hash('{ other }'))
+        
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'INVALID_PERSISTED_QUERY_HASH')
+    
+    def test_repeat_queries_skip_parse_and_validate(self):
+        """Test a repeated operation is served from the document cache"""
+        self.post_graphql(self.QUERY)
+        
+        with patch('social_media_feed_app.schema.documents.parse') as parse:
+            body = self.post_graphql(self.QUERY)
+        
+        parse.assert_not_called()
+        self.assertIn('trendingPosts', body['data'])
+        self.assertEqual(document_cache().hits, 1)
+    
+    def test_require_persisted_rejects_unregistered_queries(self):
+        """Test only registered queries run when persisted queries are required"""
+        config = {'REQUIRE_PERSISTED': True, 'CACHE_SIZE': 16, 'TTL': 60}
+        with self.settings(GRAPHQL_PERSISTED_QUERIES=config):
+            body = self.post_graphql(self.QUERY, sha=self.sha)
+            self.assertEqual(body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_REQUIRED')
+            
+            register(self.QUERY)
+            body = self.post_graphql(sha=self.sha)
+        
+        self.assertIn('trendingPosts', body['data'])
+
+
+class ResolverProfilingTests(GraphQLTestCase):
+    """Test per-field resolver timing and SQL counts"""
+    
+    QUERY = 'query Trending { trendingPosts(limit: 5) { id likesCount user { username } } }'
+    
+    def setUp(self):
+        super().setUp()
+        profiling.aggregate.reset()
+        self.client.force_login(self.user1)
+    
+    def post_graphql(self, **headers):
+        return self.client.post(
+            '/graphql', data={'query': self.QUERY}, content_type='application/json', headers=headers
+        ).json()
+    
+    def test_profile_in_extensions_on_request(self):
+        """Test a client can ask for its resolver profile"""
+        with self.settings(GRAPHQL_PROFILING={'SAMPLE_RATE': 0, 'EXPOSE_EXTENSIONS': True}):
+            body = self.post_graphql(**{'X-Profile-Resolvers': '1'})
+        
+        resolvers = body['extensions']['resolvers']
+        self.assertGreaterEqual(resolvers['trendingPosts']['queries'], 1)
+        self.assertEqual(resolvers['trendingPosts.likesCount']['calls'], 2)
+        self.assertEqual(resolvers['trendingPosts.likesCount']['queries'], 0)
+    
+    def test_unsampled_requests_are_not_profiled(self):
+        """Test requests outside the sample add nothing"""
+        with self.settings(GRAPHQL_PROFILING={'SAMPLE_RATE': 0, 'EXPOSE_EXTENSIONS': False}):
+            body = self.post_graphql(**{'X-Profile-Resolvers': '1'})
+        
+        self.assertNotIn('resolvers', body.get('extensions', {}))
+        self.assertEqual(profiling.aggregate.snapshot(), {})
+    
+    def test_aggregate_by_operation(self):
+        """Test sampled requests are aggregated per operation and dumped by the endpoint"""
+        with self.settings(GRAPHQL_PROFILING={'SAMPLE_RATE': 1, 'EXPOSE_EXTENSIONS': False}):
+            self.post_graphql()
+            self.post_graphql()
+        
+        with self.settings(DEBUG=True):
+            dump = self.client.get('/graphql/profile', {'reset': 1}).json()
+        
+        self.assertEqual(dump['Trending']['requests'], 2)
+        self.assertEqual(dump['Trending']['fields']['trendingPosts.user.username']['calls'], 4)
+        self.assertEqual(profiling.aggregate.snapshot(), {})
+    
+    def test_profile_endpoint_requires_staff(self):
+        """Test the aggregate is hidden from non-staff users outside DEBUG"""
+        with self.settings(DEBUG=False):
+            response = self.client.get('/graphql/profile')
+        
+        self.assertEqual(response.status_code, 403)
+
+
+class BenchmarkTests(TestCase):
+    """Smoke test the benchmark suite against a tiny dataset"""
+    
+    def setUp(self):
+        get_redis().flushdb()
+    
+    def test_every_operation_runs_cleanly(self):
+        """Test each query and mutation replays without errors and reports its metrics"""
+        dataset = benchmarks.seed_dataset(users=4, posts_per_user=2, follows_per_user=2, likes_per_post=2, comments_per_post=1, days=1)
+        
+        results = benchmarks.run_suite(dataset, iterations=3, concurrency=1, warmup=1, seed=1)
+        
+        self.assertEqual(set(results['operations']), {operation.name for operation in benchmarks.OPERATIONS})
+        for name, result in results['operations'].items():
+            self.assertEqual(result['errors'], 0, f"{name}: {result['first_error']}")
+            self.assertGreater(result['queries_per_op'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+    
+    def test_broadcast_delivery_queries_are_constant(self):
+        """Test delivering a broadcast costs no queries however many subscribers there are"""
+        dataset = benchmarks.seed_dataset(users=4, posts_per_user=1, follows_per_user=1, likes_per_post=0, comments_per_post=0, days=1)
+        
+        results = benchmarks.run_broadcast_fanout(dataset, subscriber_counts=(1, 25))
+        
+        for count, result in results.items():
+            self.assertEqual(result['errors'], 0, count)
+            self.assertEqual((result['build_queries'], result['delivery_queries']), (0, 0), count)
+    
+    def test_compare_flags_regressions(self):
+        """Test extra queries and slower p95s beyond the threshold are regressions"""
+        baseline = {'operations': {'allPosts': {'p50_ms': 1, 'p95_ms': 10, 'p99_ms': 12, 'queries_per_op': 3}}}
+        current = {'operations': {'allPosts': {'p50_ms': 1, 'p95_ms': 13, 'p99_ms': 12, 'queries_per_op': 4}}}
+        
+        _, regressions = benchmarks.compare(baseline, current, max_regression=0.2)
+        
+        self.assertEqual([(name, metric) for name, metric, *_ in regressions], [('allPosts', 'p95_ms'), ('allPosts', 'queries_per_op')])
+
+
+class BulkSeedTests(TestCase):
+    """Test the bulk loader behind `seed --users`"""
+    
+    def test_bulk_seed_is_consistent(self):
+        """Test bulk-loaded rows carry correct counters and stats without signals"""
+        plan = SeedPlan(6, posts_per_user=3, follows_per_user=2, likes_per_post=2, comments_per_post=1, days=2, batch_size=4, seed=3)
+        
+        totals = bulk_seed(plan, workers=1)
+        
+        self.assertEqual((totals['CustomUser'], totals['Post'], totals['Follow']), (6, 18, 12))
+        self.assertEqual(PostLike.objects.count(), totals.get('PostLike', 0))
+        # Signals were bypassed, yet counters and rollups already agree with the rows
+        self.assertEqual(reconcile_post_counters(), 0)
+        self.assertEqual(UserStats.objects.get(user_id=plan.user_id(0)).followers_count,
+                         Follow.objects.filter(followee_id=plan.user_id(0)).count())
+        self.assertFalse(Follow.objects.filter(follower_id=F('followee_id')).exists())
+        self.assertTrue(self.client.login(username=plan.username(5), password=DEFAULT_PASSWORD))
+    
+    def test_same_seed_same_dataset(self):
+        """Test a seed reproduces the same users and posts"""
+        first, second = SeedPlan(3, seed=9), SeedPlan(3, seed=9)
+        
+        self.assertEqual(first.user_id(2), second.user_id(2))
+        self.assertEqual(first.rng('user', 1).random(), second.rng('user', 1).random())
+
+
+class InteractionLogTests(TestCase):
+    """Test interaction events are buffered and written in batches"""
+    
+    def setUp(self):
+        interactions.flush()
+        self.user = User.objects.create_user(username='logger', email='logger@example.com', password='testpass123')
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='testpass123')
+        self.post = Post.objects.create(user=self.author, content='Buffered')
+    
+    def make_buffer(self, **overrides):
+        options = dict(buffer_size=10, batch_size=10, flush_interval=None, enqueue_timeout=0, background=False)
+        options.update(overrides)
+        return InteractionBuffer(**options)
+    
+    def row(self):
+        return Interaction(id=uuid.uuid4(), user=self.user, target_type='user', target_id=self.user.id, interaction_type='view')
+    
+    def test_events_are_written_after_commit_and_flush(self):
+        """Test a like logs its interaction on commit and writes it on flush"""
+        with self.captureOnCommitCallbacks(execute=True):
+            PostLike.objects.create(post=self.post, user=self.user)
+        
+        self.assertFalse(Interaction.objects.filter(interaction_type='like').exists())
+        interactions.flush()
+        
+        like = Interaction.objects.get(interaction_type='like')
+        self.assertEqual((like.user_id, like.target_id), (self.user.id, self.post.id))
+        self.assertEqual(like.metadata, {'liked_user_id': str(self.author.id)})
+    
+    def test_events_wait_for_commit(self):
+        """Test nothing is buffered until the transaction commits"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Follow.objects.create(follower=self.user, followee=self.author)
+        
+        self.assertTrue(callbacks)
+        self.assertEqual(interactions.flush(), 0)
+    
+    def test_full_buffer_makes_the_producer_write(self):
+        """Test a full buffer applies backpressure instead of dropping events"""
+        buffer = self.make_buffer(buffer_size=2, batch_size=2)
+        
+        for _ in range(5):
+            buffer.put(self.row())
+        
+        self.assertGreater(buffer.overflows, 0)
+        self.assertLessEqual(len(buffer), 2)
+        buffer.flush()
+        self.assertEqual(Interaction.objects.filter(user=self.user).count(), 5)
+    
+    def test_failed_batch_is_retried(self):
+        """Test a batch that fails to insert is kept and written exactly once"""
+        buffer = self.make_buffer()
+        row = self.row()
+        buffer.put(row)
+        
+        with patch.object(Interaction.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(len(buffer), 1)
+        
+        buffer.flush()
+        # A redelivered row is ignored rather than duplicated
+        buffer.put(row)
+        buffer.flush()
+        self.assertEqual(Interaction.objects.filter(id=row.id).count(), 1)
+        self.assertEqual(len(buffer), 0)
+    
+    def test_full_buffer_drops_events_while_the_database_is_down(self):
+        """Test put neither hangs nor raises when the overflow write fails, and drops once nothing drains"""
+        buffer = self.make_buffer(buffer_size=2, batch_size=2)
+        for _ in range(2):
+            buffer.put(self.row())
+        
+        with patch.object(Interaction.objects, 'bulk_create', side_effect=DatabaseError):
+            # The failed batch moves out of the queue, making room for these rows
+            for _ in range(2):
+                buffer.put(self.row())
+            # The retry fails again and the queue stays full
+            buffer.put(self.row())
+        self.assertEqual((buffer.overflows, buffer.failures, buffer.dropped), (2, 2, 1))
+        self.assertEqual(len(buffer), 4)
+        
+        buffer.flush()
+        self.assertEqual(Interaction.objects.filter(user=self.user).count(), 4)
+
+
+class InteractionStorageTests(TestCase):
+    """Test interaction rollups, retention and the analytics query"""
+    
+    QUERY = 'query Stats($id: ID!) { interactionStats(targetType: "post", targetId: $id, days: 7) { day interactionType count uniqueUsers } }'
+    
+    def setUp(self):
+        self.author = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', email='fan@example.com', password='testpass123')
+        self.post = Post.objects.create(user=self.author, content='Tracked')
+        self.today = timezone.localdate()
+    
+    def event(self, user, days_ago=0, interaction_type='view'):
+        return Interaction.objects.create(
+            user=user, target_type='post', target_id=self.post.id, interaction_type=interaction_type,
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+    
+    def test_rollup_counts_events_and_users_per_day(self):
+        """Test a day rolls up into counts and unique users, and re-rolls in place"""
+        self.event(self.fan)
+        self.event(self.fan)
+        self.event(self.author)
+        interactions.rollup_day(self.today)
+        
+        self.event(self.fan)
+        interactions.rollup_day(self.today)
+        
+        rollup = InteractionDailyRollup.objects.get()
+        self.assertEqual((rollup.count, rollup.unique_users, rollup.day), (4, 2, self.today))
+    
+    def test_maintain_rolls_up_before_expiring(self):
+        """Test expired raw events are removed only after their day is rolled up"""
+        self.event(self.fan, days_ago=100)
+        self.event(self.fan, days_ago=1, interaction_type='like')
+        
+        interactions.maintain()
+        
+        self.assertEqual(Interaction.objects.count(), 1)
+        days = dict(InteractionDailyRollup.objects.values_list('day', 'count'))
+        self.assertEqual(days, {self.today - timedelta(days=100): 1, self.today - timedelta(days=1): 1})
+    
+    def test_partition_months(self):
+        """Test partitions are named by month and roll over the year"""
+        self.assertEqual(interactions.next_month(date(2026, 12, 9)), date(2027, 1, 1))
+        self.assertTrue(interactions.partition_name(date(2027, 1, 1)).endswith('_p2027_01'))
+    
+    def test_stats_query_reads_rollups_for_owner_only(self):
+        """Test authors see their post's daily rollups and other users are refused"""
+        self.event(self.fan, interaction_type='like')
+        interactions.rollup_pending()
+        
+        self.client.force_login(self.author)
+        result = self.client.post(
+            '/graphql', data={'query': self.QUERY, 'variables': {'id': str(self.post.id)}}, content_type='application/json'
+        ).json()
+        self.assertEqual(result['data']['interactionStats'], [
+            {'day': self.today.isoformat(), 'interactionType': 'like', 'count': 1, 'uniqueUsers': 1}
+        ])
+        
+        self.client.force_login(self.fan)
+        refused = self.client.post(
+            '/graphql', data={'query': self.QUERY, 'variables': {'id': str(self.post.id)}}, content_type='application/json'
+        ).json()
+        self.assertIn('your own content', refused['errors'][0]['message'])
+
+
+class UserSearchTests(TestCase):
+    """Test ranked user search and cached prefix autocomplete"""
+    
+    def setUp(self):
+        get_redis().flushdb()
+        self.alice = self.make_user('alice', 'Alice', 'Liddell')
+        self.malice = self.make_user('malice', 'Mal', 'Ice')
+        self.alicia = self.make_user('alicia', 'Alicia', 'Keys')
+        self.bob = self.make_user('bob', 'Bob', 'Alison')
+    
+    def make_user(self, username, first_name, last_name):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='testpass123',
+            first_name=first_name, last_name=last_name
+        )
+    
+    def test_closest_match_ranks_first(self):
+        """Test exact matches outrank looser substring matches"""
+        results = search.search_users('alice')
+        
+        self.assertEqual(results[0], self.alice)
+        self.assertEqual(set(results), {self.alice, self.malice})
+    
+    def test_followers_break_ties(self):
+        """Test more-followed users rank first among equally close matches"""
+        carol1, carol2 = self.make_user('carol1', 'Carol', 'One'), self.make_user('carol2', 'Carol', 'Two')
+        Follow.objects.create(follower=self.alice, followee=carol2)
+        
+        self.assertEqual(search.search_users('carol'), [carol2, carol1])
+        self.assertIn(self.bob, search.search_users('ali'))  # last name
+    
+    def test_typos_fall_back_to_similar_names(self):
+        """Test a query nothing contains returns trigram-similar users"""
+        results = search.search_users('alicee')
+        
+        self.assertEqual(results[0], self.alice)
+        self.assertNotIn(self.bob, results)
+    
+    def test_autocomplete_caches_short_prefixes(self):
+        """Test prefix results are ranked by followers and short prefixes are cached"""
+        Follow.objects.create(follower=self.bob, followee=self.alicia)
+        
+        self.assertEqual(search.autocomplete_users('al'), [self.alicia, self.alice])
+        
+        alfred = self.make_user('alfred', 'Alfred', 'Pennyworth')
+        self.assertNotIn(alfred, search.autocomplete_users('al'))
+        self.assertEqual(search.autocomplete_users('alfre'), [alfred])
+
+
+class PostSearchTests(TestCase):
+    """Test full-text post search, ranking and pagination"""
+    
+    QUERY = """
+        query Search($query: String!, $after: String) {
+            searchPosts(query: $query, first: 2, after: $after) {
+                edges { node { title } cursor }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='testpass123')
+        self.client.force_login(self.user)
+    
+    def make_post(self, title, content, days_ago=0, **kwargs):
+        post = Post.objects.create(user=self.user, title=title, content=content, **kwargs)
+        Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return post
+    
+    def search(self, query, after=None):
+        return self.client.post(
+            '/graphql', data={'query': self.QUERY, 'variables': {'query': query, 'after': after}},
+            content_type='application/json'
+        ).json()['data']['searchPosts']
+    
+    def test_title_matches_outrank_content_matches(self):
+        """Test posts matching in the title rank above those matching in the body"""
+        self.make_post('Gardening notes', 'Tomatoes need sun')
+        self.make_post('Tomatoes', 'Growing them indoors')
+        self.make_post('Cooking', 'No match here')
+        
+        titles = [edge['node']['title'] for edge in self.search('tomatoes')['edges']]
+        
+        self.assertEqual(titles, ['Tomatoes', 'Gardening notes'])
+    
+    def test_recency_boost_and_deleted_posts(self):
+        """Test newer posts win among equal matches and soft-deleted posts are excluded"""
+        self.make_post('Old kayak trip', 'River', days_ago=30)
+        self.make_post('New kayak trip', 'River', days_ago=1)
+        self.make_post('Deleted kayak trip', 'River', is_deleted=True)
+        
+        titles = [edge['node']['title'] for edge in self.search('kayak')['edges']]
+        
+        self.assertEqual(titles, ['New kayak trip', 'Old kayak trip'])
+    
+    def test_candidates_are_the_newest_matches(self):
+        """Test the candidate cap keeps the newest matching posts"""
+        self.make_post('Oldest canoe', 'Lake', days_ago=9)
+        self.make_post('Newest canoe', 'Lake', days_ago=1)
+        self.make_post('Middle canoe', 'Lake', days_ago=5)
+        
+        with self.settings(POST_SEARCH={'HALF_LIFE_DAYS': 7, 'MAX_CANDIDATES': 2}):
+            titles = [edge['node']['title'] for edge in self.search('canoe')['edges']]
+        
+        self.assertEqual(titles, ['Newest canoe', 'Middle canoe'])
+    
+    def test_keyset_pagination(self):
+        """Test pages follow one another without gaps or repeats"""
+        for n in range(5):
+            self.make_post(f'Chess puzzle {n}', 'Mate in two', days_ago=n)
+        
+        first = self.search('chess')
+        second = self.search('chess', after=first['pageInfo']['endCursor'])
+        third = self.search('chess', after=second['pageInfo']['endCursor'])
+        
+        titles = [edge['node']['title'] for page in (first, second, third) for edge in page['edges']]
+        self.assertEqual(titles, [f'Chess puzzle {n}' for n in range(5)])
+        self.assertTrue(second['pageInfo']['hasNextPage'])
+        self.assertFalse(third['pageInfo']['hasNextPage'])
+
+
+class CommentTreeTests(GraphQLTestCase):
+    """Test loading a post's comment thread as a nested tree"""
+    
+    QUERY = """
+        query Tree($postId: ID!, $first: Int, $after: String, $maxDepth: Int, $repliesPerNode: Int) {
+            commentTree(postId: $postId, first: $first, after: $after, maxDepth: $maxDepth, repliesPerNode: $repliesPerNode) {
+                nodes {
+                    comment { content user { username } }
+                    depth replyCount hasMoreReplies repliesCursor
+                    replies {
+                        comment { content }
+                        depth replyCount hasMoreReplies repliesCursor
+                        replies { comment { content } depth replyCount hasMoreReplies repliesCursor }
+                    }
+                }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+    
+    def reply(self, parent, content):
+        return Comment.objects.create(post=self.post1, user=self.user1, content=content, parent_comment=parent)
+    
+    def tree(self, **variables):
+        result = self.execute_query(self.QUERY, variables={'postId': str(self.post1.id), **variables})
+        self.assertIsNone(result.errors)
+        return result.data['commentTree']
+    
+    def test_nested_tree_with_truncation(self):
+        """Test replies nest by depth and are cut at repliesPerNode and maxDepth"""
+        replies = [self.reply(self.comment1, f"Reply {n}") for n in range(3)]
+        nested = self.reply(replies[0], "Nested")
+        self.reply(nested, "Too deep")
+        Comment.objects.create(post=self.post1, user=self.user1, content="Deleted", parent_comment=replies[1], is_deleted=True)
+        
+        [root] = self.tree(maxDepth=2, repliesPerNode=2)['nodes']
+        
+        self.assertEqual(root['comment']['user']['username'], 'testuser2')
+        self.assertEqual(root['replyCount'], 3)
+        self.assertTrue(root['hasMoreReplies'])
+        self.assertEqual([node['comment']['content'] for node in root['replies']], ['Reply 0', 'Reply 1'])
+        
+        first, second = root['replies']
+        self.assertEqual(first['depth'], 1)
+        self.assertEqual(second['replyCount'], 0)
+        self.assertEqual(second['replies'], [])
+        
+        [leaf] = first['replies']
+        self.assertEqual((leaf['comment']['content'], leaf['depth']), ('Nested', 2))
+        # Past maxDepth: counted, flagged, but not loaded
+        self.assertEqual(leaf['replyCount'], 1)
+        self.assertTrue(leaf['hasMoreReplies'])
+        self.assertIsNone(leaf['repliesCursor'])
+    
+    def test_replies_cursor_continues_the_thread(self):
+        """Test repliesCursor picks up where the tree stopped in commentRepliesConnection"""
+        for n in range(4):
+            self.reply(self.comment1, f"Reply {n}")
+        
+        [root] = self.tree(repliesPerNode=2)['nodes']
+        result = self.execute_query("""
+            query Rest($commentId: ID!, $after: String) {
+                commentRepliesConnection(commentId: $commentId, after: $after) { edges { node { content } } }
+            }
+        """, variables={'commentId': str(self.comment1.id), 'after': root['repliesCursor']})
+        
+        self.assertIsNone(result.errors)
+        rest = [edge['node']['content'] for edge in result.data['commentRepliesConnection']['edges']]
+        self.assertEqual(rest, ['Reply 2', 'Reply 3'])
+    
+    def test_top_level_pagination(self):
+        """Test top-level comments page by endCursor without gaps or repeats"""
+        for n in range(4):
+            Comment.objects.create(post=self.post1, user=self.user1, content=f"Top {n}")
+        
+        first = self.tree(first=3)
+        second = self.tree(first=3, after=first['pageInfo']['endCursor'])
+        
+        contents = [node['comment']['content'] for page in (first, second) for node in page['nodes']]
+        self.assertEqual(contents, ['This is a test comment'] + [f"Top {n}" for n in range(4)])
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+    
+    def test_query_count_does_not_grow_with_the_thread(self):
+        """Test a bigger thread costs no more queries at the same depth"""
+        counts = []
+        for _ in range(2):
+            top = Comment.objects.create(post=self.post1, user=self.user2, content="Top")
+            self.reply(self.reply(top, "Reply"), "Nested")
+            with CaptureQueriesContext(connection) as ctx:
+                self.tree()
+            counts.append(len(ctx.captured_queries))
+        
+        self.assertEqual(counts[0], counts[1])
+
+    def test_cost_uses_the_tree_bounds(self):
+        """Test /graphql prices the tree by first, repliesPerNode and maxDepth"""
+        self.client.force_login(self.user1)
+        costs = []
+        for variables in ({}, {'maxDepth': 1}):
+            response = self.client.post(
+                '/graphql',
+                data={'query': self.QUERY, 'variables': {'postId': str(self.post1.id), **variables}},
+                content_type='application/json'
+            )
+            body = response.json()
+            self.assertNotIn('errors', body)
+            self.assertEqual(body['data']['commentTree']['nodes'][0]['comment']['content'], 'This is a test comment')
+            costs.append(body['extensions']['cost']['requested'])
+
+        # 20 nodes with 3 replies each with 3 more, then with the second level cut by maxDepth
+        self.assertEqual(costs, [1 + 20 * (1 + 2 + 3 * (1 + 1 + 3 * (1 + 1))) + 1, 1 + 20 * (1 + 2 + 3 * (1 + 1)) + 1])
+
+    def test_requires_authentication(self):
+        """Test anonymous users cannot load the tree"""
+        request = RequestFactory().post('/graphql')
+        request.user = Mock(is_authenticated=False)
+        result = schema.execute(self.QUERY, context_value=request, variable_values={'postId': str(self.post1.id)})
+        
+        self.assertIsNotNone(result.errors)
+
+
+class ReplyPreviewTests(GraphQLTestCase):
+    """Test replyCount and replyPreview on comments"""
+    
+    QUERY = """
+        query Comments($postId: ID!) {
+            postComments(postId: $postId) {
+                content
+                replyCount
+                replyPreview(first: 2) { content likesCount user { username } }
+            }
+        }
+    """
+    
+    def add_replies(self, parent, count):
+        for n in range(count):
+            reply = Comment.objects.create(post=self.post1, user=self.user1, content=f"Reply {n}", parent_comment=parent)
+            CommentLike.objects.create(comment=reply, user=self.user2)
+    
+    def comments(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.execute_query(self.QUERY, variables={'postId': str(self.post1.id)})
+        self.assertIsNone(result.errors)
+        return result.data['postComments'], len(ctx.captured_queries)
+    
+    def test_count_and_preview(self):
+        """Test the preview holds the oldest live replies and the count covers all of them"""
+        self.add_replies(self.comment1, 3)
+        Comment.objects.create(post=self.post1, user=self.user1, content="Gone", parent_comment=self.comment1, is_deleted=True)
+        
+        [comment], _ = self.comments()
+        
+        self.assertEqual(comment['replyCount'], 3)
+        self.assertEqual([reply['content'] for reply in comment['replyPreview']], ['Reply 0', 'Reply 1'])
+        self.assertTrue(all(reply['likesCount'] == 1 for reply in comment['replyPreview']))
+        self.assertEqual(comment['replyPreview'][0]['user']['username'], 'testuser1')
+    
+    def test_query_count_does_not_grow_with_replies(self):
+        """Test a thread with many replies costs the same queries as a small one"""
+        self.add_replies(self.comment1, 1)
+        _, small = self.comments()
+        
+        self.add_replies(self.comment1, 10)
+        other = Comment.objects.create(post=self.post1, user=self.user2, content="Another")
+        self.add_replies(other, 10)
+        comments, large = self.comments()
+        
+        self.assertEqual(small, large)
+        self.assertEqual([comment['replyCount'] for comment in comments], [11, 10])
+
+
+class LikeBroadcastTests(GraphQLTestCase):
+    """Test likesCount broadcasts are coalesced per post"""
+    
+    def like(self, user):
+        with self.committed():
+            PostLike.objects.create(post=self.post1, user=user)
+    
+    def test_likes_in_a_window_schedule_one_emit(self):
+        """Test a burst of likes and unlikes schedules a single broadcast"""
+        fans = [User.objects.create_user(username=f'fan{n}', email=f'fan{n}@example.com', password='x') for n in range(3)]
+        with patch.object(broadcasts.broadcast_like_count, 'apply_async') as apply_async:
+            for fan in fans:
+                self.like(fan)
+            with self.committed():
+                PostLike.objects.get(post=self.post1, user=fans[0]).delete()
+        
+        apply_async.assert_called_once_with(args=[str(self.post1.id)], countdown=1.0)
+    
+    def test_emit_sends_the_current_count(self):
+        """Test the emit carries the count at send time and reopens the window"""
+        with patch.object(broadcasts.broadcast_like_count, 'apply_async'):
+            self.like(self.user1)
+            self.like(self.user2)
+        
+        with patch('social_media_feed_app.schema.subscriptions.PostLikedSubscription.broadcast') as broadcast:
+            self.assertEqual(broadcasts.emit(self.post1.id), 2)
+        
+        broadcast.assert_called_once()
+        self.assertEqual(broadcast.call_args.kwargs['group'], f'post_liked_{self.post1.id}')
+        self.assertEqual(broadcast.call_args.kwargs['payload']['likes_count'], 2)
+        self.assertIsNone(get_redis().get(broadcasts.pending_key(self.post1.id)))
+    
+    def test_min_interval_delays_the_next_emit(self):
+        """Test a post broadcast moments ago waits out MIN_INTERVAL"""
+        with patch('social_media_feed_app.schema.subscriptions.PostLikedSubscription.broadcast'):
+            broadcasts.emit(self.post1.id)
+        
+        with override_settings(LIKE_BROADCASTS={'WINDOW': 0.5, 'MIN_INTERVAL': 30}), \
+                patch.object(broadcasts.broadcast_like_count, 'apply_async') as apply_async:
+            self.like(self.user2)
+        
+        self.assertGreater(apply_async.call_args.kwargs['countdown'], 29)
+
+
+class BroadcastSnapshotTests(GraphQLTestCase):
+    """Test subscription payloads are snapshots rendered without queries"""
+    
+    def round_trip(self, payload):
+        return Serializer.deserialize(Serializer.serialize(payload))
+    
+    def test_post_renders_from_snapshot(self):
+        """Test a post and its author survive the channel layer and render with no queries"""
+        Post.objects.filter(pk=self.post1.pk).update(like_count=7)
+        post = Post.objects.select_related('user').get(pk=self.post1.pk)
+        payload = self.round_trip(post_snapshot(post))
+        
+        with self.assertNumQueries(0):
+            rendered = render_post(payload)
+            username = rendered.user.username
+        
+        self.assertEqual(rendered.id, post.id)
+        self.assertEqual((rendered.title, rendered.like_count, rendered.created_at), ('Test Post 1', 7, post.created_at))
+        self.assertEqual(username, 'testuser1')
+        self.assertEqual(rendered.user.email, '')
+    
+    def test_like_broadcast_carries_a_snapshot(self):
+        """Test like updates send the snapshot and the coalesced count"""
+        PostLike.objects.create(post=self.post1, user=self.user2)
+        
+        with patch('social_media_feed_app.schema.subscriptions.PostLikedSubscription.broadcast') as broadcast:
+            broadcasts.emit(self.post1.id)
+        
+        payload = self.round_trip(broadcast.call_args.kwargs['payload'])
+        self.assertEqual(payload['likes_count'], 1)
+        self.assertEqual(payload['post'][0], str(self.post1.id))
+
+    def test_create_post_mutation_broadcasts_a_snapshot(self):
+        """Test createPost broadcasts the new post's snapshot to both groups once it commits"""
+        mutation = '''
+            mutation CreatePost($userId: ID!, $content: String!) {
+                createPost(userId: $userId, content: $content) { success post { id } }
+            }
+        '''
+        with patch('social_media_feed_app.schema.subscriptions.PostCreatedSubscription.broadcast') as broadcast:
+            with self.captureOnCommitCallbacks() as callbacks:
+                result = self.execute_query(mutation, variables={'userId': str(self.user1.id), 'content': 'Fresh post'})
+            self.assertFalse(broadcast.called)
+            for callback in callbacks:
+                callback()
+        # Write the interaction the new post queued while its author still exists
+        interactions.flush()
+
+        self.assertIsNone(result.errors)
+        post = Post.objects.get(id=result.data['createPost']['post']['id'])
+        self.assertEqual(
+            [call.kwargs['group'] for call in broadcast.call_args_list],
+            ['post_created', f'post_created_by_{self.user1.id}'],
+        )
+        for call in broadcast.call_args_list:
+            self.assertEqual(call.kwargs['payload'], post_snapshot(post))
+
+
+    def test_publish_does_not_reuse_earlier_loaders(self):
+        """Test each publish on a long-lived subscription context loads fresh viewer state"""
+        info = self.create_mock_info(self.user2)
+        FeedUpdatedSubscription._meta.publish(post_snapshot(self.post1), info)
+        self.assertFalse(get_loaders(info).post_liked_by_user.load(self.post1.id))
+
+        PostLike.objects.create(post=self.post1, user=self.user2)
+        PostLikedSubscription._meta.publish({'post': post_snapshot(self.post1), 'likes_count': 1}, info, str(self.post1.id))
+        self.assertTrue(get_loaders(info).post_liked_by_user.load(self.post1.id))
+
+    def test_post_liked_costs_one_query_per_subscriber_reading_like_state(self):
+        """Test a likesCount publish only queries for subscribers that resolve isLikedByUser"""
+        payload = {'post': post_snapshot(self.post1), 'likes_count': 1}
+        for user, queries in ((self.user2, 1), (Mock(is_authenticated=False), 0)):
+            info = self.create_mock_info(user)
+            with self.assertNumQueries(0):
+                result = PostLikedSubscription._meta.publish(payload, info, str(self.post1.id))
+            with self.assertNumQueries(queries):
+                PostType.resolve_is_liked_by_user(result.post, info)
+                PostType.resolve_is_liked_by_user(result.post, info)
+
+
+class FeedUpdatedTests(GraphQLTestCase):
+    """Test new posts are pushed only to connected followers of their author"""
+    
+    BROADCAST = 'social_media_feed_app.schema.subscriptions.FeedUpdatedSubscription.broadcast'
+    
+    def setUp(self):
+        super().setUp()
+        self.user3 = User.objects.create_user(username='testuser3', email='test3@example.com', password='x')
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        Follow.objects.create(follower=self.user3, followee=self.user1)
+    
+    def groups_for_new_post(self):
+        with patch(self.BROADCAST) as broadcast, self.committed():
+            Post.objects.create(user=self.user1, content="Fresh")
+        return sorted(call.kwargs['group'] for call in broadcast.call_args_list)
+    
+    def test_uncommitted_post_is_not_broadcast(self):
+        """Test nothing is pushed for a post whose transaction never commits"""
+        broadcasts.feed_connected(self.user2.id)
+        with patch(self.BROADCAST) as broadcast, self.captureOnCommitCallbacks():
+            Post.objects.create(user=self.user1, content="Rolled back")
+        broadcast.assert_not_called()
+    
+    def test_only_connected_followers_receive_the_post(self):
+        """Test offline followers and online non-followers get nothing"""
+        outsider = User.objects.create_user(username='outsider', email='out@example.com', password='x')
+        broadcasts.feed_connected(self.user2.id)
+        broadcasts.feed_connected(outsider.id)
+        
+        self.assertEqual(self.groups_for_new_post(), [broadcasts.feed_group(self.user2.id)])
+    
+    def test_few_online_users_are_matched_against_followers(self):
+        """Test the online side is walked when it is smaller than the follower list"""
+        fan = User.objects.create_user(username='fan', email='fan@example.com', password='x')
+        Follow.objects.create(follower=fan, followee=self.user1)
+        broadcasts.feed_connected(self.user3.id)
+        broadcasts.feed_connected(self.user1.id)
+        
+        self.assertEqual(
+            self.groups_for_new_post(),
+            sorted([broadcasts.feed_group(self.user1.id), broadcasts.feed_group(self.user3.id)])
+        )
+    
+    def test_nobody_online_costs_nothing(self):
+        """Test a post with no connected audience is not even loaded"""
+        with self.assertNumQueries(0), patch(self.BROADCAST) as broadcast:
+            self.assertEqual(broadcasts.publish_feed_update(self.post1.id, self.user1.id), 0)
+        broadcast.assert_not_called()
+    
+    def test_connections_are_counted(self):
+        """Test a user stays online until their last feed subscription closes"""
+        broadcasts.feed_connected(self.user2.id)
+        broadcasts.feed_connected(self.user2.id)
+        broadcasts.feed_disconnected(self.user2.id)
+        self.assertEqual(self.groups_for_new_post(), [broadcasts.feed_group(self.user2.id)])
+        
+        broadcasts.feed_disconnected(self.user2.id)
+        self.assertEqual(self.groups_for_new_post(), [])
+    
+    def test_subscribe_joins_the_viewers_group(self):
+        """Test subscribing registers the viewer and anonymous users are refused"""
+        subscribe = async_to_sync(FeedUpdatedSubscription._meta.subscribe)
+        
+        self.assertEqual(subscribe(None, self.create_mock_info(self.user2)), [broadcasts.feed_group(self.user2.id)])
+        self.assertEqual(get_redis().zscore(broadcasts.FEED_ONLINE_KEY, str(self.user2.id)), 1)
+        with self.assertRaises(GraphQLError):
+            subscribe(None, self.create_mock_info(Mock(is_authenticated=False)))
+
+    def test_dropped_socket_leaves_the_online_set(self):
+        """Test closing the socket without a stop message still counts the viewer offline"""
+
+        async def subscribe_then_drop():
+            communicator = WebsocketCommunicator(
+                GraphqlWsConsumer.as_asgi(), '/graphql-ws/', subprotocols=['graphql-transport-ws']
+            )
+            communicator.scope['user'] = self.user2
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'connection_init', 'payload': {}})
+            await communicator.receive_json_from()
+            await communicator.send_json_to({
+                'type': 'subscribe', 'id': '1', 'payload': {'query': 'subscription { feedUpdated { post { id } } }'}
+            })
+            for _ in range(100):
+                if get_redis().zscore(broadcasts.FEED_ONLINE_KEY, str(self.user2.id)):
+                    break
+                await asyncio.sleep(0.01)
+            online = get_redis().zscore(broadcasts.FEED_ONLINE_KEY, str(self.user2.id))
+            await communicator.disconnect()
+            return online
+
+        self.assertEqual(async_to_sync(subscribe_then_drop)(), 1)
+        self.assertIsNone(get_redis().zscore(broadcasts.FEED_ONLINE_KEY, str(self.user2.id)))
+
+
+class MessagingTests(GraphQLTestCase):
+    """Test the conversation inbox, message paging and unread counters"""
+    
+    CONVERSATIONS = """
+        query Conversations($first: Int, $after: String) {
+            conversations(first: $first, after: $after) {
+                edges { node { peer { username } lastMessage { content } unreadCount } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.user3 = User.objects.create_user(username='testuser3', email='test3@example.com', password='x')
+    
+    def send(self, sender, receiver, content):
+        return Message.objects.create(sender=sender, receiver=receiver, content=content)
+    
+    def conversations(self, **variables):
+        result = self.execute_query(self.CONVERSATIONS, variables=variables)
+        self.assertIsNone(result.errors)
+        return result.data['conversations']
+    
+    def test_latest_message_per_peer(self):
+        """Test each peer appears once, with its newest message, newest conversation first"""
+        self.send(self.user2, self.user1, "Hi from 2")
+        self.send(self.user1, self.user2, "Reply to 2")
+        self.send(self.user3, self.user1, "Hi from 3")
+        self.send(self.user3, self.user1, "Again from 3")
+        self.send(self.user2, self.user3, "Not ours")
+        
+        nodes = [edge['node'] for edge in self.conversations()['edges']]
+        
+        self.assertEqual(nodes, [
+            {'peer': {'username': 'testuser3'}, 'lastMessage': {'content': 'Again from 3'}, 'unreadCount': 2},
+            {'peer': {'username': 'testuser2'}, 'lastMessage': {'content': 'Reply to 2'}, 'unreadCount': 1},
+        ])
+    
+    def test_conversation_pages_do_not_repeat_peers(self):
+        """Test a cursor never surfaces an older message of a conversation already listed"""
+        self.send(self.user2, self.user1, "Old from 2")
+        self.send(self.user3, self.user1, "From 3")
+        self.send(self.user2, self.user1, "New from 2")
+        
+        first = self.conversations(first=1)
+        second = self.conversations(first=1, after=first['pageInfo']['endCursor'])
+        
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        self.assertEqual(first['edges'][0]['node']['peer']['username'], 'testuser2')
+        self.assertEqual([edge['node']['peer']['username'] for edge in second['edges']], ['testuser3'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+    
+    def test_messages_page_newest_first(self):
+        """Test messages(peerId) pages through both directions of one conversation"""
+        for n in range(3):
+            self.send(self.user2, self.user1, f"In {n}")
+            self.send(self.user1, self.user2, f"Out {n}")
+        self.send(self.user3, self.user1, "Elsewhere")
+        query = """
+            query Messages($peerId: ID!, $after: String) {
+                messages(peerId: $peerId, first: 4, after: $after) {
+                    edges { node { content } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        contents, after = [], None
+        while True:
+            result = self.execute_query(query, variables={'peerId': str(self.user2.id), 'after': after})
+            self.assertIsNone(result.errors)
+            page = result.data['messages']
+            contents += [edge['node']['content'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        
+        self.assertEqual(contents, ['Out 2', 'In 2', 'Out 1', 'In 1', 'Out 0', 'In 0'])
+    
+    def test_unread_badge_follows_send_and_read(self):
+        """Test the badge rises on send and drops when a conversation is marked read"""
+        result = self.execute_query("""
+            mutation { sendMessage(receiverId: "%s", content: " Hello ") { success sentMessage { content } } }
+        """ % self.user1.id, user=self.user2)
+        self.assertEqual(result.data['sendMessage'], {'success': True, 'sentMessage': {'content': 'Hello'}})
+        self.send(self.user2, self.user1, "Two")
+        self.send(self.user3, self.user1, "Three")
+        
+        self.assertEqual(self.execute_query("{ unreadMessageCount }").data['unreadMessageCount'], 3)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.execute_query("""
+                mutation Read($peerId: ID!) { markConversationRead(peerId: $peerId) { success markedCount unreadCount } }
+            """, variables={'peerId': str(self.user2.id)})
+        
+        self.assertEqual(result.data['markConversationRead'], {'success': True, 'markedCount': 2, 'unreadCount': 1})
+        message_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "social_media_feed_app_message"')]
+        self.assertEqual(len(message_updates), 1)
+        self.assertFalse(Message.objects.filter(sender=self.user2, receiver=self.user1, is_read=False).exists())
+    
+    def test_malformed_or_unknown_peer_is_rejected(self):
+        """Test message mutations report an unknown user for bad peer IDs, and messages() a clean error"""
+        for peer_id in ("not-a-uuid", str(uuid.uuid4())):
+            result = self.execute_query(
+                'mutation Send($id: ID!) { sendMessage(receiverId: $id, content: "Hi") { success message } }',
+                variables={'id': peer_id}
+            )
+            self.assertIsNone(result.errors)
+            self.assertEqual(result.data['sendMessage'], {'success': False, 'message': "User not found"})
+            
+            result = self.execute_query(
+                'mutation Read($id: ID!) { markConversationRead(peerId: $id) { success message } }',
+                variables={'id': peer_id}
+            )
+            self.assertIsNone(result.errors)
+            self.assertEqual(result.data['markConversationRead'], {'success': False, 'message': "User not found"})
+        
+        result = self.execute_query('query { messages(peerId: "not-a-uuid") { edges { node { content } } } }')
+        self.assertEqual([error.message for error in result.errors], ["Invalid peer ID."])
+        self.assertFalse(Message.objects.exists())
+    
+    def test_recompute_repairs_the_unread_counter(self):
+        """Test recompute_user_stats rebuilds unread_messages from the rows"""
+        self.send(self.user2, self.user1, "One")
+        UserStats.objects.filter(pk=self.user1.pk).update(unread_messages=40)
+        
+        recompute_user_stats()
+        
+        self.assertEqual(messaging.unread_count(self.user1.id), 1)
+
+
+class PeopleYouMayKnowTests(GraphQLTestCase):
+    """Test graph snapshots, two-hop suggestions and their incremental updates"""
+    
+    SUGGESTED = "query { suggestedUsers { username } }"
+    
+    def setUp(self):
+        super().setUp()
+        self.user3, self.user4, self.user5, self.user6 = [
+            User.objects.create_user(username=f'testuser{n}', email=f'test{n}@example.com', password='x')
+            for n in range(3, 7)
+        ]
+    
+    def follow(self, follower, *followees):
+        for followee in followees:
+            Follow.objects.create(follower=follower, followee=followee)
+    
+    def suggested(self, user):
+        result = self.execute_query(self.SUGGESTED, user=user)
+        self.assertIsNone(result.errors)
+        return [row['username'] for row in result.data['suggestedUsers']]
+    
+    def test_snapshot_is_csr(self):
+        """Test the snapshot lists each user's neighbours, with accepted friendships both ways"""
+        self.follow(self.user1, self.user3, self.user2)
+        Friendship.objects.create(requester=self.user4, receiver=self.user1, status='accepted')
+        Friendship.objects.create(requester=self.user5, receiver=self.user1, status='pending')
+        
+        graph = pymk.FollowGraph.load()
+        index = {pk: i for i, pk in enumerate(graph.user_ids)}
+        
+        def neighbours(user):
+            i = index[user.id]
+            return {graph.user_ids[j] for j in graph.indices[graph.indptr[i]:graph.indptr[i + 1]]}
+        
+        self.assertEqual(graph.indptr[-1], 4)
+        self.assertEqual(neighbours(self.user1), {self.user2.id, self.user3.id, self.user4.id})
+        self.assertEqual(neighbours(self.user4), {self.user1.id})
+        self.assertEqual(neighbours(self.user5), set())
+    
+    def test_rebuild_ranks_friends_of_friends_by_mutuals(self):
+        """Test suggestions exclude follows and blocked users and rank by mutual connections"""
+        self.follow(self.user1, self.user2, self.user3)
+        self.follow(self.user2, self.user4, self.user5, self.user6)
+        self.follow(self.user3, self.user4, self.user2)
+        Friendship.objects.create(requester=self.user6, receiver=self.user1, status='blocked')
+        
+        self.assertEqual(rebuild_suggestions.delay().get(), 2)
+        
+        self.assertEqual(self.suggested(self.user1), ['testuser4', 'testuser5'])
+        self.assertCountEqual(self.suggested(self.user3), ['testuser5', 'testuser6'])
+    
+    def test_batches_cover_every_user(self):
+        """Test small path budgets split the walk without changing the result"""
+        self.follow(self.user1, self.user2, self.user3)
+        self.follow(self.user2, self.user4, self.user5)
+        self.follow(self.user3, self.user4, self.user6)
+        self.follow(self.user4, self.user2)
+        graph = pymk.FollowGraph.load()
+        
+        whole = graph.suggest(np.arange(graph.size), 10)
+        batches = list(graph.batches(1))
+        split = [np.concatenate(parts) for parts in zip(*(graph.suggest(users, 10) for users in batches))]
+        
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(np.concatenate(batches).tolist(), list(range(graph.size)))
+        for expected, actual in zip(whole, split):
+            self.assertEqual(expected.tolist(), actual.tolist())
+    
+    def test_follow_and_unfollow_apply_between_rebuilds(self):
+        """Test following drops the followee and adds their follows; unfollowing takes them back"""
+        self.follow(self.user2, self.user4)
+        self.follow(self.user3, self.user4, self.user5)
+        self.follow(self.user1, self.user2)
+        rebuild_suggestions.delay()
+        self.assertEqual(self.suggested(self.user1), ['testuser4'])
+        
+        with self.committed():
+            FollowUser().mutate(self.create_mock_info(self.user1), user_id=str(self.user3.id))
+        self.assertEqual(self.suggested(self.user1), ['testuser4', 'testuser5'])
+        
+        with self.committed():
+            FollowUser().mutate(self.create_mock_info(self.user1), user_id=str(self.user4.id))
+        self.assertEqual(self.suggested(self.user1), ['testuser5'])
+        
+        with self.committed():
+            UnfollowUser().mutate(self.create_mock_info(self.user1), user_id=str(self.user3.id))
+        self.assertEqual(self.suggested(self.user1), [])
+    
+    def test_suggested_users_requires_login(self):
+        """Test anonymous users are refused suggestions"""
+        mock_user = Mock()
+        mock_user.is_authenticated = False
+        
+        with self.assertRaises(GraphQLError):
+            Query().resolve_suggested_users(self.create_mock_info(mock_user))
+
+
+class FeedRankingTests(GraphQLTestCase):
+    """Test userFeed(ranking: RELEVANCE) and the vectorized scorer behind it"""
+    
+    FEED = """
+        query Feed($ranking: FeedRanking) {
+            userFeed(limit: 10, ranking: $ranking) { id }
+        }
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.user3 = User.objects.create_user(username='testuser3', email='test3@example.com', password='x')
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        Follow.objects.create(follower=self.user1, followee=self.user3)
+        self.old = Post.objects.create(user=self.user2, content="Two days old")
+        Post.objects.filter(id=self.old.id).update(created_at=timezone.now() - timedelta(days=2))
+        self.fresh = Post.objects.create(user=self.user3, content="Just posted")
+    
+    def feed(self, ranking=None):
+        result = self.execute_query(self.FEED, variables={'ranking': ranking} if ranking else None)
+        self.assertIsNone(result.errors)
+        post_ids = [post['id'] for post in result.data['userFeed']]
+        return post_ids.index(str(self.old.id)), post_ids.index(str(self.fresh.id))
+    
+    def weights(self, **weights):
+        return self.settings(FEED_RANKING={**ranking.feed_ranking_settings(), 'WEIGHTS': weights})
+    
+    def test_chronological_by_default(self):
+        """Test userFeed without a ranking stays newest first"""
+        old, fresh = self.feed()
+        
+        self.assertGreater(old, fresh)
+        self.assertEqual(self.feed('CHRONOLOGICAL'), (old, fresh))
+    
+    def test_affinity_outranks_recency(self):
+        """Test posts by authors the user likes and comments on rise above newer ones"""
+        now = timezone.now()
+        affinity.record([(self.user1.id, self.user2.id, 'like', now)] * 3 + [(self.user1.id, self.user2.id, 'comment', now)])
+        
+        with self.weights(RECENCY=1.0, AFFINITY=1.0, ENGAGEMENT=0.0):
+            old, fresh = self.feed('RELEVANCE')
+        self.assertLess(old, fresh)
+    
+    def test_engagement_outranks_recency(self):
+        """Test heavily engaged posts rise above newer ones, as far as the weights allow"""
+        Post.objects.filter(id=self.old.id).update(like_count=500, comment_count=50, share_count=20)
+        
+        with self.weights(RECENCY=1.0, AFFINITY=0.0, ENGAGEMENT=0.2):
+            old, fresh = self.feed('RELEVANCE')
+        self.assertLess(old, fresh)
+        with self.weights(RECENCY=1.0, AFFINITY=0.0, ENGAGEMENT=0.0):
+            old, fresh = self.feed('RELEVANCE')
+        self.assertGreater(old, fresh)
+    
+    def test_score_formula(self):
+        """Test recency halves every half-life and counts enter through log1p"""
+        config = {
+            'HALF_LIFE_HOURS': 1, 'WEIGHTS': {'RECENCY': 2.0, 'AFFINITY': 1.0, 'ENGAGEMENT': 1.0},
+            'ENGAGEMENT_WEIGHTS': {'LIKES': 1.0, 'COMMENTS': 2.0, 'SHARES': 3.0},
+        }
+        
+        scores = ranking.score(
+            np.array([0.0, 3600.0, 7200.0]), np.array([0.0, 0.0, 1.0]),
+            np.array([0.0, 1.0, 0.0]), np.array([0.0, 1.0, 0.0]), np.array([0.0, 0.0, 0.0]), config=config
+        )
+        
+        np.testing.assert_allclose(scores, [2.0, 1.0 + np.log(4), 0.5 + np.log(2)])
+    
+    def test_scoring_5k_candidates_takes_milliseconds(self):
+        """Test scoring and sorting a 5k candidate set stays in the low milliseconds"""
+        results = benchmarks.run_feed_scoring(candidate_counts=(5000,), repeats=10)
+        
+        self.assertLess(results['5000']['p50_ms'], 20)
+
+
+class AffinityTests(TestCase):
+    """Test the decayed viewer-to-author affinity table and how interactions feed it"""
+    
+    def setUp(self):
+        interactions.flush()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.authors = [
+            User.objects.create_user(username=f'author{n}', email=f'author{n}@example.com', password='x')
+            for n in range(3)
+        ]
+        self.post = Post.objects.create(user=self.authors[0], content='Affine')
+    
+    def row(self, interaction_type, target_type, target_id, metadata=None, user=None):
+        return Interaction(
+            id=uuid.uuid4(), user=user or self.user, target_type=target_type, target_id=target_id,
+            interaction_type=interaction_type, metadata=metadata, created_at=timezone.now()
+        )
+    
+    def test_scores_add_up_and_decay(self):
+        """Test events add their weight and halve in value every half-life"""
+        now = timezone.now()
+        half_life = timedelta(days=affinity.affinity_settings()['HALF_LIFE_DAYS'])
+        author = self.authors[0].id
+        
+        affinity.record([(self.user.id, author, 'like', now), (self.user.id, author, 'comment', now)])
+        affinity.record([(self.user.id, author, 'follow', now - half_life)])
+        
+        self.assertAlmostEqual(affinity.score(self.user.id, author, now=now), 1.0 + 2.0 + 5.0 / 2)
+        self.assertAlmostEqual(affinity.score(self.user.id, author, now=now + half_life), 5.5 / 2)
+        self.assertEqual(Affinity.objects.get().updated_at, now)
+        self.assertEqual(affinity.score(self.user.id, self.authors[1].id), 0.0)
+    
+    def test_self_engagement_is_ignored(self):
+        """Test users never gain affinity for themselves"""
+        self.assertEqual(affinity.record([(self.user.id, self.user.id, 'view', timezone.now())]), 0)
+        self.assertFalse(Affinity.objects.exists())
+    
+    def test_pruned_to_strongest_authors(self):
+        """Test only MAX_AUTHORS_PER_USER authors are kept per user, strongest first"""
+        now = timezone.now()
+        with self.settings(AFFINITY={**affinity.affinity_settings(), 'MAX_AUTHORS_PER_USER': 2}):
+            affinity.record([(self.user.id, self.authors[0].id, 'view', now)])
+            affinity.record([
+                (self.user.id, self.authors[1].id, 'share', now),
+                (self.user.id, self.authors[2].id, 'like', now),
+            ])
+        
+        self.assertEqual(
+            [author_id for author_id, _ in affinity.top_authors(self.user.id, 10)],
+            [self.authors[1].id, self.authors[2].id]
+        )
+    
+    def test_written_interactions_update_affinity(self):
+        """Test a written batch credits the liked, commented, shared, followed and viewed authors"""
+        buffer = InteractionBuffer(buffer_size=10, batch_size=10, flush_interval=None, enqueue_timeout=0, background=False)
+        for row in [
+            self.row('like', 'post', self.post.id, {'liked_user_id': str(self.authors[0].id)}),
+            self.row('comment', 'comment', uuid.uuid4(), {'post_owner_id': str(self.authors[1].id)}),
+            self.row('share', 'post', self.post.id, {'post_owner_id': str(self.authors[0].id)}),
+            self.row('follow', 'user', self.authors[2].id),
+            self.row('view', 'post', self.post.id),
+            self.row('view', 'user', self.user.id),
+        ]:
+            buffer.put(row)
+        
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+        
+        weights = affinity.affinity_settings()['WEIGHTS']
+        scores = affinity.scores(self.user.id, [author.id for author in self.authors])
+        self.assertAlmostEqual(scores[self.authors[0].id], weights['like'] + weights['share'] + weights['view'], places=3)
+        self.assertAlmostEqual(scores[self.authors[1].id], weights['comment'], places=3)
+        self.assertAlmostEqual(scores[self.authors[2].id], weights['follow'], places=3)
+        self.assertEqual(len([q for q in queries.captured_queries if 'social_media_feed_app_affinity' in q['sql']]), 2)
+    
+    def test_redelivered_rows_count_once(self):
+        """Test a row written again by a retried batch does not add to affinity twice"""
+        buffer = InteractionBuffer(buffer_size=10, batch_size=10, flush_interval=None, enqueue_timeout=0, background=False)
+        row = self.row('like', 'post', self.post.id, {'liked_user_id': str(self.authors[0].id)})
+        
+        buffer.put(row)
+        buffer.flush()
+        buffer.put(row)
+        buffer.put(self.row('like', 'post', self.post.id, {'liked_user_id': str(self.authors[0].id)}))
+        buffer.flush()
+        
+        weights = affinity.affinity_settings()['WEIGHTS']
+        self.assertAlmostEqual(affinity.score(self.user.id, self.authors[0].id), 2 * weights['like'], places=3)
+    
+    def test_rebuild_replays_interactions(self):
+        """Test rebuild_affinity recomputes the table from the retained interactions"""
+        Interaction.objects.bulk_create([
+            self.row('like', 'post', self.post.id, {'liked_user_id': str(self.authors[0].id)}),
+            self.row('follow', 'user', self.authors[1].id),
+        ])
+        affinity.record([(self.user.id, self.authors[2].id, 'like', timezone.now())])
+        
+        self.assertEqual(rebuild_affinity.delay(batch_size=1).get(), 2)
+        
+        self.assertEqual(
+            set(Affinity.objects.values_list('author_id', flat=True)), {self.authors[0].id, self.authors[1].id}
+        )
+
+
+@override_settings(FEED_DELIVERY={'PULL_FOLLOWER_THRESHOLD': 2, 'AUTHOR_CACHE_SIZE': 3})
+class HybridFeedTests(GraphQLTestCase):
+    """Test pulled authors' posts are merged into feeds at read time instead of pushed"""
+    
+    def setUp(self):
+        super().setUp()
+        self.celebrity = User.objects.create_user(username='celebrity', email='celebrity@example.com', password='x')
+        Follow.objects.create(follower=self.user1, followee=self.user2)
+        Follow.objects.create(follower=self.user1, followee=self.celebrity)
+    
+    def feed_titles(self, user, limit=10, offset=0):
+        info = self.create_mock_info(user)
+        return [post.title for post in self.query_resolver.resolve_user_feed(info, limit=limit, offset=offset)]
+    
+    def post(self, user, title):
+        with self.committed():
+            return Post.objects.create(user=user, title=title, content=title)
+    
+    def test_pulled_posts_are_merged_not_pushed(self):
+        """Test a pulled author's posts skip follower timelines but still appear in order"""
+        early = self.post(self.celebrity, "Celebrity Early")
+        Follow.objects.create(follower=self.user2, followee=self.celebrity)
+        self.assertTrue(timelines.is_pulled(self.celebrity.id))
+        self.feed_titles(self.user1)
+        
+        late = self.post(self.celebrity, "Celebrity Late")
+        self.post(self.user2, "Pushed")
+        
+        self.assertEqual(
+            self.feed_titles(self.user1),
+            ["Pushed", "Celebrity Late", "Celebrity Early", "Test Post 2", "Test Post 1"]
+        )
+        self.assertEqual(self.feed_titles(self.user1, limit=2, offset=1), ["Celebrity Late", "Celebrity Early"])
+        redis = get_redis()
+        for post in (early, late):
+            self.assertIsNone(redis.zscore(timelines.timeline_key(self.user1.id), str(post.id)))
+            self.assertIsNotNone(redis.zscore(timelines.author_posts_key(self.celebrity.id), str(post.id)))
+    
+    def test_cursor_pages_merge_without_gaps(self):
+        """Test userFeedConnection pages walk the merged feed once, newest first"""
+        Follow.objects.create(follower=self.user2, followee=self.celebrity)
+        titles = []
+        for n in range(3):
+            titles += [self.post(self.celebrity, f"Celebrity {n}").title, self.post(self.user2, f"Friend {n}").title]
+        expected = titles[::-1] + ["Test Post 2", "Test Post 1"]
+        query = """
+            query Feed($after: String) {
+                userFeedConnection(first: 2, after: $after) {
+                    edges { node { title } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        
+        seen, after = [], None
+        while True:
+            result = self.execute_query(query, variables={'after': after})
+            self.assertIsNone(result.errors)
+            page = result.data['userFeedConnection']
+            seen += [edge['node']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        
+        self.assertEqual(seen, expected)
+    
+    def test_truncated_author_posts_fall_back_to_database(self):
+        """Test pages reaching past a pulled author's cached posts are read from the database"""
+        Follow.objects.create(follower=self.user2, followee=self.celebrity)
+        for n in range(5):
+            self.post(self.celebrity, f"Celebrity {n}")
+        
+        self.assertEqual(len(timelines.read(self.user1.id, 0, 2)), 2)
+        self.assertIsNone(timelines.read(self.user1.id, 0, 10))
+        self.assertEqual(
+            self.feed_titles(self.user1),
+            [f"Celebrity {n}" for n in range(4, -1, -1)] + ["Test Post 2", "Test Post 1"]
+        )
+    
+    def test_posts_pushed_before_the_threshold_appear_once(self):
+        """Test a post both pushed and merged after its author crossed the threshold is listed once"""
+        self.feed_titles(self.user1)
+        self.post(self.celebrity, "Before")
+        self.assertIsNotNone(get_redis().zscore(timelines.timeline_key(self.user1.id), str(Post.objects.get(title="Before").id)))
+        
+        Follow.objects.create(follower=self.user2, followee=self.celebrity)
+        
+        self.assertEqual(self.feed_titles(self.user1), ["Before", "Test Post 2", "Test Post 1"])
+    
+    def test_pulled_posts_are_pushed_when_the_author_drops_back(self):
+        """Test posts made while an author was pulled reach follower timelines once they are pushed again"""
+        follow = Follow.objects.create(follower=self.user2, followee=self.celebrity)
+        self.feed_titles(self.user1)
+        pulled = self.post(self.celebrity, "Pulled")
+        key = timelines.timeline_key(self.user1.id)
+        self.assertIsNone(get_redis().zscore(key, str(pulled.id)))
+        
+        with self.committed():
+            follow.delete()
+        
+        self.assertFalse(timelines.is_pulled(self.celebrity.id))
+        self.assertIsNotNone(get_redis().zscore(key, str(pulled.id)))
+        self.assertFalse(get_redis().exists(timelines.author_pulled_key(self.celebrity.id)))
+        self.assertEqual(self.feed_titles(self.user1), ["Pulled", "Test Post 2", "Test Post 1"])
+    
+    def test_empty_timeline_is_built_once(self):
+        """Test a user with nothing to read is not rebuilt on every read"""
+        loner = User.objects.create_user(username='loner', email='loner@example.com', password='x')
+        
+        with patch('social_media_feed_app.timelines.rebuild', wraps=timelines.rebuild) as rebuild:
+            self.assertEqual(self.feed_titles(loner), [])
+            self.assertEqual(self.feed_titles(loner), [])
+        
+        self.assertEqual(rebuild.call_count, 1)
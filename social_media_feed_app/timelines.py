@@ -0,0 +1,354 @@
+import heapq
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from .models import Follow, Post, UserStats
+from .redis_store import get_redis
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def timeline_key(user_id):
+    return f"timeline:{user_id}"
+
+
+def truncated_key(user_id):
+    # Set once older entries have been dropped, i.e. the database holds more
+    return f"timeline:{user_id}:truncated"
+
+
+def built_key(user_id):
+    # Set when the timeline is materialized, so an empty one, which Redis
+    # does not store, is not rebuilt on every read
+    return f"timeline:{user_id}:built"
+
+
+def author_posts_key(author_id):
+    return f"author_posts:{author_id}"
+
+
+def author_truncated_key(author_id):
+    return f"author_posts:{author_id}:truncated"
+
+
+def author_pulled_key(author_id):
+    # Set while some of the author's posts were kept out of follower timelines
+    return f"author_posts:{author_id}:pulled"
+
+
+def timeline_size():
+    return settings.FEED_TIMELINE_SIZE
+
+
+def delivery_settings():
+    return settings.FEED_DELIVERY
+
+
+# ----------------------
+# Push or pull
+# ----------------------
+# Posts by authors with at least FEED_DELIVERY["PULL_FOLLOWER_THRESHOLD"]
+# followers are not pushed to their followers' timelines. Each author's
+# newest posts are kept in their own sorted set instead, and merged into
+# followers' pages as they are read.
+def _pulled_followee():
+    return Q(followee__stats__followers_count__gte=delivery_settings()["PULL_FOLLOWER_THRESHOLD"])
+
+
+def is_pulled(author_id):
+    return UserStats.objects.filter(
+        pk=author_id, followers_count__gte=delivery_settings()["PULL_FOLLOWER_THRESHOLD"]
+    ).exists()
+
+
+def pulled_authors(user_id):
+    """The accounts the user follows whose posts are merged in at read time."""
+    return list(Follow.objects.filter(_pulled_followee(), follower_id=user_id).values_list('followee_id', flat=True))
+
+
+def post_score(created_at):
+    """Timelines are ordered by post creation time, newest first."""
+    return created_at.timestamp()
+
+
+def _add_to_sets(redis, keys, entries, size):
+    """Add entries to each (set, truncated flag) key pair, trim the set to size and flag it if anything fell off."""
+    pipe = redis.pipeline(transaction=False)
+    for key, _ in keys:
+        pipe.zadd(key, entries)
+        pipe.zremrangebyrank(key, 0, -(size + 1))
+    results = pipe.execute()
+
+    pipe = redis.pipeline(transaction=False)
+    for (_, flag), removed in zip(keys, results[1::2]):
+        if removed:
+            pipe.set(flag, 1)
+    pipe.execute()
+
+
+def _add_to_timelines(redis, user_ids, entries):
+    _add_to_sets(redis, [(timeline_key(user_id), truncated_key(user_id)) for user_id in user_ids], entries, timeline_size())
+
+
+def _materialized(redis, user_ids):
+    """Which of the users' timelines are materialized, in order."""
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(timeline_key(user_id), built_key(user_id))
+    return [bool(count) for count in pipe.execute()]
+
+
+def _push(redis, user_ids, entries):
+    # Only touch timelines that are already materialized; a partial
+    # timeline would hide older posts until it was rebuilt
+    _add_to_timelines(redis, [u for u, exists in zip(user_ids, _materialized(redis, user_ids)) if exists], entries)
+
+
+def _add_to_author_posts(redis, author_id, entries):
+    # Like timelines, only a materialized set is extended
+    if redis.exists(author_posts_key(author_id)):
+        _add_to_sets(
+            redis, [(author_posts_key(author_id), author_truncated_key(author_id))],
+            entries, delivery_settings()["AUTHOR_CACHE_SIZE"]
+        )
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def audience(author_id):
+    """Yield the author, then their followers in FANOUT_BATCH_SIZE chunks."""
+    follower_ids = Follow.objects.filter(followee_id=author_id).values_list('follower_id', flat=True)
+    yield [author_id]
+    yield from _chunks(follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE), FANOUT_BATCH_SIZE)
+
+
+def _recent_posts(user_ids, limit):
+    rows = Post.objects.filter(
+        user_id__in=user_ids,
+        is_deleted=False
+    ).order_by('-created_at').values_list('id', 'created_at')[:limit]
+    return {str(post_id): post_score(created_at) for post_id, created_at in rows}
+
+
+def fanout_post(post_id, author_id, score):
+    """
+    Push a new post into the author's timeline and recent posts, and into
+    every follower's timeline unless the author's posts are pulled.
+    """
+    redis = get_redis()
+    entry = {str(post_id): score}
+    _add_to_author_posts(redis, author_id, entry)
+
+    if is_pulled(author_id):
+        redis.set(author_pulled_key(author_id), 1)
+        _push(redis, [author_id], entry)
+        return
+    push_pulled_posts(author_id)
+    for user_ids in audience(author_id):
+        _push(redis, user_ids, entry)
+
+
+def push_pulled_posts(author_id):
+    """
+    Once an author has dropped back under the pull threshold, push the
+    recent posts that were kept out of their followers' timelines while
+    they were pulled. Only the caller that clears the marker pushes them.
+    Returns whether it did.
+    """
+    redis = get_redis()
+    if not redis.exists(author_pulled_key(author_id)) or is_pulled(author_id):
+        return False
+    if not redis.delete(author_pulled_key(author_id)):
+        return False
+
+    entries = _recent_posts([author_id], timeline_size())
+    if entries:
+        for user_ids in audience(author_id):
+            _push(redis, user_ids, entries)
+    return True
+
+
+def remove_post(post_id, author_id):
+    """
+    Remove a deleted post from the author's timeline and recent posts, and
+    from every follower's timeline unless the author's posts are pulled.
+    Pulled authors' followers may still hold posts pushed before the author
+    crossed the threshold; reads skip deleted posts.
+    """
+    redis = get_redis()
+    member = str(post_id)
+    redis.zrem(author_posts_key(author_id), member)
+
+    for user_ids in [[author_id]] if is_pulled(author_id) else audience(author_id):
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrem(timeline_key(user_id), member)
+        pipe.execute()
+
+
+def backfill(follower_id, followee_id):
+    """Merge the followee's recent posts into a new follower's timeline."""
+    redis = get_redis()
+    if not _materialized(redis, [follower_id])[0] or is_pulled(followee_id):
+        # Nothing materialized yet, so the next read rebuilds from scratch,
+        # or the followee's posts are merged in as they are read
+        return
+
+    entries = _recent_posts([followee_id], timeline_size())
+    if entries:
+        _add_to_timelines(redis, [follower_id], entries)
+
+
+def trim(follower_id, followee_id):
+    """
+    Drop an unfollowed account's posts from the follower's timeline. The
+    unfollow may also have taken them back under the pull threshold.
+    """
+    redis = get_redis()
+    entries = _recent_posts([followee_id], timeline_size())
+    if entries:
+        redis.zrem(timeline_key(follower_id), *entries.keys())
+    push_pulled_posts(followee_id)
+
+
+def rebuild(user_id):
+    """Materialize a user's timeline from the database, leaving out pulled authors."""
+    redis = get_redis()
+    followee_ids = list(Follow.objects.filter(follower_id=user_id).exclude(
+        _pulled_followee()
+    ).values_list('followee_id', flat=True))
+    entries = _recent_posts(followee_ids + [user_id], timeline_size())
+
+    pipe = redis.pipeline(transaction=False)
+    pipe.delete(timeline_key(user_id), truncated_key(user_id))
+    if entries:
+        pipe.zadd(timeline_key(user_id), entries)
+    if len(entries) >= timeline_size():
+        pipe.set(truncated_key(user_id), 1)
+    pipe.set(built_key(user_id), 1)
+    pipe.execute()
+
+
+def rebuild_author_posts(author_id):
+    """Materialize an author's recent posts from the database."""
+    redis = get_redis()
+    size = delivery_settings()["AUTHOR_CACHE_SIZE"]
+    entries = _recent_posts([author_id], size)
+
+    pipe = redis.pipeline(transaction=False)
+    pipe.delete(author_posts_key(author_id), author_truncated_key(author_id))
+    if entries:
+        pipe.zadd(author_posts_key(author_id), entries)
+    if len(entries) >= size:
+        pipe.set(author_truncated_key(author_id), 1)
+    pipe.execute()
+
+
+def _materialize(redis, user_id):
+    if not _materialized(redis, [user_id])[0]:
+        rebuild(user_id)
+
+
+def _sources(redis, user_id):
+    """The (set, truncated flag) keys a user's feed is merged from: their timeline, then pulled authors' posts."""
+    _materialize(redis, user_id)
+    sources = [(timeline_key(user_id), truncated_key(user_id))]
+
+    authors = pulled_authors(user_id)
+    if authors:
+        pipe = redis.pipeline(transaction=False)
+        for author_id in authors:
+            pipe.exists(author_posts_key(author_id))
+        for author_id, exists in zip(authors, pipe.execute()):
+            if not exists:
+                rebuild_author_posts(author_id)
+        sources += [(author_posts_key(author_id), author_truncated_key(author_id)) for author_id in authors]
+    return sources
+
+
+def _merge(redis, sources, pages, wanted, offset, limit):
+    """
+    k-way merge the sources' pages, each up to `wanted` (member, score)
+    entries newest first, and return the IDs at [offset, offset + limit).
+
+    Returns None when a truncated source ran out of entries above the
+    page's oldest post, since its older posts live only in the database.
+    """
+    pipe = redis.pipeline(transaction=False)
+    for _, flag in sources:
+        pipe.exists(flag)
+    floor = None
+    for page, truncated in zip(pages, pipe.execute()):
+        if truncated and len(page) < wanted:
+            edge = page[-1][1] if page else float("inf")
+            floor = edge if floor is None else max(floor, edge)
+
+    seen = set()
+    merged = (
+        (member, score)
+        for member, score in heapq.merge(*pages, key=lambda entry: (entry[1], entry[0]), reverse=True)
+        # A post pushed before its author crossed the threshold is in both
+        if not (member in seen or seen.add(member))
+    )
+    entries = list(islice(merged, offset, offset + limit))
+
+    if floor is not None and (len(entries) < limit or entries[-1][1] < floor):
+        return None
+    return [member for member, _ in entries]
+
+
+def read(user_id, offset, limit):
+    """
+    Return post IDs for one page of a user's home feed, newest first: the
+    materialized timeline merged with the recent posts of every pulled
+    author they follow, each read no deeper than offset + limit.
+
+    Returns None when the page runs past the materialized window so the
+    caller can fall back to querying the database.
+    """
+    redis = get_redis()
+    sources = _sources(redis, user_id)
+
+    pipe = redis.pipeline(transaction=False)
+    for key, _ in sources:
+        pipe.zrevrange(key, 0, offset + limit - 1, withscores=True)
+    return _merge(redis, sources, pipe.execute(), offset + limit, offset, limit)
+
+
+def read_after(user_id, after, limit):
+    """
+    Return up to `limit` post IDs older than the (created_at, id) key `after`,
+    newest first, or None when the database must be queried instead.
+    """
+    redis = get_redis()
+    sources = _sources(redis, user_id)
+
+    pipe = redis.pipeline(transaction=False)
+    if after is None:
+        for key, _ in sources:
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+        return _merge(redis, sources, pipe.execute(), limit, 0, limit)
+
+    created_at, pk = after
+    score = post_score(created_at)
+    # Over-fetch by the number of posts sharing the cursor's score, then
+    # drop the ones at or before the cursor (members sort by id within a score)
+    for key, _ in sources:
+        pipe.zcount(key, score, score)
+    ties = pipe.execute()
+    for (key, _), count in zip(sources, ties):
+        pipe.zrevrangebyscore(key, score, "-inf", start=0, num=limit + count, withscores=True)
+    pages = [
+        [(member, s) for member, s in scored if not (s == score and member >= str(pk))][:limit]
+        for scored in pipe.execute()
+    ]
+    return _merge(redis, sources, pages, limit, 0, limit)
@@ -0,0 +1,183 @@
+import math
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Post
+from .redis_store import get_redis
+
+# Engagement weights, shared with the SQL fallback in resolve_trending_posts
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 2
+SHARE_WEIGHT = 3
+
+# Standard windows served from a leaderboard, keyed by the `hours` argument.
+# Each window decays with a half-life of a quarter of its length.
+WINDOWS = {
+    1: "1h",
+    24: "24h",
+    168: "7d",
+}
+
+# Scores are stored as weight * 2 ** ((t - epoch) / half_life) so an update
+# never has to touch other members. Once the exponent passes this many
+# half-lives the compaction task rescales the set against a fresh epoch.
+REBASE_AFTER_HALF_LIVES = 64
+
+CREATED_KEY = "trending:created"
+
+
+def epoch_key(hours):
+    return f"trending:{WINDOWS[hours]}:epoch"
+
+
+def leaderboard_key(hours, epoch):
+    # The epoch is part of the key, so an increment computed against an
+    # epoch that has since been rebased lands in a retired key, not the live one
+    return f"trending:{WINDOWS[hours]}:{epoch}"
+
+
+def seeded_key(hours, epoch):
+    # Set once the leaderboard holds every post in the window, not just new ones
+    return f"{leaderboard_key(hours, epoch)}:seeded"
+
+
+def half_life(hours):
+    return hours * 3600 / 4
+
+
+def _epochs(redis, now):
+    """Return the current epoch of every window, starting any that are missing."""
+    pipe = redis.pipeline(transaction=False)
+    for hours in WINDOWS:
+        pipe.set(epoch_key(hours), int(now), nx=True)
+        pipe.get(epoch_key(hours))
+    values = pipe.execute()[1::2]
+    return {hours: int(value) for hours, value in zip(WINDOWS, values)}
+
+
+def _decayed(weight, hours, epoch, at):
+    return weight * math.pow(2, (at - epoch) / half_life(hours))
+
+
+def track_post(post_id, created_at):
+    """Enter a new post into every window with a zero score."""
+    redis = get_redis()
+    epochs = _epochs(redis, time.time())
+    pipe = redis.pipeline(transaction=False)
+    pipe.zadd(CREATED_KEY, {str(post_id): created_at.timestamp()})
+    for hours, epoch in epochs.items():
+        pipe.zadd(leaderboard_key(hours, epoch), {str(post_id): 0}, nx=True)
+    pipe.execute()
+
+
+def untrack_post(post_id):
+    """Remove a deleted post from every window."""
+    redis = get_redis()
+    epochs = _epochs(redis, time.time())
+    pipe = redis.pipeline(transaction=False)
+    pipe.zrem(CREATED_KEY, str(post_id))
+    for hours, epoch in epochs.items():
+        pipe.zrem(leaderboard_key(hours, epoch), str(post_id))
+    pipe.execute()
+
+
+def record(post_id, weight, at=None):
+    """
+    Apply one engagement event (negative weights undo one) to every window.
+
+    `at` is when the engagement happened, defaulting to now. An undo passes
+    the original event's time so it takes back exactly what that event added.
+    Uses ZADD XX INCR so posts that were never tracked, or have aged out of a
+    window, are left alone.
+    """
+    redis = get_redis()
+    now = time.time()
+    at = now if at is None else at.timestamp()
+    epochs = _epochs(redis, now)
+    pipe = redis.pipeline(transaction=False)
+    for hours, epoch in epochs.items():
+        increment = _decayed(weight, hours, epoch, at=at)
+        pipe.zadd(leaderboard_key(hours, epoch), {str(post_id): increment}, xx=True, incr=True)
+    pipe.execute()
+
+
+def engagement_changed(post_id, weight, at):
+    """Record an engagement event that happened `at` once the caller's transaction commits."""
+    transaction.on_commit(lambda: record(post_id, weight, at))
+
+
+def rebuild(hours):
+    """Seed one window from the denormalized counters of posts inside it."""
+    redis = get_redis()
+    epoch = _epochs(redis, time.time())[hours]
+    threshold = timezone.now() - timedelta(hours=hours)
+    rows = Post.objects.filter(
+        created_at__gte=threshold,
+        is_deleted=False
+    ).values_list('id', 'created_at', 'like_count', 'comment_count', 'share_count')
+
+    pipe = redis.pipeline(transaction=False)
+    for post_id, created_at, likes, comments, shares in rows.iterator(chunk_size=2000):
+        weight = likes * LIKE_WEIGHT + comments * COMMENT_WEIGHT + shares * SHARE_WEIGHT
+        # Without event times, assume the engagement arrived when the post did
+        score = _decayed(weight, hours, epoch, at=created_at.timestamp())
+        pipe.zadd(CREATED_KEY, {str(post_id): created_at.timestamp()})
+        pipe.zadd(leaderboard_key(hours, epoch), {str(post_id): score})
+    pipe.set(seeded_key(hours, epoch), 1)
+    pipe.execute()
+
+
+def top_post_ids(hours, limit, offset=0):
+    """
+    Return up to `limit` post IDs ranked by decayed engagement, starting
+    `offset` places down the leaderboard, or None when `hours` is not one
+    of the standard WINDOWS.
+
+    A few extra IDs are returned to cover posts that have aged out of the
+    window or been deleted since the last compaction; callers filter them,
+    and read on from `offset + len(ids)` when too few survive.
+    """
+    if hours not in WINDOWS:
+        return None
+
+    redis = get_redis()
+    epoch = _epochs(redis, time.time())[hours]
+    if not redis.exists(seeded_key(hours, epoch)):
+        rebuild(hours)
+    return redis.zrevrange(leaderboard_key(hours, epoch), offset, offset + limit * 2 - 1)
+
+
+def compact():
+    """
+    Expire posts older than each window and rescale scores whose exponent has
+    grown past REBASE_AFTER_HALF_LIVES. Run periodically by Celery beat.
+    """
+    redis = get_redis()
+    now = time.time()
+
+    for hours, epoch in _epochs(redis, now).items():
+        expired = redis.zrangebyscore(CREATED_KEY, "-inf", f"({now - hours * 3600}")
+        if expired:
+            redis.zrem(leaderboard_key(hours, epoch), *expired)
+
+        if (now - epoch) / half_life(hours) > REBASE_AFTER_HALF_LIVES:
+            _rebase(redis, hours, epoch, int(now))
+
+    redis.zremrangebyscore(CREATED_KEY, "-inf", f"({now - max(WINDOWS) * 3600}")
+
+
+def _rebase(redis, hours, old_epoch, new_epoch):
+    old_key = leaderboard_key(hours, old_epoch)
+    factor = math.pow(2, -(new_epoch - old_epoch) / half_life(hours))
+    scores = {member: score * factor for member, score in redis.zrange(old_key, 0, -1, withscores=True)}
+
+    # Increments that land between the read and the switch go to the retired
+    # key and are dropped; this happens once every REBASE_AFTER_HALF_LIVES half-lives
+    pipe = redis.pipeline(transaction=True)
+    if scores:
+        pipe.zadd(leaderboard_key(hours, new_epoch), scores)
+    pipe.set(seeded_key(hours, new_epoch), 1)
+    pipe.set(epoch_key(hours), new_epoch)
+    pipe.delete(old_key, seeded_key(hours, old_epoch))
+    pipe.execute()
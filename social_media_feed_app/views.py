@@ -1,3 +1,159 @@
-from django.shortcuts import render
+import time
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connection, transaction
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate, validate_schema
+from .redis_store import get_redis
+from .schema.cost import cost_settings
+from .schema.documents import requested_hash, resolve_document
+from .schema.profiling import aggregate, finish_profile
+from .schema.schema import validation_rules
 
-# Create your views here.
+
+class FeedGraphQLView(GraphQLView):
+    """
+    GraphQL endpoint with persisted queries, a parsed document cache and
+    query cost limits.
+
+    Documents are parsed and put through the standard validation rules once
+    per distinct query text; repeat operations only run the per-request cost
+    check. Operations over the cost or depth limit, or from clients that have
+    spent their per-minute budget, are rejected before executing, and the
+    estimate is returned under `extensions.cost`. Sampled resolver timings
+    are folded into the profiling aggregate, and returned under
+    `extensions.resolvers` when the client asked for them.
+    """
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        sha = requested_hash(request.GET.get("extensions") or (data or {}).get("extensions"))
+        if not query and not sha:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            cached = resolve_document(schema, query, sha)
+        except GraphQLError as error:
+            return ExecutionResult(data=None, errors=[error])
+        if cached.errors:
+            return ExecutionResult(data=None, errors=cached.errors)
+
+        document = cached.document
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."
+            ))
+
+        def on_cost(cost, depth, rejected):
+            limits = cost_settings()
+            self.add_extension(request, "cost", {
+                "requested": cost,
+                "maximum": limits["MAX_COST"],
+                "depth": depth,
+                "maximumDepth": limits["MAX_DEPTH"],
+            })
+            return None if rejected else self.charge(request, cost)
+
+        validation_errors = validate(
+            schema,
+            document,
+            validation_rules(variables, operation_name, on_cost),
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        finally:
+            profile = finish_profile(request)
+            if profile is not None and profile.expose:
+                self.add_extension(request, "resolvers", profile.as_dict())
+
+    def charge(self, request, cost):
+        """Spend `cost` from the client's per-minute budget; return an error message once it runs out."""
+        budget = cost_settings()["COST_PER_MINUTE"]
+        if not budget:
+            return None
+
+        user = getattr(request, "user", None)
+        client = f"user:{user.pk}" if user is not None and user.is_authenticated else f"ip:{request.META.get('REMOTE_ADDR')}"
+        key = f"query_cost:{client}:{int(time.time() // 60)}"
+
+        redis = get_redis()
+        spent = redis.incrby(key, cost)
+        if spent == cost:
+            redis.expire(key, 60)
+        if spent > budget:
+            return f"Query cost budget of {budget} per minute exceeded. Try again later."
+        return None
+
+    @staticmethod
+    def add_extension(request, name, value):
+        if not hasattr(request, "graphql_extensions"):
+            request.graphql_extensions = {}
+        request.graphql_extensions[name] = value
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = getattr(request, "graphql_extensions", None)
+        if extensions:
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+
+def resolver_profile(request):
+    """
+    Dump the aggregated resolver timings by operation name and field path.
+    Pass ?reset=1 to start a fresh sampling window after reading.
+    """
+    user = getattr(request, "user", None)
+    if not (settings.DEBUG or (user is not None and user.is_staff)):
+        raise PermissionDenied
+    snapshot = aggregate.snapshot()
+    if request.GET.get("reset"):
+        aggregate.reset()
+    return JsonResponse(snapshot)
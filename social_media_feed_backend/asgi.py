@@ -7,6 +7,8 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.urls import re_path
+from asgiref.sync import sync_to_async
+from graphql import GraphQLError, get_operation_ast, validate
 import channels_graphql_ws
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_media_feed_backend.settings")
@@ -14,6 +16,8 @@ django_asgi_app = get_asgi_application()
 
 # ✅ Import the FULL schema (not just subscriptions)
 from social_media_feed_app.schema.schema import schema
+from social_media_feed_app.schema.documents import requested_hash, resolve_document
+from social_media_feed_app.schema.schema import validation_rules
 
 
 # ✅ GraphQL WebSocket consumer
@@ -21,12 +25,75 @@ class GraphqlWsConsumer(channels_graphql_ws.GraphqlWsConsumer):
     """Custom WebSocket consumer for GraphQL subscriptions."""
     schema = schema
 
+    def get_context(self):
+        # Resolvers read the viewer from info.context.user, as they do over HTTP
+        context = super().get_context()
+        context.user = self.scope.get("user")
+        return context
+
     async def on_connect(self, payload):
         print("✅ WebSocket connected!")
 
+    async def disconnect(self, code):
+        # The base class only calls `unsubscribed` for an explicit stop, so a
+        # dropped socket would keep its subscriptions' state, e.g. the viewer
+        # counted in feed:online, forever
+        subscriptions = list(self._subscriptions.values())
+        await super().disconnect(code)
+        for subscription in subscriptions:
+            await subscription.unsubscribed_callback()
+        await self.on_disconnect(code)
+
     async def on_disconnect(self, close_code):
         print(f"❌ WebSocket disconnected with code: {close_code}")
 
+    async def _on_gql_start(self, op_id, payload):
+        # Swap a persisted query hash for its text before the usual handling
+        sha = requested_hash(payload.get("extensions"))
+        if sha:
+            try:
+                cached = await sync_to_async(resolve_document)(self.schema.graphql_schema, payload.get("query"), sha)
+            except GraphQLError as error:
+                await self._reject(op_id, [error])
+                return
+            payload = {**payload, "query": cached.query}
+
+        # Price the operation with its variables, which the cached parse never sees
+        errors = await sync_to_async(self._on_gql_start__check_cost)(payload)
+        if errors:
+            await self._reject(op_id, errors)
+            return
+        await super()._on_gql_start(op_id, payload)
+
+    async def _reject(self, op_id, errors):
+        await self._send_gql_data(op_id, None, errors)
+        await self._send_gql_complete(op_id)
+
+    def _on_gql_start__check_cost(self, payload):
+        # Same cost and depth limits as FeedGraphQLView, before anything executes
+        try:
+            cached = resolve_document(self.schema.graphql_schema, payload.get("query"))
+        except GraphQLError as error:
+            return [error]
+        if cached.errors:
+            # Reported by the usual parse step
+            return None
+        return validate(
+            self.schema.graphql_schema,
+            cached.document,
+            validation_rules(payload.get("variables"), payload.get("operationName")),
+        )
+
+    def _on_gql_start__parse_query_sync_cached(self, op_name, query):
+        # The base class caches per connection; share the process-wide cache instead
+        try:
+            cached = resolve_document(self.schema.graphql_schema, query)
+        except GraphQLError as error:
+            return None, None, [error]
+        if cached.errors:
+            return None, None, cached.errors
+        return cached.document, get_operation_ast(cached.document, op_name), None
+
 
 # ✅ Application entrypoint
 application = ProtocolTypeRouter({
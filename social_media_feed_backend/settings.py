@@ -161,9 +161,40 @@ GRAPHENE = {
     "SCHEMA": "social_media_feed_app.schema.schema.schema",
     "MIDDLEWARE": [
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        "social_media_feed_app.schema.profiling.ResolverProfilingMiddleware",
     ]
 }
 
+# Resolver timing and SQL counts per field path. SAMPLE_RATE of requests
+# feed the aggregate served at /graphql/profile; clients may request their
+# own profile with an X-Profile-Resolvers header when EXPOSE_EXTENSIONS is on.
+GRAPHQL_PROFILING = {
+    "SAMPLE_RATE": env.float("GRAPHQL_PROFILE_SAMPLE_RATE", default=0.01),
+    "EXPOSE_EXTENSIONS": DEBUG,
+}
+
+# Budget for GraphQL operations, checked before any resolver runs.
+# Object fields cost 1, multiplied by their `first`/`limit` argument or by
+# DEFAULT_LIST_SIZE for unbounded lists; leaf fields are free.
+# COST_PER_MINUTE throttles each client's total spend (0 disables it).
+GRAPHQL_QUERY_COST = {
+    "MAX_COST": env.int("GRAPHQL_MAX_QUERY_COST", default=5000),
+    "MAX_DEPTH": env.int("GRAPHQL_MAX_QUERY_DEPTH", default=10),
+    "DEFAULT_LIST_SIZE": 20,
+    "COST_PER_MINUTE": env.int("GRAPHQL_QUERY_COST_PER_MINUTE", default=0),
+}
+
+# Automatic persisted queries: clients send a SHA-256 hash in
+# extensions.persistedQuery and the server keeps the hash -> query store.
+# With REQUIRE_PERSISTED only queries already in the store are executed;
+# register them with `manage.py register_persisted_queries`.
+# CACHE_SIZE bounds the in-process LRU of parsed and validated documents.
+GRAPHQL_PERSISTED_QUERIES = {
+    "REQUIRE_PERSISTED": env.bool("GRAPHQL_REQUIRE_PERSISTED_QUERIES", default=False),
+    "CACHE_SIZE": env.int("GRAPHQL_DOCUMENT_CACHE_SIZE", default=512),
+    "TTL": 7 * 24 * 60 * 60,  # auto-registered queries, seconds
+}
+
 AUTHENTICATION_BACKENDS = [
     "graphql_jwt.backends.JSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
@@ -197,6 +228,137 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Africa/Kampala"
 
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-post-counters": {
+        "task": "social_media_feed_app.tasks.reconcile_post_counters",
+        "schedule": 60 * 60,  # hourly
+    },
+    "recompute-user-stats": {
+        "task": "social_media_feed_app.tasks.recompute_user_stats",
+        "schedule": 24 * 60 * 60,  # daily
+    },
+    "compact-trending": {
+        "task": "social_media_feed_app.tasks.compact_trending",
+        "schedule": 60,  # every minute
+    },
+    "maintain-interactions": {
+        "task": "social_media_feed_app.tasks.maintain_interactions",
+        "schedule": 60 * 60,  # hourly
+    },
+    "rebuild-suggestions": {
+        "task": "social_media_feed_app.tasks.rebuild_suggestions",
+        "schedule": 6 * 60 * 60,  # every six hours
+    },
+}
+
+# Sorted-set store backing home timelines, leaderboards and counters.
+# "redis" talks to REDIS_URL; "memory" is an in-process stand-in for tests.
+FEED_STORE = {
+    "BACKEND": env("FEED_STORE_BACKEND", default="redis"),
+    "URL": env("REDIS_URL"),
+}
+
+# Interaction events are buffered in-process and written in batches by a
+# background thread. Producers wait up to ENQUEUE_TIMEOUT seconds when the
+# buffer is full, then write a batch themselves rather than drop events.
+INTERACTION_LOG = {
+    "BUFFER_SIZE": env.int("INTERACTION_BUFFER_SIZE", default=10000),
+    "BATCH_SIZE": env.int("INTERACTION_BATCH_SIZE", default=500),
+    "FLUSH_INTERVAL": 1.0,  # seconds
+    "ENQUEUE_TIMEOUT": 0.05,  # seconds
+    "BACKGROUND_FLUSH": True,
+}
+
+# On Postgres, interactions are range-partitioned by month of created_at.
+# maintain_interactions keeps PARTITIONS_AHEAD months of partitions ready,
+# rolls raw events into daily per-target totals for analytics, and then
+# drops (or, with "detach", detaches for archiving) months older than
+# RETENTION_DAYS. The last ROLLUP_LOOKBACK_DAYS are re-rolled each run to
+# include late buffered events.
+INTERACTION_RETENTION = {
+    "RETENTION_DAYS": env.int("INTERACTION_RETENTION_DAYS", default=90),
+    "PARTITIONS_AHEAD": 3,  # months
+    "EXPIRED_PARTITIONS": env("INTERACTION_EXPIRED_PARTITIONS", default="drop"),
+    "ROLLUP_LOOKBACK_DAYS": 2,
+}
+
+# User search ranks pg_trgm matches by similarity and follower count.
+# Autocomplete results for prefixes up to PREFIX_CACHE_MAX_LENGTH characters,
+# the hottest and least selective, are cached for PREFIX_CACHE_TTL seconds.
+USER_SEARCH = {
+    "PREFIX_CACHE_MAX_LENGTH": 4,
+    "PREFIX_CACHE_TTL": env.int("USER_SEARCH_PREFIX_CACHE_TTL", default=60),
+}
+
+# Full-text post search. Scores are log2(relevance) plus an age bonus, so a
+# post must be twice as relevant to outrank one HALF_LIFE_DAYS newer. Only
+# the newest MAX_CANDIDATES matches of a query are ranked.
+POST_SEARCH = {
+    "HALF_LIFE_DAYS": 7,
+    "MAX_CANDIDATES": env.int("POST_SEARCH_MAX_CANDIDATES", default=2000),
+}
+
+# PostLikedSubscription updates are coalesced per post. The first like or
+# unlike schedules one likesCount broadcast WINDOW seconds later, carrying
+# the count at that moment, and a post is broadcast at most once every
+# MIN_INTERVAL seconds however fast it is being liked.
+LIKE_BROADCASTS = {
+    "WINDOW": env.float("LIKE_BROADCAST_WINDOW", default=1.0),  # seconds
+    "MIN_INTERVAL": env.float("LIKE_BROADCAST_MIN_INTERVAL", default=2.0),  # seconds
+}
+
+# People you may know. rebuild_suggestions snapshots the follow graph into
+# NumPy arrays and stores each user's SUGGESTIONS_PER_USER friends-of-friends
+# with the most mutual connections, walking at most MAX_PATHS_PER_BATCH
+# two-hop paths at a time to bound memory. Between rebuilds a follow or
+# unfollow adjusts the follower's own list using up to DELTA_FANOUT of the
+# followee's follows.
+PEOPLE_YOU_MAY_KNOW = {
+    "SUGGESTIONS_PER_USER": env.int("PYMK_SUGGESTIONS_PER_USER", default=50),
+    "MAX_PATHS_PER_BATCH": env.int("PYMK_MAX_PATHS_PER_BATCH", default=5_000_000),
+    "DELTA_FANOUT": env.int("PYMK_DELTA_FANOUT", default=200),
+}
+
+# userFeed(ranking: RELEVANCE) scores the newest CANDIDATES posts of the
+# home feed and serves them best first. A post's score is
+#   RECENCY * 0.5 ** (age / HALF_LIFE_HOURS)
+#   + AFFINITY * log1p(the viewer's affinity for the author, see AFFINITY)
+#   + ENGAGEMENT * log1p(its ENGAGEMENT_WEIGHTS-weighted like, comment and
+#     share counts)
+FEED_RANKING = {
+    "CANDIDATES": env.int("FEED_RANKING_CANDIDATES", default=500),
+    "HALF_LIFE_HOURS": env.float("FEED_RANKING_HALF_LIFE_HOURS", default=24.0),
+    "WEIGHTS": {
+        "RECENCY": env.float("FEED_RANKING_RECENCY_WEIGHT", default=1.0),
+        "AFFINITY": env.float("FEED_RANKING_AFFINITY_WEIGHT", default=0.5),
+        "ENGAGEMENT": env.float("FEED_RANKING_ENGAGEMENT_WEIGHT", default=0.2),
+    },
+    "ENGAGEMENT_WEIGHTS": {"LIKES": 1.0, "COMMENTS": 2.0, "SHARES": 3.0},
+}
+
+# Viewer-to-author affinity, updated as buffered interactions are written.
+# Each event adds its WEIGHTS entry, and a score halves every
+# HALF_LIFE_DAYS without new events. Only each user's MAX_AUTHORS_PER_USER
+# strongest authors are kept.
+AFFINITY = {
+    "HALF_LIFE_DAYS": env.float("AFFINITY_HALF_LIFE_DAYS", default=14.0),
+    "WEIGHTS": {"view": 0.2, "like": 1.0, "comment": 2.0, "share": 3.0, "follow": 5.0},
+    "MAX_AUTHORS_PER_USER": env.int("AFFINITY_MAX_AUTHORS_PER_USER", default=200),
+}
+
+# Number of post IDs kept in each user's materialized home timeline.
+# Deeper pages fall back to querying the database.
+FEED_TIMELINE_SIZE = env.int("FEED_TIMELINE_SIZE", default=800)
+
+# Hybrid feed delivery. Posts by authors with at least
+# PULL_FOLLOWER_THRESHOLD followers are not pushed to every follower's
+# timeline; each such author's newest AUTHOR_CACHE_SIZE posts are kept in
+# one sorted set and merged into their followers' feeds at read time.
+FEED_DELIVERY = {
+    "PULL_FOLLOWER_THRESHOLD": env.int("FEED_PULL_FOLLOWER_THRESHOLD", default=10000),
+    "AUTHOR_CACHE_SIZE": env.int("FEED_AUTHOR_CACHE_SIZE", default=200),
+}
+
 GRAPHQL_JWT = {
     'JWT_VERIFY_EXPIRATION': True,
     'JWT_EXPIRATION_DELTA': datetime.timedelta(hours=24),
@@ -252,6 +414,14 @@ if 'test' in sys.argv or 'test_coverage' in sys.argv:
     PASSWORD_HASHERS = [
         'django.contrib.auth.hashers.MD5PasswordHasher',
     ]
+    
+    # Keep timelines in-process and run background tasks inline
+    FEED_STORE["BACKEND"] = "memory"
+    INTERACTION_LOG["BACKGROUND_FLUSH"] = False
+    CELERY_TASK_ALWAYS_EAGER = True
+    CELERY_TASK_EAGER_PROPAGATES = True
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
 # Optional: Test-specific settings
 if 'test' in sys.argv:
@@ -16,12 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from social_media_feed_app.schema.schema import schema
+from social_media_feed_app.views import FeedGraphQLView, resolver_profile
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql", csrf_exempt(FeedGraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/profile", resolver_profile),
 ]
\ No newline at end of file